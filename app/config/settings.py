@@ -32,6 +32,42 @@ class Settings(BaseSettings):
     REDIS_PORT: int = 6379
     REDIS_PASSWORD: str = '...'
     REDIS_DB_MAIN: int = 0
+    REDIS_MAX_CONNECTIONS: int = 20  # Conexões por pool em cada processo; manter acima das threads que usam o Redis por processo do Celery
+    REDIS_POOL_TIMEOUT: int = 10  # Espera máxima (s) por uma conexão livre do pool antes de ConnectionError
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30  # Conexões ociosas há mais tempo que isso (s) recebem um PING antes de serem reusadas
+    REDIS_SOCKET_TIMEOUT: float = 30.0
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = 5.0
+    REDIS_RETRY_ATTEMPTS: int = 3  # Novas tentativas de um comando em erro de conexão / timeout
+    REDIS_RETRY_BACKOFF_BASE: float = 0.1  # Backoff exponencial com jitter entre as tentativas (s)
+    REDIS_RETRY_BACKOFF_CAP: float = 2.0
+
+    # Webhook ingest
+    WEBHOOK_DEDUP_TTL: int = 86400  # Janela (s) em que uma entrega repetida da Callbell é descartada
+    INGEST_CONTACT_BUCKET_CAPACITY: int = 10  # Rajada máxima de mensagens por contato
+    INGEST_CONTACT_REFILL_PER_SECOND: float = 0.2  # 12 mensagens/min por contato em regime
+    INGEST_GLOBAL_BUCKET_CAPACITY: int = 1000
+    INGEST_GLOBAL_REFILL_PER_SECOND: float = 100.0
+    INGEST_THROTTLE_METRICS_WINDOW: int = 3600  # Janela (s) usada para contar contatos limitados
+    ATTACHMENT_MAX_WORKERS: int = 8  # Downloads / transcrições simultâneos por lote de anexos
+
+    # Conversation state
+    STATE_LOCAL_CACHE_ENABLED: bool = False  # Cache local (por processo) dos estados, validado pela versão no Redis
+    STATE_LOCAL_CACHE_SIZE: int = 512
+    STATE_STORAGE_MODE: str = "blob"  # "blob" (um JSON por estado) ou "hash" (um JSON por campo, leituras/escritas parciais)
+    STATE_CODEC: str = "json"  # Codec do estado no modo blob: "json" (legado), "zstd" ou "zstd-dict" (dicionário treinado)
+    STATE_CODEC_LEVEL: int = 3
+    # Limite das listas do estado (0 = sem limite); o excedente vai para state:archive:{id}:{campo}
+    STATE_MAX_ENTITIES: int = 60
+    STATE_SENTIMENT_WINDOW: int = 20
+    STATE_MAX_UNRESOLVED_OBJECTIONS: int = 20
+    STATE_MAX_QUALIFICATION_ITEMS: int = 40
+    STATE_ARCHIVE_MAX_ITEMS: int = 1000  # Itens mantidos no arquivo de cada campo
+    TURN_SNAPSHOT_ENABLED: bool = True  # Contexto do turno lido uma vez e compartilhado pelas tasks do turno
+    TURN_SNAPSHOT_TTL: int = 900
+
+    # cache_result
+    CACHE_COMPRESSION_MIN_BYTES: int = 1024  # Resultados a partir desse tamanho são comprimidos com zstd (0 = nunca)
+    CACHE_COMPRESSION_LEVEL: int = 3
 
     # SITES PASSWORDS
     ESEYE_BASE_URL: str = "..."
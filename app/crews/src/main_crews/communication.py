@@ -1,7 +1,6 @@
 import json
 from crewai import Crew, Process
 from datetime import datetime, timezone
-import time
 
 from app.services.celery_service import celery_app
 from app.crews.src.secondary_crews.enrichment_crew import trigger_post_processing
@@ -10,33 +9,39 @@ from app.crews.agents_definitions.obj_declarations.agent_declaration import get_
 from app.config.llm_config import X_llm
 from app.tools.knowledge_tools import drill_down_topic_tool
 from app.crews.agents_definitions.obj_declarations.tasks_declaration import create_communication_task
-from app.models.data_models import ConversationState
 from app.services.state_manager_service import StateManagerService
 from app.utils.funcs.parse_llm_output import parse_json_from_string
 from app.services.redis_service import get_redis
+from app.services.context_loader import ContextLoader
+from app.services.barrier_service import pending_media_barrier, wait_for_barriers, PENDING_MEDIA_TIMEOUT
 from app.utils.funcs.funcs import distill_conversation_state
 from app.utils.funcs.parse_llm_output import limpar_com_rede_de_seguranca
 
 logger = get_logger(__name__)
 state_manager = StateManagerService()
+context_loader = ContextLoader(state_manager)
 redis_client = get_redis()
 
 HISTORY_TOPIC_LIMIT = 10
 
 # --- Main Communication Task ---
 @celery_app.task(name='main_crews.communication')
-def communication_task(contact_id: str, is_follow_up: bool = False):
+def communication_task(contact_id: str, is_follow_up: bool = False, turn_id: str | None = None):
     """
     Third task in the state machine chain. Loads state, generates the final response,
     and dispatches messages to the user asynchronously.
     Can be triggered as a follow-up, which alters the agent's context.
     """
     logger.info(f"[{contact_id}] - Starting communication task.")
-    state, _ = state_manager.get_state(contact_id)
 
-    while redis_client.keys(f"transcribing:*:{contact_id}"):
+    if pending_media_barrier.is_active(contact_id):
         logger.info(f"[{contact_id}] - Waiting for transcription to complete.")
-        time.sleep(1)
+        if not wait_for_barriers(contact_id, [pending_media_barrier], timeout=PENDING_MEDIA_TIMEOUT):
+            logger.warning(f"[{contact_id}] - Timed out waiting for the transcriptions. Continuing without them.")
+
+    # State, histories and messages in one round trip, after the transcriptions are in
+    context = context_loader.load_for_agent(contact_id, "CommunicationAgent", turn_id)
+    state = context.state
 
     try:
         llm_w_tools = X_llm.bind_tools([drill_down_topic_tool])
@@ -45,19 +50,10 @@ def communication_task(contact_id: str, is_follow_up: bool = False):
         crew = Crew(agents=[agent], tasks=[task], process=Process.sequential, verbose=True)
 
         # Process inputs
-        shorterm_history = redis_client.get(f"shorterm_history:{contact_id}")
-
-        longterm_history_json = redis_client.get(f"longterm_history:{contact_id}")
-        longterm_history = json.loads(longterm_history_json) if longterm_history_json else {}
-        topic_details = longterm_history.get("topic_details", [])[-HISTORY_TOPIC_LIMIT:]
-        longterm_history = "\n\n".join([
-            f"Topic: {topic.get('title', 'N/A')}\nSummary: {topic.get('summary', 'N/A')}"
-            for topic in topic_details
-        ])
-
-        system_op_output = redis_client.get(f"{contact_id}:last_system_operation_output")
-
-        last_processed_messages = redis_client.lrange(f"contacts_messages:waiting:{contact_id}", 0, -1)
+        shorterm_history = context.shorterm_history
+        longterm_history = context.longterm_history_digest(HISTORY_TOPIC_LIMIT)
+        system_op_output = context.last_system_operation_output
+        last_processed_messages = context.waiting_messages
 
         redis_client.set(f"{contact_id}:last_processed_messages", '\n'.join(last_processed_messages))
         
@@ -72,11 +68,11 @@ def communication_task(contact_id: str, is_follow_up: bool = False):
             "timestamp": datetime.now(timezone.utc).isoformat(),
             "strategic_plan": json.dumps(strategic_plan),
             "last_system_operation": system_op_output if system_op_output else "{}",
-            "customer_profile": str(redis_client.get(f"{contact_id}:customer_profile")),
+            "customer_profile": str(context.customer_profile),
             "conversation_state": str(conversation_state_distilled),
             "longterm_history": longterm_history,
             "shorterm_history": str(shorterm_history),
-            "recently_sent_catalogs": ", ".join(redis_client.lrange(f"{contact_id}:sended_catalogs", 0, -1)),
+            "recently_sent_catalogs": ", ".join(context.sended_catalogs),
             "disclosure_checklist": json.dumps([item.model_dump() for item in state.disclosure_checklist]) if not disclosure_checklist else str(disclosure_checklist),
             "client_message": "\n".join(last_processed_messages) if not is_follow_up else "",
             "is_follow_up": is_follow_up,
@@ -87,10 +83,7 @@ def communication_task(contact_id: str, is_follow_up: bool = False):
         response_json, updated_state_dict = parse_json_from_string(result_str)
 
         if updated_state_dict:
-            with redis_client.lock(f"lock:state:{contact_id}", timeout=10):
-                state, _ = state_manager.get_state(contact_id)
-                state = ConversationState(**{**state.model_dump(), **updated_state_dict})
-                state_manager.save_state(contact_id, state)
+            state, _ = state_manager.merge(contact_id, updated_state_dict)
 
         send_message = False
         phone_number = None
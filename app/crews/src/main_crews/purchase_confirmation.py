@@ -1,4 +1,3 @@
-import json
 from crewai import Crew, Process
 
 from app.core.logger import get_logger
@@ -7,12 +6,14 @@ from app.crews.agents_definitions.obj_declarations.tasks_declaration import crea
 from app.services.state_manager_service import StateManagerService
 from app.utils.funcs.parse_llm_output import parse_json_from_string
 from app.services.redis_service import get_redis
+from app.services.context_loader import ContextLoader
 
 logger = get_logger(__name__)
 state_manager = StateManagerService()
+context_loader = ContextLoader(state_manager)
 redis_client = get_redis()
 
-def purchase_confirmation_task(contact_id: str):
+def purchase_confirmation_task(contact_id: str, turn_id: str | None = None):
     """
     A task that runs conditionally to check if the client has confirmed the purchase.
     """
@@ -23,16 +24,12 @@ def purchase_confirmation_task(contact_id: str):
         task = create_purchase_confirmation_task(agent)
         crew = Crew(agents=[agent], tasks=[task], process=Process.sequential, verbose=True)
 
-        shorterm_history = redis_client.get(f"shorterm_history:{contact_id}")
-        longterm_history_json = redis_client.get(f"longterm_history:{contact_id}")
-        longterm_history = json.loads(longterm_history_json) if longterm_history_json else {}
-        history_messages = "\n\n".join([
-            f"Topic: {topic.get('title', 'N/A')}\nSummary: {topic.get('summary', 'N/A')}"
-            for topic in longterm_history.get("topic_details", [])[-5:]
-        ])
+        context = context_loader.load_for_agent(contact_id, "PurchaseConfirmationAgent", turn_id)
+        shorterm_history = context.shorterm_history
+        history_messages = context.longterm_history_digest(5)
 
         inputs = {
-            "client_message": "\n".join(redis_client.lrange(f'contacts_messages:waiting:{contact_id}', 0, -1)),
+            "client_message": "\n".join(context.waiting_messages),
             "shorterm_history": str(shorterm_history),
             "longterm_history": history_messages,
         }
@@ -41,13 +38,8 @@ def purchase_confirmation_task(contact_id: str):
         parsed_result = parse_json_from_string(result.raw, update=False)
 
         if parsed_result and parsed_result.get("budget_accepted") is True:
-            with redis_client.lock(f"lock:state:{contact_id}", timeout=10):
-                current_state, _ = state_manager.get_state(contact_id)
-                current_state.operational_context = "BUDGET_ACCEPTED"
-                current_state.budget_accepted = True
+            state_manager.patch_state(contact_id, {"operational_context": "BUDGET_ACCEPTED", "budget_accepted": True})
 
-                state_manager.save_state(contact_id, current_state)
-                
             logger.info(f"[{contact_id}] - Purchase confirmed. Operational context set to BUDGET_ACCEPTED.")
 
     except Exception as e:
@@ -9,47 +9,45 @@ from app.models.data_models import ConversationState
 from app.services.state_manager_service import StateManagerService
 from app.utils.funcs.parse_llm_output import parse_json_from_string
 from app.services.redis_service import get_redis
+from app.services.context_loader import ContextLoader
 from app.services.telegram_service import send_single_telegram_message
-from app.utils.funcs.funcs import distill_conversation_state
+from app.utils.funcs.funcs import distill_conversation_state_json
 
 from datetime import datetime, timezone
 
 logger = get_logger(__name__)
 state_manager = StateManagerService()
+context_loader = ContextLoader(state_manager)
 redis_client = get_redis()
 
 @celery_app.task(name='main_crews.registration')
-def registration_task(contact_id: str):
+def registration_task(contact_id: str, turn_id: str | None = None):
     """
     Task for handling the customer registration data collection process.
     """
     logger.info(f"[{contact_id}] - Starting registration task.")
-    state, _ = state_manager.get_state(contact_id)
+    context = context_loader.load_for_agent(contact_id, "RegistrationDataCollectorAgent", turn_id)
+    state = context.state
 
     try:
         agent = get_registration_agent()
         task = create_collect_registration_data_task(agent)
         crew = Crew(agents=[agent], tasks=[task], process=Process.sequential, verbose=True)
 
-        user_data_so_far = redis_client.get(f"{contact_id}:user_data_so_far")
-        plan_details = redis_client.get(f"{contact_id}:plan_details")
+        user_data_so_far = context.user_data_so_far
+        plan_details = context.plan_details
 
-        last_processed_messages = redis_client.lrange(f'contacts_messages:waiting:{contact_id}', 0, -1)
+        last_processed_messages = context.waiting_messages
 
         # State Distillation
-        conversation_state_distilled = distill_conversation_state(state, "RegistrationDataCollectorAgent")
+        conversation_state_distilled = distill_conversation_state_json(state, "RegistrationDataCollectorAgent")
 
-        shorterm_history = redis_client.get(f"shorterm_history:{contact_id}")
-        longterm_history_json = redis_client.get(f"longterm_history:{contact_id}")
-        longterm_history = json.loads(longterm_history_json) if longterm_history_json else {}
-        history_messages = "\n\n".join([
-            f"Topic: {topic.get('title', 'N/A')}\nSummary: {topic.get('summary', 'N/A')}"
-            for topic in longterm_history.get("topic_details", [])[-5:]
-        ])
+        shorterm_history = context.shorterm_history
+        history_messages = context.longterm_history_digest(5)
 
         inputs = {
             "timestamp": datetime.now(timezone.utc).isoformat(),
-            "conversation_state": json.dumps(conversation_state_distilled) if conversation_state_distilled else "{}",
+            "conversation_state": conversation_state_distilled,
             "client_message": "\n".join(last_processed_messages),
             "collected_data_so_far": user_data_so_far if user_data_so_far else "{}",
             "plan_details": plan_details if plan_details else "{}",
@@ -62,16 +60,14 @@ def registration_task(contact_id: str):
 
         if updated_state_dict:
 
-            with redis_client.lock(f"lock:state:{contact_id}", timeout=10):
-                state, _ = state_manager.get_state(contact_id)
-
+            def add_extracted_entities(state: ConversationState):
                 if "entities_extracted" in updated_state_dict and updated_state_dict["entities_extracted"]:
                     state_json = state.model_dump()
                     state_json["entities_extracted"] += updated_state_dict["entities_extracted"]
 
-                    state = ConversationState(**{**state.model_dump(), **state_json})
-            
-                state_manager.save_state(contact_id, state)
+                    return ConversationState(**{**state.model_dump(), **state_json})
+
+            state, _ = state_manager.update_state(contact_id, add_extracted_entities, fields=["entities_extracted"])
 
         if response_json:
             redis_client.set(f"{contact_id}:user_data_so_far", json.dumps(response_json))
@@ -8,8 +8,11 @@ from app.config.llm_config import X_llm
 from app.tools.system_operations_tools import system_operations_tool
 from app.crews.agents_definitions.obj_declarations.tasks_declaration import create_execute_system_operations_task
 from app.services.state_manager_service import StateManagerService
+from app.models.data_models import ConversationState
 from app.utils.funcs.parse_llm_output import parse_json_from_string
 from app.services.redis_service import get_redis
+from app.services.context_loader import ContextLoader
+from app.services.barrier_service import system_operations_barrier
 from app.services.callbell_service import send_callbell_message
 from app.crews.src.main_crews.communication import communication_task
 from app.crews.src.secondary_crews.enrichment_crew import trigger_post_processing
@@ -17,17 +20,19 @@ from app.utils.funcs.funcs import distill_conversation_state
 
 logger = get_logger(__name__)
 state_manager = StateManagerService()
+context_loader = ContextLoader(state_manager)
 redis_client = get_redis()
 
 HISTORY_TOPIC_LIMIT = 10
 
 @celery_app.task(name='main_crews.system_operations')
-def system_operations_task(contact_id: str):
+def system_operations_task(contact_id: str, turn_id: str | None = None):
     """
     Task for handling system operations requests.
     """
     logger.info(f"[{contact_id}] - Starting system operations task.")
-    state, _ = state_manager.get_state(contact_id)
+    context = context_loader.load_for_agent(contact_id, "SystemOperationsAgent", turn_id)
+    state = context.state
     
     try:
         llm_w_tools = X_llm.bind_tools([system_operations_tool])
@@ -35,18 +40,10 @@ def system_operations_task(contact_id: str):
         task = create_execute_system_operations_task(agent)
         crew = Crew(agents=[agent], tasks=[task], process=Process.sequential, verbose=True)
 
-        profile = redis_client.get(f"{contact_id}:customer_profile")
-
-        shorterm_history = redis_client.get(f"shorterm_history:{contact_id}")
-
-        longterm_history_json = redis_client.get(f"longterm_history:{contact_id}")
-        longterm_history = json.loads(longterm_history_json) if longterm_history_json else {}
-        longterm_history = "\n\n".join([
-            f"Topic: {topic.get('title', 'N/A')}\nSummary: {topic.get('summary', 'N/A')}"
-            for topic in longterm_history.get("topic_details", [])[-HISTORY_TOPIC_LIMIT:]
-        ])
-
-        last_processed_messages = redis_client.lrange(f'contacts_messages:waiting:{contact_id}', 0, -1)
+        profile = context.customer_profile
+        shorterm_history = context.shorterm_history
+        longterm_history = context.longterm_history_digest(HISTORY_TOPIC_LIMIT)
+        last_processed_messages = context.waiting_messages
 
         # State Distillation
         conversation_state_distilled = distill_conversation_state(state, "SystemOperationsAgent")
@@ -62,48 +59,22 @@ def system_operations_task(contact_id: str):
         }
 
         # Set the flag
-        redis_client.set(f"doing_system_operations:{contact_id}", "true")
+        system_operations_barrier.acquire(contact_id)
         
         result = crew.kickoff(inputs=inputs)
         response_json = parse_json_from_string(result.raw, update=False)
 
         if response_json:
-            with redis_client.lock(f"lock:state:{contact_id}", timeout=10):
-                
-                state, _ = state_manager.get_state(contact_id)
+            redis_client.set(f"{contact_id}:last_system_operation_output", json.dumps(response_json))
+            insufficient_data = response_json.get("status") == "INSUFFICIENT_DATA"
 
-                redis_client.set(f"{contact_id}:last_system_operation_output", json.dumps(response_json))
-                if response_json.get("status") == "INSUFFICIENT_DATA":
+            def apply_operation_result(state: ConversationState):
+                if insufficient_data:
                     # Pause the operation and wait for more user input
                     state.pending_system_operation = str(state.system_action_request)[:]
                     state.system_action_request = None
-                    send_callbell_message(contact_id=contact_id, phone_number=state.metadata.phone_number, messages=[response_json.get("message_to_user", "")])
-
                     state.metadata.current_turn_number += 1
 
-                    # Liberating the lock
-                    redis_client.delete(f'processing:{contact_id}')
-                    logger.info(f'[{contact_id}] - Lock "processing:{contact_id}" LIBERADO no Redis.')
-
-                    redis_client.set(f"{contact_id}:last_processed_messages", '\n'.join(last_processed_messages))
-
-                    trigger_post_processing.apply_async(args=[contact_id])
-
-                    # Cleaning up the messages
-                    all_messages = redis_client.lrange(f'contacts_messages:waiting:{contact_id}', 0, -1)
-                    messages_left = [m for m in all_messages if m not in last_processed_messages]
-                    
-                    pipe = redis_client.pipeline()
-
-                    pipe.delete(f'contacts_messages:waiting:{contact_id}')
-                    if messages_left:
-                        pipe.lpush(f'contacts_messages:waiting:{contact_id}', *messages_left)
-                    
-                    # Deletando a FLAG
-                    pipe.delete(f"doing_system_operations:{contact_id}")
-
-                    pipe.execute()
-
                 else:
                     # The operation is complete, clear all related flags
                     state.system_operation_status = "COMPLETED"
@@ -112,12 +83,37 @@ def system_operations_task(contact_id: str):
                     if state.strategic_plan and "system_action_request" in state.strategic_plan:
                         del state.strategic_plan["system_action_request"]
 
-                    communication_task.apply_async(args=[contact_id])
+            # Side effects only after the state is committed, since the update may be retried
+            state, _ = state_manager.update_state(contact_id, apply_operation_result)
+
+            if insufficient_data:
+                send_callbell_message(contact_id=contact_id, phone_number=state.metadata.phone_number, messages=[response_json.get("message_to_user", "")])
+
+                # Liberating the lock
+                redis_client.delete(f'processing:{contact_id}')
+                logger.info(f'[{contact_id}] - Lock "processing:{contact_id}" LIBERADO no Redis.')
+
+                redis_client.set(f"{contact_id}:last_processed_messages", '\n'.join(last_processed_messages))
+
+                trigger_post_processing.apply_async(args=[contact_id])
+
+                # Cleaning up the messages
+                all_messages = redis_client.lrange(f'contacts_messages:waiting:{contact_id}', 0, -1)
+                messages_left = [m for m in all_messages if m not in last_processed_messages]
+                
+                pipe = redis_client.pipeline()
+
+                pipe.delete(f'contacts_messages:waiting:{contact_id}')
+                if messages_left:
+                    pipe.lpush(f'contacts_messages:waiting:{contact_id}', *messages_left)
+
+                pipe.execute()
 
-                state_manager.save_state(contact_id, state)
+            else:
+                communication_task.apply_async(args=[contact_id], kwargs={"turn_id": turn_id})
 
-        # Deletando a FLAG
-        redis_client.delete(f"doing_system_operations:{contact_id}")
+        # Deletando a FLAG e acordando quem estiver esperando
+        system_operations_barrier.release(contact_id)
 
         return contact_id
     except Exception as e:
@@ -9,33 +9,37 @@ from app.crews.agents_definitions.obj_declarations.tasks_declaration import crea
 from app.services.state_manager_service import StateManagerService
 from app.utils.funcs.parse_llm_output import parse_json_from_string
 from app.services.redis_service import get_redis
+from app.services.context_loader import ContextLoader
 from app.crews.src.main_crews.system_operations import system_operations_task
 
 logger = get_logger(__name__)
 state_manager = StateManagerService()
+context_loader = ContextLoader(state_manager)
 redis_client = get_redis()
 
 @celery_app.task(name='main_crews.verify_system_action')
-def verify_system_action_task(contact_id: str):
+def verify_system_action_task(contact_id: str, turn_id: str | None = None):
     """
     A task that runs to proactively check if a system action is needed.
     """
     logger.info(f"[{contact_id}] - Starting verify system action task.")
-    state, _ = state_manager.get_state(contact_id)
+    # State (as of the start of the turn), histories and messages in one round trip
+    context = context_loader.load_for_agent(contact_id, "VerifySystemActionAgent", turn_id)
+    metadata = context.state.metadata
 
     # Lógica para a verificação ocorrer nos trẽs primeiros turnos sequencialmente
-    now_turn = state.metadata.current_turn_number
+    now_turn = metadata.current_turn_number
     moved_turn = now_turn - 2
     rounded_turn = max(0, moved_turn)
 
     # Nos dois primeiros turnos temos numeros negativos depois da subtração, e então os arredondamos a 0, fazendo com que passe na verificação
     # 0 % 2 = 0
     if rounded_turn % 2 != 0:
-        logger.info(f"[{contact_id}] - Turn {state.metadata.current_turn_number}. Skipping verify_system_action.")
+        logger.info(f"[{contact_id}] - Turn {metadata.current_turn_number}. Skipping verify_system_action.")
         return contact_id
 
     # Verificar se já há uma operação de sistema em andamento
-    if state.pending_system_operation:
+    if context.state.pending_system_operation:
         logger.info(f"[{contact_id}] Theres already a system operation in progress. Skipping.")
         return contact_id
     
@@ -45,20 +49,14 @@ def verify_system_action_task(contact_id: str):
         task = create_verify_system_action_task(agent)
         crew = Crew(agents=[agent], tasks=[task], process=Process.sequential, verbose=True)
 
-        # Fetch history of past system actions to avoid redundancy
-        system_actions_history_json = redis_client.get(f"{contact_id}:system_actions_history")
-        system_actions_history = json.loads(system_actions_history_json) if system_actions_history_json else []
+        # History of past system actions, to avoid redundancy
+        system_actions_history = context.system_actions_history
 
-        shorterm_history = redis_client.get(f"shorterm_history:{contact_id}")
-        longterm_history_json = redis_client.get(f"longterm_history:{contact_id}")
-        longterm_history = json.loads(longterm_history_json) if longterm_history_json else {}
-        history_messages = "\n\n".join([
-            f"Topic: {topic.get('title', 'N/A')}\nSummary: {topic.get('summary', 'N/A')}"
-            for topic in longterm_history.get("topic_details", [])[-5:]
-        ])
+        shorterm_history = context.shorterm_history
+        history_messages = context.longterm_history_digest(5)
         
         inputs = {
-            "client_message": "\n".join(redis_client.lrange(f'contacts_messages:waiting:{contact_id}', 0, -1)),
+            "client_message": "\n".join(context.waiting_messages),
             "history_of_system_actions": json.dumps(system_actions_history),
             "shorterm_history": str(shorterm_history),
             "longterm_history": history_messages,
@@ -71,12 +69,9 @@ def verify_system_action_task(contact_id: str):
             action_request = parsed_result.get("system_action_request")
             action_request_datetime = f"{action_request} | {datetime.now(timezone.utc)}"
             
-            with redis_client.lock(f"lock:state:{contact_id}", timeout=10):
-                state, _ = state_manager.get_state(contact_id)
-                state.system_action_request = str(action_request)
-                state_manager.save_state(contact_id, state)
+            state_manager.patch_state(contact_id, {"system_action_request": str(action_request)})
 
-            system_operations_task.apply_async(args=[contact_id,])
+            system_operations_task.apply_async(args=[contact_id,], kwargs={"turn_id": turn_id})
 
             system_actions_history.append(action_request_datetime)
             redis_client.set(f"{contact_id}:system_actions_history", json.dumps(system_actions_history))
@@ -11,8 +11,8 @@ from app.services.celery_service import celery_app
 from app.utils.funcs.parse_llm_output import parse_json_from_string
 from app.services.callbell_service import get_contact_messages, send_message
 from app.services.state_manager_service import StateManagerService
-from app.models.data_models import ConversationState
-from app.utils.funcs.funcs import distill_conversation_state
+from app.utils.funcs.funcs import distill_conversation_state_json
+from app.services.context_loader import queue_history_digests
 
 SUMMARIZER_HISTORY_TOPIC_LIMIT = 15
 
@@ -177,8 +177,11 @@ def history_summarizer_task(previous_task_result=None, *, contact_id: str):
     output = parse_json_from_string(result.raw, update=False)
     
     if output:
-        # Save the main summary
-        redis_client.set(summary_key, json.dumps(output))
+        # Save the main summary, with the digests the crews read instead of formatting topic_details themselves
+        pipe = redis_client.pipeline()
+        pipe.set(summary_key, json.dumps(output))
+        queue_history_digests(pipe, contact_id, output)
+        pipe.execute()
         
         # Save details for each topic and check for noise
         for topic_detail in output.get('topic_details', []):
@@ -267,14 +270,14 @@ def state_summarizer_task(longterm_history: dict, contact_id: str):
 
     crew = Crew(agents=[agent], tasks=[task], process=Process.sequential, verbose=True)
 
-    conversation_state_distilled = distill_conversation_state(state, "StateSummarizerAgent")
+    conversation_state_distilled = distill_conversation_state_json(state, "StateSummarizerAgent")
 
     shorterm_history = redis_client.get(f"shorterm_history:{contact_id}")
 
     inputs = {
         "longterm_history": json.dumps(longterm_history),
         "shorterm_history": str(shorterm_history),
-        "last_turn_state": json.dumps(conversation_state_distilled),
+        "last_turn_state": conversation_state_distilled,
         "client_message": str(redis_client.get(f"{contact_id}:last_processed_messages"))
     }
     
@@ -292,11 +295,7 @@ def state_summarizer_task(longterm_history: dict, contact_id: str):
         if enriched_state.get("metadata"):
             enriched_state["metadata"]["current_turn_number"] = current_turn_number
 
-        with redis_client.lock(f"lock:state:{contact_id}", timeout=10):
-            state, _ = state_manager.get_state(contact_id)
-            new_state = ConversationState(**{**state.model_dump(), **enriched_state})
-
-            state_manager.save_state(contact_id, new_state)
+        state_manager.merge(contact_id, enriched_state)
 
     logger.info(f"[{contact_id}] - Finished state summarization.")
     return enriched_state
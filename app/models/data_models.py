@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional, Tuple
 
 # --- Models for Conversation State ---
 class StateMetadata(BaseModel):
@@ -42,6 +42,68 @@ class ConversationGoal(BaseModel):
     status: str
 
 
+# --- Compaction policies of the bounded state lists ---
+# Each policy receives the items (oldest first) and the cap, and returns (kept, evicted), both oldest first.
+def _dedup_latest(items: list, key: Callable[[Any], Any]) -> list:
+    """Keeps only the latest occurrence of each key; earlier ones are superseded and dropped."""
+    latest = {key(item): index for index, item in enumerate(items)}
+    return [item for index, item in enumerate(items) if latest[key(item)] == index]
+
+
+def _keep_most_recent(items: list, limit: int) -> Tuple[list, list]:
+    if not limit or len(items) <= limit:
+        return items, []
+    return items[-limit:], items[:-limit]
+
+
+def _compact_entities(items: List["EntityItem"], limit: int) -> Tuple[list, list]:
+    return _keep_most_recent(_dedup_latest(items, lambda item: item.entity), limit)
+
+
+def _compact_sentiment_history(items: List[Dict[str, Any]], limit: int) -> Tuple[list, list]:
+    # Ring buffer: only the most recent window is kept
+    return _keep_most_recent(items, limit)
+
+
+def _compact_objections(items: List["ObjectionItem"], limit: int) -> Tuple[list, list]:
+    if not limit or len(items) <= limit:
+        return items, []
+
+    # Addressed objections are evicted before open ones, the oldest first
+    eviction_order = sorted(range(len(items)), key=lambda index: (items[index].status not in RESOLVED_OBJECTION_STATUSES, items[index].turn_raised, index))
+    evicted = set(eviction_order[:len(items) - limit])
+    return [item for index, item in enumerate(items) if index not in evicted], [item for index, item in enumerate(items) if index in evicted]
+
+
+def _compact_qualification(items: List["QualificationItem"], limit: int) -> Tuple[list, list]:
+    return _keep_most_recent(_dedup_latest(items, lambda item: item.topic), limit)
+
+
+RESOLVED_OBJECTION_STATUSES = {"addressed", "resolved"}
+
+STATE_LIST_COMPACTION_POLICIES: Dict[str, Callable[[list, int], Tuple[list, list]]] = {
+    "entities_extracted": _compact_entities,
+    "user_sentiment_history": _compact_sentiment_history,
+    "unresolved_objections": _compact_objections,
+    "qualification_tracker": _compact_qualification,
+}
+
+
+def compact_state_list(field: str, items: list, limit: int) -> Tuple[list, list]:
+    """
+    Applies the compaction policy of a bounded state list.
+
+    Args:
+        field (str): A key of STATE_LIST_COMPACTION_POLICIES.
+        items (list): The items of the field, oldest first.
+        limit (int): Maximum items kept; 0 only deduplicates.
+
+    Returns:
+        Tuple[list, list]: The kept items and the evicted ones (to be archived), both oldest first.
+    """
+    return STATE_LIST_COMPACTION_POLICIES[field](items, limit)
+
+
 class ConversationState(BaseModel):
     metadata: StateMetadata
     prefers_audio: bool = False
@@ -61,4 +123,66 @@ class ConversationState(BaseModel):
     qualification_tracker: List[QualificationItem] = []
     last_turn_recap: Optional[TurnRecap] = None
     unresolved_objections: List[ObjectionItem] = []
-    conversation_goals: List[ConversationGoal] = []
\ No newline at end of file
+    conversation_goals: List[ConversationGoal] = []
+
+    def compact(self, limits: Dict[str, int]) -> Dict[str, list]:
+        """
+        Compacts, in place, the bounded list fields present in `limits` (field -> cap):
+        entities deduplicated by `entity`, sentiment history as a ring buffer, addressed
+        objections evicted first and qualification items deduplicated by `topic`.
+
+        Returns:
+            Dict[str, list]: The evicted items of each field that overflowed, oldest first.
+        """
+        evicted_by_field = {}
+        for field, limit in limits.items():
+            items = getattr(self, field)
+            kept, evicted = compact_state_list(field, items, limit)
+            if len(kept) != len(items):
+                setattr(self, field, kept)
+            if evicted:
+                evicted_by_field[field] = evicted
+        return evicted_by_field
+
+
+# --- Models for Crew Context ---
+def format_history_digest(longterm_history: Dict[str, Any], limit: int) -> str:
+    """Title and summary of the last `limit` topics of the long-term history, as given to the agents."""
+    return "\n\n".join([
+        f"Topic: {topic.get('title', 'N/A')}\nSummary: {topic.get('summary', 'N/A')}"
+        for topic in longterm_history.get("topic_details", [])[-limit:]
+    ])
+
+
+class ContextBundle(BaseModel):
+    """Everything a crew task reads from Redis to build its inputs, fetched in one round trip (see ContextLoader)."""
+    contact_id: str
+    state: Optional[ConversationState] = None
+    is_new_state: bool = False
+    shorterm_history: Optional[str] = None
+    longterm_history: Dict[str, Any] = {}
+    longterm_history_digests: Dict[int, str] = {}
+    customer_profile: Optional[str] = None
+    last_system_operation_output: Optional[str] = None
+    waiting_messages: List[str] = []
+    sended_catalogs: List[str] = []
+    system_actions_history: List[str] = []
+    user_data_so_far: Optional[str] = None
+    plan_details: Optional[str] = None
+    getting_data_from_user: Optional[str] = None
+
+    def longterm_history_digest(self, limit: int) -> str:
+        """The precomputed digest of the last `limit` topics, or one formatted from `longterm_history`."""
+        if limit in self.longterm_history_digests:
+            return self.longterm_history_digests[limit]
+        return format_history_digest(self.longterm_history, limit)
+
+
+# --- Models for Webhook Ingest ---
+class IncomingMessage(BaseModel):
+    contact_uuid: str
+    contact_info: Dict[str, Any]
+    message_uuid: Optional[str] = None
+    text: str = ""
+    audio_urls: List[str] = []
+    image_urls: List[str] = []
@@ -0,0 +1,122 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import requests
+from pydantic import BaseModel
+
+from app.core.logger import get_logger
+from app.config.settings import settings
+from app.services.redis_service import get_redis
+from app.services.transcript_service import transcript
+from app.services.image_describer_service import ImageDescriptionAPI
+
+logger = get_logger(__name__)
+redis_client = get_redis()
+
+ATTACHMENT_DOWNLOAD_TIMEOUT = 30
+
+AUDIO_ATTACHMENT = "audio"
+IMAGE_ATTACHMENT = "image"
+
+
+class FetchedAttachment(BaseModel):
+    url: str
+    kind: str
+    content: Optional[bytes] = None
+    content_hash: Optional[str] = None
+
+
+def _static_url_part(url: str) -> str:
+    return url.split('uploads/')[1].split('?')[0]
+
+
+def fetch_attachment(url: str, kind: str) -> FetchedAttachment:
+    """
+    Downloads and hashes a single attachment. The hash is the cache key of its transcription / description.
+    A failed download leaves `content` empty.
+    """
+    try:
+        content = requests.get(url, timeout=ATTACHMENT_DOWNLOAD_TIMEOUT).content
+        return FetchedAttachment(url=url, kind=kind, content=content, content_hash=hashlib.sha256(content).hexdigest())
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Failed to fetch attachment from URL {url}: {e}")
+        return FetchedAttachment(url=url, kind=kind)
+
+
+def _describe_attachment(attachment: FetchedAttachment, client_description: ImageDescriptionAPI) -> Tuple[str, str]:
+    """
+    Transcribes / describes one attachment.
+
+    Returns:
+        Tuple[str, str]: The message queued for the contact and the value stored in the attachments hash.
+            Both are empty when nothing could be extracted.
+    """
+    if attachment.kind == AUDIO_ATTACHMENT:
+        transcription = transcript(attachment.url, audio_bytes=attachment.content, content_hash=attachment.content_hash)
+        if transcription:
+            return f"(Áudio transcrito): {transcription.strip()}", transcription
+        return "", ""
+
+    if attachment.content is None:
+        return "", ""
+
+    description_json = client_description.describe_image(
+        image_url=attachment.url, image_bytes=attachment.content, content_hash=attachment.content_hash,
+    )
+    description = str(description_json.get('data', {}).get('content', ''))
+    if description:
+        message = f"(Descrição de imagem): {description.strip()}"
+        return message, message
+    return "", ""
+
+
+def process_attachments_batch(contact_uuid: str, audio_urls: List[str], image_urls: List[str], client_description: ImageDescriptionAPI) -> int:
+    """
+    Processes every attachment of a webhook in one go.
+
+    Downloads and hashes all files concurrently, then runs the transcriptions / descriptions in
+    parallel and queues the results with a single round trip. Results are grouped by kind: all
+    audios first, then all images, each in webhook order (the interleaving between kinds is lost
+    when the webhook is parsed).
+
+    Args:
+        contact_uuid (str): The unique ID of the contact.
+        audio_urls (List[str]): Audio attachment URLs.
+        image_urls (List[str]): Image attachment URLs.
+        client_description (ImageDescriptionAPI): Client used for the image descriptions.
+
+    Returns:
+        int: Number of messages queued for the contact.
+    """
+    attachments = [(url, AUDIO_ATTACHMENT) for url in audio_urls] + [(url, IMAGE_ATTACHMENT) for url in image_urls]
+    if not attachments:
+        return 0
+
+    logger.info(f"[{contact_uuid}] - Processing batch of {len(attachments)} attachments.")
+
+    with ThreadPoolExecutor(max_workers=min(settings.ATTACHMENT_MAX_WORKERS, len(attachments))) as executor:
+        fetched = list(executor.map(lambda attachment: fetch_attachment(*attachment), attachments))
+        futures = [executor.submit(_describe_attachment, attachment, client_description) for attachment in fetched]
+
+        messages = []
+        extracted = {}
+        for attachment, future in zip(fetched, futures):
+            try:
+                message, value = future.result()
+            except Exception as e:
+                logger.error(f"[{contact_uuid}] - Error processing {attachment.kind} attachment {attachment.url}: {e}")
+                continue
+
+            if message:
+                messages.append(message)
+                extracted[_static_url_part(attachment.url)] = value
+
+    if messages:
+        pipe = redis_client.pipeline()
+        pipe.rpush(f'contacts_messages:waiting:{contact_uuid}', *messages)
+        pipe.hset(f'{contact_uuid}:attachments', mapping=extracted)
+        pipe.execute()
+
+    logger.info(f"[{contact_uuid}] - Attachment batch done: {len(messages)}/{len(attachments)} processed.")
+    return len(messages)
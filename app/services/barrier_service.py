@@ -0,0 +1,150 @@
+import time
+from typing import Iterable
+
+from app.core.logger import get_logger
+from app.services.redis_service import get_redis
+
+logger = get_logger(__name__)
+redis_client = get_redis()
+
+# The flag outlives the longest Celery task (task_time_limit), so a crashed owner never blocks waiters forever.
+BARRIER_FLAG_TTL = 600
+BARRIER_SIGNAL_TTL = 60
+BARRIER_SIGNAL_MAXLEN = 10
+
+# Upper bound for a single blocking XREAD; waiters re-check the flags after it so an expired flag is noticed.
+BARRIER_MAX_BLOCK_MS = 5000
+BARRIER_DEFAULT_TIMEOUT = 300
+
+PENDING_MEDIA_TIMEOUT = 180
+
+# Decrements the counter, drops it once nothing is pending and wakes the waiters, all in one round trip.
+# KEYS[1] = counter key, KEYS[2] = signal stream; ARGV[1] = amount, ARGV[2] = stream maxlen, ARGV[3] = stream ttl
+_COUNTER_RELEASE_LUA = """
+local remaining = redis.call('DECRBY', KEYS[1], ARGV[1])
+if remaining <= 0 then
+    redis.call('DEL', KEYS[1])
+end
+redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[2], '*', 'event', 'released')
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return remaining
+"""
+
+
+class CompletionBarrier:
+    """
+    Per-contact completion barrier stored in Redis.
+
+    The owner marks the barrier as busy with `acquire` and clears it with `release`.
+    Releasing also appends an event to a small per-contact stream, so waiters block on
+    that stream with XREAD and wake up as soon as the owner finishes, instead of
+    polling the flag every second.
+    """
+
+    def __init__(self, name: str, flag_ttl: int = BARRIER_FLAG_TTL):
+        self.name = name
+        self.flag_ttl = flag_ttl
+
+    def flag_key(self, contact_id: str) -> str:
+        """Key of the busy flag. Kept as `{name}:{contact_id}` for compatibility with existing flags."""
+        return f"{self.name}:{contact_id}"
+
+    def signal_key(self, contact_id: str) -> str:
+        """Key of the stream that receives the completion events."""
+        return f"barrier:{self.name}:{contact_id}"
+
+    def acquire(self, contact_id: str):
+        """Marks the barrier as busy for the contact."""
+        redis_client.set(self.flag_key(contact_id), "1", ex=self.flag_ttl)
+
+    def release(self, contact_id: str):
+        """Clears the busy flag and wakes every waiter of the contact in a single round trip."""
+        signal_key = self.signal_key(contact_id)
+
+        pipe = redis_client.pipeline()
+        pipe.delete(self.flag_key(contact_id))
+        pipe.xadd(signal_key, {"event": "released"}, maxlen=BARRIER_SIGNAL_MAXLEN, approximate=True)
+        pipe.expire(signal_key, BARRIER_SIGNAL_TTL)
+        pipe.execute()
+
+    def is_active(self, contact_id: str) -> bool:
+        """Returns True while the barrier is held for the contact."""
+        return bool(redis_client.exists(self.flag_key(contact_id)))
+
+
+class CountingBarrier(CompletionBarrier):
+    """
+    Completion barrier that can be held several times at once.
+
+    The flag is a counter: every unit of pending work increments it and every finished
+    unit decrements it. The barrier is released when the counter reaches zero, so
+    waiters check a single key in O(1) no matter how many jobs are running.
+    """
+
+    def __init__(self, name: str, flag_ttl: int = BARRIER_FLAG_TTL):
+        super().__init__(name, flag_ttl)
+        self._release_script = redis_client.register_script(_COUNTER_RELEASE_LUA)
+
+    def acquire(self, contact_id: str, amount: int = 1):
+        """Registers `amount` units of pending work for the contact."""
+        flag_key = self.flag_key(contact_id)
+
+        pipe = redis_client.pipeline()
+        pipe.incrby(flag_key, amount)
+        pipe.expire(flag_key, self.flag_ttl)
+        pipe.execute()
+
+    def release(self, contact_id: str, amount: int = 1) -> int:
+        """Marks `amount` units as done and returns how many are still pending."""
+        remaining = self._release_script(
+            keys=[self.flag_key(contact_id), self.signal_key(contact_id)],
+            args=[amount, BARRIER_SIGNAL_MAXLEN, BARRIER_SIGNAL_TTL],
+        )
+        return max(0, int(remaining))
+
+
+def wait_for_barriers(contact_id: str, barriers: Iterable[CompletionBarrier], timeout: float = BARRIER_DEFAULT_TIMEOUT) -> bool:
+    """
+    Blocks until none of the given barriers is held for the contact.
+
+    The last event id of every signal stream is read in the same transaction as the
+    flags, so a release that happens between the check and the XREAD is never missed.
+
+    Args:
+        contact_id (str): The unique ID of the contact.
+        barriers (Iterable[CompletionBarrier]): Barriers to wait for.
+        timeout (float): Maximum time to wait, in seconds.
+
+    Returns:
+        bool: True if every barrier was released, False if the timeout expired first.
+    """
+    barriers = list(barriers)
+    deadline = time.monotonic() + timeout
+
+    while True:
+        pipe = redis_client.pipeline()
+        for barrier in barriers:
+            pipe.exists(barrier.flag_key(contact_id))
+            pipe.xrevrange(barrier.signal_key(contact_id), count=1)
+        results = pipe.execute()
+
+        streams = {}
+        for barrier, is_held, last_event in zip(barriers, results[0::2], results[1::2]):
+            if is_held:
+                streams[barrier.signal_key(contact_id)] = last_event[0][0] if last_event else "0-0"
+
+        if not streams:
+            return True
+
+        remaining_ms = int((deadline - time.monotonic()) * 1000)
+        if remaining_ms <= 0:
+            logger.warning(f"[{contact_id}] - Timed out waiting for barriers: {list(streams.keys())}")
+            return False
+
+        redis_client.xread(streams, block=min(remaining_ms, BARRIER_MAX_BLOCK_MS))
+
+
+strategy_barrier = CompletionBarrier("doing_strategy")
+refine_strategy_barrier = CompletionBarrier("refining_strategy")
+system_operations_barrier = CompletionBarrier("doing_system_operations")
+pending_media_barrier = CountingBarrier("pending_media")
@@ -0,0 +1,102 @@
+import json
+import pickle
+from dataclasses import dataclass
+from typing import Any
+
+import zstandard
+from pydantic import BaseModel
+
+from app.config.settings import settings
+
+# Envelope of a cached value: a type tag byte, a compression byte, then the payload.
+TAG_JSON = b"J"      # json.dumps of the result
+TAG_BYTES = b"B"     # raw bytes (e.g. synthesized audio)
+TAG_PYDANTIC = b"P"  # pickle of a Pydantic model, so the model class comes back as well
+# Markers written by cache_result instead of a result
+TAG_NEGATIVE = b"N"  # the function returned None for these arguments (negative cache entry)
+TAG_ERROR = b"E"     # the function raised; json with the exception type and message
+
+COMPRESSION_NONE = b"-"
+COMPRESSION_ZSTD = b"z"
+
+# Compression is kept only when it saves at least this share of the payload (audio, images... are already compressed)
+MIN_COMPRESSION_SAVING = 0.1
+
+
+@dataclass
+class CachedFailure:
+    """A failure of the cached function, decoded from a TAG_ERROR marker."""
+    error_type: str
+    message: str
+
+
+class CacheCodec:
+    """
+    Encodes the results of `cache_result` into a tagged, binary-safe envelope and decodes them back.
+
+    JSON values, bytes and Pydantic models each keep their type through the round trip. Payloads of at
+    least `compress_min_bytes` are compressed with zstd when that actually makes them smaller.
+    Values written before the envelope existed (plain JSON) are still decoded.
+    """
+
+    def __init__(self, compress_min_bytes: int = settings.CACHE_COMPRESSION_MIN_BYTES, level: int = settings.CACHE_COMPRESSION_LEVEL):
+        self.compress_min_bytes = compress_min_bytes
+        self.level = level
+
+    def encode(self, value: Any) -> bytes:
+        """
+        Raises:
+            TypeError: If the value is neither bytes, a Pydantic model nor JSON serializable.
+        """
+        if isinstance(value, (bytes, bytearray)):
+            tag, payload = TAG_BYTES, bytes(value)
+        elif isinstance(value, BaseModel):
+            tag, payload = TAG_PYDANTIC, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        else:
+            tag, payload = TAG_JSON, json.dumps(value).encode()
+
+        if self.compress_min_bytes and len(payload) >= self.compress_min_bytes:
+            compressed = zstandard.ZstdCompressor(level=self.level).compress(payload)
+            if len(compressed) <= len(payload) * (1 - MIN_COMPRESSION_SAVING):
+                return tag + COMPRESSION_ZSTD + compressed
+
+        return tag + COMPRESSION_NONE + payload
+
+    def decode(self, raw: bytes) -> Any:
+        """
+        Raises:
+            ValueError: If the value is neither an envelope nor legacy JSON.
+        """
+        tag, compression, payload = raw[:1], raw[1:2], raw[2:]
+
+        if tag not in (TAG_JSON, TAG_BYTES, TAG_PYDANTIC, TAG_NEGATIVE, TAG_ERROR) or compression not in (COMPRESSION_NONE, COMPRESSION_ZSTD):
+            # Legacy value, stored as plain JSON (JSON never starts with a tag byte)
+            return json.loads(raw)
+
+        if compression == COMPRESSION_ZSTD:
+            payload = zstandard.ZstdDecompressor().decompress(payload)
+
+        if tag == TAG_NEGATIVE:
+            return None
+        if tag == TAG_ERROR:
+            return CachedFailure(**json.loads(payload))
+        if tag == TAG_BYTES:
+            return payload
+        if tag == TAG_PYDANTIC:
+            return pickle.loads(payload)
+        return json.loads(payload)
+
+    def encode_negative(self) -> bytes:
+        """Marker of a None result, kept apart from a cached JSON null so it can have its own TTL."""
+        return TAG_NEGATIVE + COMPRESSION_NONE
+
+    def encode_error(self, error: Exception) -> bytes:
+        """Marker of a failure, decoded as a `CachedFailure`."""
+        return TAG_ERROR + COMPRESSION_NONE + json.dumps({"error_type": type(error).__name__, "message": str(error)}).encode()
+
+    def is_marker(self, raw: bytes) -> bool:
+        """True for negative and error markers, as opposed to cached results."""
+        return raw[:1] in (TAG_NEGATIVE, TAG_ERROR) and raw[1:2] == COMPRESSION_NONE
+
+
+default_cache_codec = CacheCodec()
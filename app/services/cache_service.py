@@ -1,53 +1,391 @@
 import json
 import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
 from functools import wraps
-from app.services.redis_service import get_redis
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.services.redis_service import get_binary_redis
+from app.services.cache_codec import CacheCodec, CachedFailure, default_cache_codec
 from app.core.logger import get_logger
 
 logger = get_logger(__name__)
+# Cached values are tagged envelopes (see CacheCodec), so they are read and written as bytes
+binary_redis_client = get_binary_redis()
+
+# Single-flight: on a miss, the worker holding the lease computes and the others wait for its result.
+# The lease outlives a slow external call; if the owner dies, waiters take over once it expires.
+CACHE_LEASE_TTL = 60
+CACHE_WAIT_TIMEOUT = 60
+CACHE_SIGNAL_TTL = 60
+CACHE_SIGNAL_MAXLEN = 10
+CACHE_MAX_BLOCK_MS = 5000
+# Failures are remembered (cache_errors=True) for this long, so retries do not hammer a failing service
+CACHE_ERROR_BACKOFF = 30
+
+# Stores the result, drops the lease (only if still ours) and wakes the waiters, in one round trip.
+# KEYS[1] = cache key, KEYS[2] = lease key, KEYS[3] = signal stream
+# ARGV[1] = value ('' to only release), ARGV[2] = ttl, ARGV[3] = lease token, ARGV[4] = stream maxlen, ARGV[5] = stream ttl
+_STORE_AND_RELEASE_LUA = """
+if ARGV[1] ~= '' then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+end
+if redis.call('GET', KEYS[2]) == ARGV[3] then
+    redis.call('DEL', KEYS[2])
+end
+redis.call('XADD', KEYS[3], 'MAXLEN', '~', ARGV[4], '*', 'event', 'stored')
+redis.call('EXPIRE', KEYS[3], ARGV[5])
+return 1
+"""
+_store_and_release = binary_redis_client.register_script(_STORE_AND_RELEASE_LUA)
+
+# Decorated function name -> its CacheStats
+_cache_stats: Dict[str, "CacheStats"] = {}
+
+
+class CachedCallError(Exception):
+    """
+    Raised in place of calling a function decorated with `cache_result(cache_errors=True)` while a recent
+    failure for the same arguments is within its backoff window.
+    """
+
+    def __init__(self, failure: CachedFailure):
+        self.error_type = failure.error_type
+        super().__init__(f"{failure.error_type}: {failure.message} (cached failure, backing off)")
 
-def cache_result(ttl: int = 3600):
+
+class CacheStats:
+    """Per-process counters of a decorated function."""
+
+    FIELDS = (
+        "local_hits", "hits", "stale_hits", "negative_hits", "error_hits", "misses", "waits", "wait_timeouts",
+        "refreshes", "refresh_errors", "errors",
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def incr(self, field: str):
+        with self._lock:
+            self._counts[field] += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+
+class LocalLRUCache:
+    """
+    Bounded in-process LRU of the raw cached payloads, each kept for at most `ttl` seconds.
+    Payloads are decoded on every hit, so callers never share a mutable result.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def set(self, key: str, payload: Any, ttl: Optional[float] = None):
+        """Stores the payload for `ttl` seconds, at most the cache's own ttl."""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _cache_key(func: Callable, args: tuple, kwargs: dict) -> str:
+    arg_representation = {
+        'args': [str(a) for a in args],
+        'kwargs': {k: str(v) for k, v in sorted(kwargs.items())}
+    }
+    key_string = f"{func.__name__}:{json.dumps(arg_representation, sort_keys=True)}"
+    return f"cache:{hashlib.sha256(key_string.encode('utf-8')).hexdigest()}"
+
+
+def get_cache_stats() -> Dict[str, Dict[str, int]]:
+    """Counters of every function decorated with `cache_result`, in this process."""
+    return {name: stats.snapshot() for name, stats in _cache_stats.items()}
+
+
+def cache_result(
+    ttl: int = 3600,
+    stale_ttl: int = 0,
+    negative_ttl: Optional[int] = None,
+    cache_errors: bool = False,
+    error_backoff: int = CACHE_ERROR_BACKOFF,
+    local_maxsize: int = 0,
+    local_ttl: float = 60,
+    lease_ttl: int = CACHE_LEASE_TTL,
+    wait_timeout: float = CACHE_WAIT_TIMEOUT,
+    codec: Optional[CacheCodec] = None,
+):
     """
     A decorator to cache the result of a function in Redis.
 
     The cache key is generated from the function's name and its arguments.
-    The result is stored in Redis for a specified time-to-live (ttl).
+    The result is stored in Redis for a specified time-to-live (ttl), encoded by `CacheCodec`: JSON
+    values, bytes and Pydantic models all come back with their type.
+
+    On a miss, only the worker that takes the key's lease in Redis runs the function; concurrent callers
+    (in any process) block on the key's signal stream until the result is stored, instead of all calling
+    the external service. If the lease owner fails, a waiter takes over; past `wait_timeout` a waiter
+    computes on its own.
+
+    Stale-while-revalidate: with `stale_ttl`, a value older than `ttl` is still returned right away for
+    `stale_ttl` more seconds, while a background thread refreshes it (one refresh per key across workers,
+    through the same lease). Only after `ttl + stale_ttl` does a caller wait for a synchronous recompute.
+    The age of a value comes from the TTL of its key, read in the same round trip as the value.
+
+    Negative and error caching: with `negative_ttl`, a None result is stored as a negative entry for that
+    long (instead of `ttl`, and never served stale), so it is told apart from a miss. With `cache_errors`,
+    a raised exception is remembered for `error_backoff` seconds: callers (and the waiters of that call)
+    get a `CachedCallError` instead of calling the function again.
+
+    Counters (local_hits, hits, stale_hits, negative_hits, error_hits, misses, waits, wait_timeouts,
+    refreshes, refresh_errors, errors) are available through the wrapper's `cache_stats()` and
+    `get_cache_stats()`; `waits` are the misses served by another worker's result.
 
     Args:
         ttl (int): The time-to-live for the cache in seconds. Default is 3600 (1 hour).
+        stale_ttl (int): Seconds past `ttl` during which the stale value is served while it is refreshed.
+        negative_ttl (Optional[int]): TTL of None results. None caches them like any other result.
+        cache_errors (bool): Remember failures of the function and back off instead of retrying it.
+        error_backoff (int): Seconds a failure is remembered when `cache_errors` is set.
+        local_maxsize (int): Entries of the in-process LRU tier checked before Redis; 0 disables it.
+        local_ttl (float): Seconds an entry stays in the in-process tier (capped by `ttl`).
+        lease_ttl (int): Seconds a worker may hold the lease while computing.
+        wait_timeout (float): Maximum time a caller waits for the lease owner's result.
+        codec (Optional[CacheCodec]): Codec of the cached values. Defaults to the one configured in settings.
     """
+    codec = codec or default_cache_codec
+    # The key itself lives until the hard expiry
+    stored_ttl = ttl + stale_ttl
+
     def decorator(func):
+        stats = _cache_stats.setdefault(func.__qualname__, CacheStats())
+        local_cache = LocalLRUCache(local_maxsize, min(local_ttl, ttl)) if local_maxsize > 0 else None
+        # Keys with a background refresh running in this process
+        refreshing = set()
+        refreshing_lock = threading.Lock()
+
+        def serve(cache_key: str, payload: bytes, fresh_for: Optional[float] = None, remember: bool = True) -> Any:
+            """Decodes a cached payload (keeping it in the local tier), raising for a cached failure."""
+            value = codec.decode(payload)
+            if codec.is_marker(payload):
+                marker_ttl = error_backoff if isinstance(value, CachedFailure) else (negative_ttl if negative_ttl is not None else ttl)
+                fresh_for = marker_ttl if fresh_for is None else min(fresh_for, marker_ttl)
+
+            if remember and local_cache is not None:
+                local_cache.set(cache_key, payload, fresh_for)
+
+            if isinstance(value, CachedFailure):
+                stats.incr("error_hits")
+                raise CachedCallError(value)
+            if value is None and codec.is_marker(payload):
+                stats.incr("negative_hits")
+            return value
+
+        def store(cache_key: str, lease_token: Optional[str], payload: bytes, payload_ttl: int):
+            lease_key, signal_key = f"{cache_key}:lease", f"{cache_key}:signal"
+            if lease_token is not None:
+                _store_and_release(keys=[cache_key, lease_key, signal_key], args=[payload, payload_ttl, lease_token, CACHE_SIGNAL_MAXLEN, CACHE_SIGNAL_TTL])
+            else:
+                binary_redis_client.setex(cache_key, payload_ttl, payload)
+
+            if local_cache is not None:
+                local_cache.set(cache_key, payload, payload_ttl)
+
+        def release(cache_key: str, lease_token: Optional[str]):
+            """Drops the lease without touching the cached value, waking the waiters."""
+            if lease_token is not None:
+                _store_and_release(keys=[cache_key, f"{cache_key}:lease", f"{cache_key}:signal"], args=["", stored_ttl, lease_token, CACHE_SIGNAL_MAXLEN, CACHE_SIGNAL_TTL])
+
+        def compute_and_store(cache_key: str, lease_token: Optional[str], args: tuple, kwargs: dict, keep_stale: bool = False):
+            """
+            Runs the function and stores its result. With `keep_stale` (background refresh), a failure or a
+            None result only releases the lease: the stale value keeps being served until its hard expiry.
+            """
+            try:
+                result = func(*args, **kwargs)
+            except Exception as error:
+                try:
+                    if cache_errors and not keep_stale:
+                        # Back off: callers get the failure until it expires, the waiters of this call included
+                        store(cache_key, lease_token, codec.encode_error(error), error_backoff)
+                    else:
+                        # Let the waiters take over right away instead of waiting for the lease to expire
+                        release(cache_key, lease_token)
+                except Exception as e:
+                    logger.error(f"Failed to record failure for cache key {cache_key}: {e}")
+                raise
+
+            try:
+                if result is None and negative_ttl is not None and keep_stale:
+                    release(cache_key, lease_token)
+                elif result is None and negative_ttl is not None:
+                    store(cache_key, lease_token, codec.encode_negative(), negative_ttl)
+                else:
+                    store(cache_key, lease_token, codec.encode(result), stored_ttl)
+            except Exception as e:
+                stats.incr("errors")
+                logger.error(f"Failed to write to cache: {e}")
+
+            return result
+
+        def wait_for_owner(cache_key: str) -> Tuple[bool, Any]:
+            """
+            Waits for the lease owner to store the result. Returns (True, payload) once it is stored,
+            or (False, None) when the lease is gone without a result (the caller should try to take it).
+            The last signal id is read with the lease, so a store between the check and the XREAD is not missed.
+            """
+            lease_key, signal_key = f"{cache_key}:lease", f"{cache_key}:signal"
+            deadline = time.monotonic() + wait_timeout
+
+            while True:
+                pipe = binary_redis_client.pipeline()
+                pipe.get(cache_key)
+                pipe.exists(lease_key)
+                pipe.xrevrange(signal_key, count=1)
+                cached_result, is_leased, last_event = pipe.execute()
+
+                if cached_result is not None:
+                    return True, cached_result
+                if not is_leased:
+                    return False, None
+
+                remaining_ms = int((deadline - time.monotonic()) * 1000)
+                if remaining_ms <= 0:
+                    raise TimeoutError(f"Timed out waiting for cache key {cache_key}")
+
+                last_id = last_event[0][0] if last_event else "0-0"
+                binary_redis_client.xread({signal_key: last_id}, block=min(remaining_ms, CACHE_MAX_BLOCK_MS))
+
+        def refresh(cache_key: str, args: tuple, kwargs: dict):
+            """Recomputes a stale value, unless this process or another worker is already doing it."""
+            try:
+                lease_token = uuid.uuid4().hex
+                if binary_redis_client.set(f"{cache_key}:lease", lease_token, nx=True, ex=lease_ttl):
+                    logger.info(f"Refreshing stale cache key: {cache_key}")
+                    compute_and_store(cache_key, lease_token, args, kwargs, keep_stale=True)
+                    stats.incr("refreshes")
+            except Exception as e:
+                stats.incr("refresh_errors")
+                logger.error(f"Failed to refresh cache key {cache_key}: {e}")
+            finally:
+                with refreshing_lock:
+                    refreshing.discard(cache_key)
+
+        def schedule_refresh(cache_key: str, args: tuple, kwargs: dict):
+            with refreshing_lock:
+                if cache_key in refreshing:
+                    return
+                refreshing.add(cache_key)
+            threading.Thread(target=refresh, args=(cache_key, args, kwargs), name=f"cache-refresh-{func.__name__}", daemon=True).start()
+
+        def read_cached(cache_key: str) -> Tuple[Optional[bytes], Optional[float]]:
+            """
+            The cached payload and for how many more seconds it is fresh (None when there is no stale window).
+            Negative and error markers are never stale: they are simply gone once their TTL expires.
+            """
+            if not stale_ttl:
+                return binary_redis_client.get(cache_key), None
+
+            pipe = binary_redis_client.pipeline(transaction=False)
+            pipe.get(cache_key)
+            pipe.ttl(cache_key)
+            cached_result, remaining = pipe.execute()
+            # -1: the key has no expiry (written by hand), so it never goes stale
+            if cached_result is None or remaining < 0:
+                return cached_result, None
+            return cached_result, remaining if codec.is_marker(cached_result) else remaining - stale_ttl
+
         @wraps(func)
         def wrapper(*args, **kwargs):
-            redis_conn = get_redis()
-            
-            # Create a stable cache key
-            arg_representation = {
-                'args': [str(a) for a in args],
-                'kwargs': {k: str(v) for k, v in sorted(kwargs.items())}
-            }
-            key_string = f"{func.__name__}:{json.dumps(arg_representation, sort_keys=True)}"
-            cache_key = f"cache:{hashlib.sha256(key_string.encode('utf-8')).hexdigest()}"
+            cache_key = _cache_key(func, args, kwargs)
+
+            if local_cache is not None:
+                payload = local_cache.get(cache_key)
+                if payload is not None:
+                    stats.incr("local_hits")
+                    return serve(cache_key, payload, remember=False)
 
             # Try to get the cached result
             try:
-                cached_result = redis_conn.get(cache_key)
-                if cached_result:
-                    logger.info(f"Cache hit for key: {cache_key}")
-                    return json.loads(cached_result)
+                cached_result, fresh_for = read_cached(cache_key)
             except Exception as e:
+                stats.incr("errors")
                 logger.error(f"Failed to read from cache: {e}")
+                stats.incr("misses")
+                return compute_and_store(cache_key, None, args, kwargs)
 
-            # If not in cache, execute the function
-            logger.info(f"Cache miss for key: {cache_key}. Executing function.")
-            result = func(*args, **kwargs)
+            if cached_result is not None:
+                try:
+                    if fresh_for is not None and fresh_for <= 0:
+                        logger.info(f"Stale cache hit for key: {cache_key}. Refreshing in the background.")
+                        stats.incr("stale_hits")
+                        schedule_refresh(cache_key, args, kwargs)
+                        return serve(cache_key, cached_result, remember=False)
+
+                    logger.info(f"Cache hit for key: {cache_key}")
+                    stats.incr("hits")
+                    return serve(cache_key, cached_result, fresh_for)
+                except CachedCallError:
+                    raise
+                except Exception as e:
+                    # Undecodable value (e.g. written by an older format): recompute and overwrite it
+                    stats.incr("errors")
+                    logger.error(f"Failed to decode cached value for key {cache_key}: {e}")
+                    stats.incr("misses")
+                    return compute_and_store(cache_key, None, args, kwargs)
 
-            # Cache the result
+            stats.incr("misses")
+            lease_token = uuid.uuid4().hex
             try:
-                redis_conn.setex(cache_key, ttl, json.dumps(result) if not isinstance(result, bytes) else result)
+                while not binary_redis_client.set(f"{cache_key}:lease", lease_token, nx=True, ex=lease_ttl):
+                    # Another worker is computing this key
+                    stored, cached_result = wait_for_owner(cache_key)
+                    if stored:
+                        break
+            except TimeoutError as e:
+                stats.incr("wait_timeouts")
+                logger.warning(f"{e}. Executing function.")
+                return compute_and_store(cache_key, None, args, kwargs)
             except Exception as e:
-                logger.error(f"Failed to write to cache: {e}")
+                stats.incr("errors")
+                logger.error(f"Failed to take cache lease: {e}")
+                return compute_and_store(cache_key, None, args, kwargs)
+            else:
+                if cached_result is not None:
+                    logger.info(f"Cache filled by another worker for key: {cache_key}")
+                    stats.incr("waits")
+                    return serve(cache_key, cached_result)
 
-            return result
-        return wrapper       
-    return decorator
\ No newline at end of file
+            # If not in cache, execute the function
+            logger.info(f"Cache miss for key: {cache_key}. Executing function.")
+            return compute_and_store(cache_key, lease_token, args, kwargs)
+
+        wrapper.cache_stats = stats.snapshot
+        return wrapper
+    return decorator
@@ -9,6 +9,7 @@ from app.config.settings import settings
 from app.core.logger import get_logger
 from app.services.celery_service import celery_app
 from app.services.state_manager_service import StateManagerService
+from app.models.data_models import ConversationState
 from app.services.redis_service import get_redis
 from app.services.eleven_labs_service import main as eleven_labs_service
 
@@ -294,10 +295,10 @@ def send_message(phone_number: str, messages: list, plan_names: list, contact_id
 
         logger.info(f"[{contact_id}] - Mensagens enviadas com sucesso para {phone_number}.")
         # After send message, update the state current turn number
-        with redis_client.lock(f"lock:state:{contact_id}", timeout=10):
-            state, _ = state_manager.get_state(contact_id)
+        def advance_turn(state: ConversationState):
             state.metadata.current_turn_number += 1
-            state_manager.save_state(contact_id, state)
+
+        state_manager.update_state(contact_id, advance_turn)
 
     except Exception as e:
         logger.error(f'[{contact_id}] - Erro ao enviar mensagens para Callbell: {e}')
@@ -18,6 +18,7 @@ celery_app = Celery(
         'app.services.callbell_service',
         'app.crews.src.secondary_crews.follow_up',
         'app.workers.inactivity_worker',
+        'app.services.turn_metrics',
         'main'
     ]
 )
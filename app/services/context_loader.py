@@ -0,0 +1,237 @@
+import json
+import uuid
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+import redis
+
+from app.core.logger import get_logger
+from app.config.settings import settings
+from app.models.data_models import ContextBundle, format_history_digest
+from app.services.redis_service import get_binary_redis
+from app.services.state_manager_service import StateManagerService
+from app.utils.static import agent_context_mapping
+
+logger = get_logger(__name__)
+# The state may be stored compressed, so the whole bundle is read without decoding the responses
+binary_redis_client = get_binary_redis()
+
+
+def _text(raw: Optional[bytes]) -> Optional[str]:
+    return raw.decode() if raw is not None else None
+
+
+def _text_list(raw: list) -> list:
+    return [item.decode() for item in raw]
+
+
+def _json_or(default: Callable[[], Any]) -> Callable[[Optional[bytes]], Any]:
+    return lambda raw: json.loads(raw) if raw else default()
+
+
+# Context item -> (key template, Redis command, decoder). Each item is a field of ContextBundle.
+CONTEXT_ITEMS: Dict[str, Tuple[str, str, Callable[[Any], Any]]] = {
+    "shorterm_history": ("shorterm_history:{contact_id}", "get", _text),
+    "longterm_history": ("longterm_history:{contact_id}", "get", _json_or(dict)),
+    "customer_profile": ("{contact_id}:customer_profile", "get", _text),
+    "last_system_operation_output": ("{contact_id}:last_system_operation_output", "get", _text),
+    "waiting_messages": ("contacts_messages:waiting:{contact_id}", "lrange", _text_list),
+    "sended_catalogs": ("{contact_id}:sended_catalogs", "lrange", _text_list),
+    "system_actions_history": ("{contact_id}:system_actions_history", "get", _json_or(list)),
+    "user_data_so_far": ("{contact_id}:user_data_so_far", "get", _text),
+    "plan_details": ("{contact_id}:plan_details", "get", _text),
+    "getting_data_from_user": ("{contact_id}:getting_data_from_user", "get", _text),
+}
+# The conversation state is read through the StateManagerService, in the same round trip.
+# "state" is always the current state; "turn_state" is the state as of the start of the turn (from the
+# turn snapshot, when there is one), enough for the tasks that run before anything in the turn writes it.
+CONTEXT_STATE = "state"
+CONTEXT_TURN_STATE = "turn_state"
+_STATE_ITEMS = {CONTEXT_STATE, CONTEXT_TURN_STATE}
+
+# Digests of the last N long-term history topics, written by history_summarizer_task whenever the
+# summary changes, so readers get the formatted text with one GET and no JSON parsing.
+HISTORY_DIGEST_WINDOWS = (5, 10)
+HISTORY_DIGEST_KEY = "history:digest:{window}:{contact_id}"
+HISTORY_DIGEST_ITEM = "longterm_history_digest"  # context items "longterm_history_digest:{window}"
+
+for _window in HISTORY_DIGEST_WINDOWS:
+    CONTEXT_ITEMS[f"{HISTORY_DIGEST_ITEM}:{_window}"] = (HISTORY_DIGEST_KEY.format(window=_window, contact_id="{contact_id}"), "get", _text)
+
+
+# Turn snapshot: the items no task writes while a turn runs are read once, when the turn starts, and
+# shared by every task of the turn. The current state (written by routing, strategy, system operations...)
+# and the last system operation output (written and then read inside the same turn) are always read live.
+TURN_SNAPSHOT_KEY = "turn:snapshot:{turn_id}"
+TURN_SNAPSHOT_ITEMS = [
+    CONTEXT_TURN_STATE,
+    "shorterm_history",
+    *[f"{HISTORY_DIGEST_ITEM}:{window}" for window in HISTORY_DIGEST_WINDOWS],
+    "customer_profile",
+    "waiting_messages",
+    "sended_catalogs",
+    "system_actions_history",
+    "user_data_so_far",
+    "plan_details",
+]
+
+
+def queue_history_digests(pipe: redis.client.Pipeline, contact_id: str, longterm_history: Dict[str, Any]):
+    """Queues the write of the history digests of every window, to go with the write of the summary itself."""
+    for window in HISTORY_DIGEST_WINDOWS:
+        pipe.set(HISTORY_DIGEST_KEY.format(window=window, contact_id=contact_id), format_history_digest(longterm_history, window))
+
+
+class ContextLoader:
+    """
+    Fetches everything a crew task needs to build its inputs in a single MULTI round trip,
+    instead of one GET / LRANGE per key. JSON values are decoded once and the result is a
+    typed `ContextBundle`; since the reads run in one transaction, every item is consistent
+    with the others.
+
+    What each agent needs is declared in `agent_context_mapping`.
+    """
+
+    def __init__(self, state_manager: Optional[StateManagerService] = None):
+        self.state_manager = state_manager or StateManagerService()
+
+    def load(self, contact_id: str, needs: Iterable[str], turn_id: Optional[str] = None) -> ContextBundle:
+        """
+        Loads the given context items for a contact.
+
+        Args:
+            contact_id (str): The unique ID of the contact.
+            needs (Iterable[str]): Keys of CONTEXT_ITEMS, plus "state" / "turn_state" for the conversation state.
+            turn_id (Optional[str]): Turn whose snapshot (see `create_turn_snapshot`) provides the
+                items in TURN_SNAPSHOT_ITEMS; the other items are fetched in the same round trip.
+
+        Returns:
+            ContextBundle: The decoded items; the ones not requested keep their defaults.
+        """
+        needs = list(dict.fromkeys(needs))
+        unknown = set(needs) - set(CONTEXT_ITEMS) - _STATE_ITEMS
+        if unknown:
+            raise ValueError(f"Unknown context items: {sorted(unknown)}")
+
+        snapshot_needs = [name for name in needs if name in TURN_SNAPSHOT_ITEMS] if turn_id and settings.TURN_SNAPSHOT_ENABLED else []
+        if snapshot_needs:
+            return self._load_with_snapshot(contact_id, needs, snapshot_needs, turn_id)
+
+        pipe = binary_redis_client.pipeline()
+        positions = self._queue_items(pipe, contact_id, needs)
+
+        try:
+            results = pipe.execute()
+        except redis.exceptions.RedisError as e:
+            logger.error(f"[{contact_id}] - Redis error when loading context {needs}: {e}")
+            raise
+
+        logger.info(f"[{contact_id}] - Context loaded in one round trip: {needs}")
+        return ContextBundle(**self._decode_items(contact_id, positions, results))
+
+    def _load_with_snapshot(self, contact_id: str, needs: list, snapshot_needs: list, turn_id: str) -> ContextBundle:
+        """Reads the turn snapshot and the live items in one round trip."""
+        live_needs = [name for name in needs if name not in snapshot_needs]
+
+        pipe = binary_redis_client.pipeline()
+        pipe.get(TURN_SNAPSHOT_KEY.format(turn_id=turn_id))
+        positions = self._queue_items(pipe, contact_id, live_needs)
+        results = pipe.execute()
+
+        live_items = self._decode_items(contact_id, positions, results)
+        if results[0] is None:
+            # Expired or never stored: the turn goes on with fresh reads
+            logger.warning(f"[{contact_id}] - Snapshot of turn {turn_id} not found. Loading {snapshot_needs} from Redis.")
+            snapshot = self.load(contact_id, snapshot_needs)
+        else:
+            snapshot = ContextBundle.model_validate_json(results[0])
+
+        logger.info(f"[{contact_id}] - Context loaded from the snapshot of turn {turn_id}, live: {live_needs}")
+        # Digests are all snapshot items, so only the live fields go over the snapshot
+        live_items.pop("contact_id")
+        live_items.pop("longterm_history_digests")
+        return snapshot.model_copy(update=live_items)
+
+    def create_turn_snapshot(self, contact_id: str, needs: Iterable[str] = ()) -> Tuple[str, ContextBundle]:
+        """
+        Starts a turn: loads TURN_SNAPSHOT_ITEMS (plus `needs`, read only by the caller) in one round trip
+        and stores the snapshot that the tasks of the turn read with `load(..., turn_id)`. Every task then
+        sees the same messages, histories, profile and turn-start state, whatever arrives mid-turn.
+
+        Returns:
+            Tuple[str, ContextBundle]: The turn id, to be passed along the tasks of the turn, and the
+                loaded context.
+        """
+        turn_id = f"{contact_id}:{uuid.uuid4().hex}"
+        if not settings.TURN_SNAPSHOT_ENABLED:
+            # The turn id still identifies the turn in the metrics (see app/services/turn_metrics.py)
+            return turn_id, self.load(contact_id, [CONTEXT_TURN_STATE, *needs])
+
+        bundle = self.load(contact_id, [*TURN_SNAPSHOT_ITEMS, *needs])
+        snapshot = bundle.model_dump_json()
+        binary_redis_client.set(TURN_SNAPSHOT_KEY.format(turn_id=turn_id), snapshot, ex=settings.TURN_SNAPSHOT_TTL)
+
+        logger.info(f"[{contact_id}] - Turn {turn_id} started, context snapshot stored ({len(snapshot)} bytes).")
+        return turn_id, bundle
+
+    def _queue_items(self, pipe: redis.client.Pipeline, contact_id: str, needs: list) -> Dict[str, Tuple[int, int]]:
+        """Queues the reads of each item and returns the position of its results in the pipeline."""
+        positions = {}
+        for name in needs:
+            start = len(pipe)
+            if name in _STATE_ITEMS:
+                self.state_manager.queue_get_state(pipe, contact_id)
+            else:
+                key_template, command, _ = CONTEXT_ITEMS[name]
+                key = key_template.format(contact_id=contact_id)
+                if command == "lrange":
+                    pipe.lrange(key, 0, -1)
+                else:
+                    pipe.get(key)
+            positions[name] = (start, len(pipe))
+        return positions
+
+    def _decode_items(self, contact_id: str, positions: Dict[str, Tuple[int, int]], results: list) -> Dict[str, Any]:
+        """Decodes the results of `_queue_items` into ContextBundle fields."""
+        bundle = {"contact_id": contact_id, "longterm_history_digests": {}}
+        missing_digests = []
+        for name, (start, end) in positions.items():
+            if name in _STATE_ITEMS:
+                bundle["state"], bundle["is_new_state"] = self.state_manager.state_from_read(contact_id, results[start:end])
+            elif name.startswith(HISTORY_DIGEST_ITEM):
+                window = int(name.split(":")[1])
+                digest = CONTEXT_ITEMS[name][2](results[start])
+                if digest is None:
+                    missing_digests.append(window)
+                else:
+                    bundle["longterm_history_digests"][window] = digest
+            else:
+                bundle[name] = CONTEXT_ITEMS[name][2](results[start])
+
+        if missing_digests:
+            bundle["longterm_history_digests"].update(self._backfill_history_digests(contact_id, bundle.get("longterm_history"), missing_digests))
+
+        return bundle
+
+    def _backfill_history_digests(self, contact_id: str, longterm_history: Optional[Dict[str, Any]], windows: list) -> Dict[int, str]:
+        """
+        Digests of a summary written before they existed: formatted from the summary (fetched if it
+        was not loaded) and stored, so the next reads find them.
+        """
+        if longterm_history is None:
+            raw = binary_redis_client.get(CONTEXT_ITEMS["longterm_history"][0].format(contact_id=contact_id))
+            longterm_history = CONTEXT_ITEMS["longterm_history"][2](raw)
+
+        # No summary yet: nothing to store, the summarizer writes the digests with the first one
+        if not longterm_history:
+            return {window: "" for window in windows}
+
+        logger.info(f"[{contact_id}] - Backfilling long-term history digests.")
+        pipe = binary_redis_client.pipeline(transaction=False)
+        queue_history_digests(pipe, contact_id, longterm_history)
+        pipe.execute()
+
+        return {window: format_history_digest(longterm_history, window) for window in windows}
+
+    def load_for_agent(self, contact_id: str, agent_name: str, turn_id: Optional[str] = None) -> ContextBundle:
+        """Loads the context declared for the agent in `agent_context_mapping`, from the turn snapshot when given."""
+        return self.load(contact_id, agent_context_mapping[agent_name], turn_id)
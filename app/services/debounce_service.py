@@ -0,0 +1,66 @@
+import time
+from typing import List, Optional
+
+from app.core.logger import get_logger
+from app.services.redis_service import get_redis
+
+logger = get_logger(__name__)
+redis_client = get_redis()
+
+DEBOUNCE_SCHEDULE_KEY = "debounce:schedule"
+DEBOUNCE_DELAY_SECONDS = 4
+DEBOUNCE_DISPATCH_BATCH = 100
+# A contact whose dispatch failed (e.g. broker unavailable) is retried after this delay
+DEBOUNCE_RETRY_DELAY_SECONDS = 1
+
+# Pops every contact whose fire time has passed, atomically, so concurrent dispatchers never fire a contact twice.
+# KEYS[1] = schedule zset; ARGV[1] = now, ARGV[2] = batch size
+_POP_DUE_LUA = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #due > 0 then
+    redis.call('ZREM', KEYS[1], unpack(due))
+end
+return due
+"""
+
+_pop_due_script = redis_client.register_script(_POP_DUE_LUA)
+
+
+def schedule_contact(contact_uuid: str, delay: float = DEBOUNCE_DELAY_SECONDS) -> bool:
+    """
+    Schedules (or postpones) the processing of a contact's pending messages.
+
+    Every new message simply moves the contact's fire time forward in the schedule,
+    so a burst of messages results in a single `process_message_task`.
+
+    Args:
+        contact_uuid (str): The unique ID of the contact.
+        delay (float): Debounce window, in seconds.
+
+    Returns:
+        bool: True if the contact was not scheduled yet, False if an existing schedule was bumped.
+    """
+    added = redis_client.zadd(DEBOUNCE_SCHEDULE_KEY, {contact_uuid: time.time() + delay})
+    return bool(added)
+
+
+def pop_due_contacts(now: Optional[float] = None, limit: int = DEBOUNCE_DISPATCH_BATCH) -> List[str]:
+    """Removes and returns the contacts whose debounce window has expired."""
+    now = now if now is not None else time.time()
+    return _pop_due_script(keys=[DEBOUNCE_SCHEDULE_KEY], args=[now, limit]) or []
+
+
+def reschedule_contacts(contact_uuids: List[str], delay: float = DEBOUNCE_RETRY_DELAY_SECONDS):
+    """
+    Puts popped contacts back in the schedule, so a failed dispatch is retried instead of dropped.
+    A contact that was scheduled again in the meantime (new message) keeps its own fire time.
+    """
+    if contact_uuids:
+        fire_at = time.time() + delay
+        redis_client.zadd(DEBOUNCE_SCHEDULE_KEY, {contact_uuid: fire_at for contact_uuid in contact_uuids}, nx=True)
+
+
+def next_fire_at() -> Optional[float]:
+    """Returns the earliest scheduled fire time, or None if nothing is scheduled."""
+    earliest = redis_client.zrange(DEBOUNCE_SCHEDULE_KEY, 0, 0, withscores=True)
+    return earliest[0][1] if earliest else None
@@ -18,7 +18,7 @@ def host_audio(audio_bytes: bytes):
         return None
     
     
-@cache_result(ttl=86400)  # Cache for 24 hours
+@cache_result(ttl=86400, stale_ttl=86400, local_maxsize=32, local_ttl=600)  # Cache for 24 hours, served stale for 24 more while refreshed
 def get_audio_bytes(messages: List[str]):
     messages_str = '\n'.join(messages)
 
@@ -2,16 +2,55 @@ import googlemaps
 from datetime import datetime
 
 from app.config.settings import settings
-from app.services.cache_service import cache_result
+from app.services.cache_service import cache_result, CachedCallError
+
+# Rotas inexistentes (cidade digitada errado, sem rota de carro) ficam em cache negativo por 1 hora;
+# erros da API (cota, chave, instabilidade) ficam 2 minutos, para as novas tentativas do agente não repetirem a chamada.
+@cache_result(ttl=86400, stale_ttl=6 * 86400, negative_ttl=3600, cache_errors=True, error_backoff=120, local_maxsize=256, local_ttl=3600) # Cache for 24 hours, served stale for 6 more days while refreshed
+def _consultar_rota(origem, destino):
+    """
+    Consulta a API Distance Matrix do Google Maps.
+
+    Returns:
+        dict: 'origem', 'destino', 'distancia', 'duracao' e 'duracao_com_transito',
+              ou None se não houver rota entre as cidades.
+
+    Raises:
+        googlemaps.exceptions.ApiError: Se a API recusar a consulta (cota, chave inválida...).
+    """
+    gmaps = googlemaps.Client(key=settings.GMAPS_API_KEY)
+
+    now = datetime.now()
+    matrix = gmaps.distance_matrix(origins=[origem],
+                                   destinations=[destino],
+                                   mode="driving",
+                                   language="pt-BR",
+                                   units="metric",
+                                   departure_time=now)
+
+    if matrix['status'] != 'OK':
+        raise googlemaps.exceptions.ApiError(matrix['status'])
+
+    elemento = matrix['rows'][0]['elements'][0]
+    if elemento['status'] != 'OK':
+        print(f"Erro ao buscar a rota: {elemento['status']}")
+        return None
+
+    return {
+        "origem": matrix['origin_addresses'][0],
+        "destino": matrix['destination_addresses'][0],
+        "distancia": elemento['distance']['text'],
+        "duracao": elemento['duration']['text'],
+        "duracao_com_transito": elemento.get('duration_in_traffic', {}).get('text', 'N/A')
+    }
+
 
-@cache_result(ttl=86400) # Cache for 24 hours
 def calcular_distancia_cidades(origem, destino):
     """
     Calcula a distância e o tempo de viagem de carro entre duas cidades
     usando a API Distance Matrix do Google Maps.
 
     Args:
-        api_key (str): Sua chave da API do Google Maps.
         origem (str): A cidade de origem (ex: "São Paulo, SP").
         destino (str): A cidade de destino (ex: "Rio de Janeiro, RJ").
 
@@ -20,30 +59,11 @@ def calcular_distancia_cidades(origem, destino):
               ou None se a rota não for encontrada.
     """
     try:
-        gmaps = googlemaps.Client(key=settings.GMAPS_API_KEY)
-
-        now = datetime.now()
-        matrix = gmaps.distance_matrix(origins=[origem],
-                                       destinations=[destino],
-                                       mode="driving",
-                                       language="pt-BR",
-                                       units="metric",
-                                       departure_time=now)
-
-        if matrix['status'] == 'OK' and matrix['rows'][0]['elements'][0]['status'] == 'OK':
-            resultado = {
-                "origem": matrix['origin_addresses'][0],
-                "destino": matrix['destination_addresses'][0],
-                "distancia": matrix['rows'][0]['elements'][0]['distance']['text'],
-                "duracao": matrix['rows'][0]['elements'][0]['duration']['text'],
-                "duracao_com_transito": matrix['rows'][0]['elements'][0].get('duration_in_traffic', {}).get('text', 'N/A')
-            }
-
-            return resultado
-        else:
-            print(f"Erro ao buscar a rota: {matrix['rows'][0]['elements'][0]['status']}")
-            return None
+        return _consultar_rota(origem, destino)
 
+    except CachedCallError as e:
+        print(f"Consulta ao Google Maps falhou recentemente, aguardando para tentar de novo: {e}")
+        return None
     except googlemaps.exceptions.ApiError as e:
         import traceback
 
@@ -17,26 +17,30 @@ class ImageDescriptionAPI:
         self.secret = secret
         self.base_url = "https://imagedescriber.online/api/openapi/describe-image"
     
+    def encode_image_bytes(self, image_data: bytes, file_name: str) -> str:
+        """Converte os bytes da imagem para data URL base64, com o tipo MIME detectado pela extensão"""
+        base64_image = base64.b64encode(image_data).decode('utf-8')
+
+        # Detectar tipo MIME baseado na extensão
+        if file_name.lower().endswith('.png'):
+            mime_type = 'image/png'
+        elif file_name.lower().endswith('.jpg') or file_name.lower().endswith('.jpeg'):
+            mime_type = 'image/jpeg'
+        elif file_name.lower().endswith('.gif'):
+            mime_type = 'image/gif'
+        elif file_name.lower().endswith('.webp'):
+            mime_type = 'image/webp'
+        else:
+            mime_type = 'image/jpeg'
+
+        return f"data:{mime_type};base64,{base64_image}"
+
     def load_image_from_file(self, file_path: str) -> Tuple[str, bytes]:
         """Carrega imagem de arquivo e converte para base64"""
         try:
             with open(file_path, 'rb') as file:
                 image_data = file.read()
-                base64_image = base64.b64encode(image_data).decode('utf-8')
-                
-                # Detectar tipo MIME baseado na extensão
-                if file_path.lower().endswith('.png'):
-                    mime_type = 'image/png'
-                elif file_path.lower().endswith('.jpg') or file_path.lower().endswith('.jpeg'):
-                    mime_type = 'image/jpeg'
-                elif file_path.lower().endswith('.gif'):
-                    mime_type = 'image/gif'
-                elif file_path.lower().endswith('.webp'):
-                    mime_type = 'image/webp'
-                else:
-                    mime_type = 'image/jpeg'
-                
-                return f"data:{mime_type};base64,{base64_image}", image_data
+                return self.encode_image_bytes(image_data, file_path), image_data
         except FileNotFoundError:
             raise Exception(f"Arquivo não encontrado: {file_path}")
         except Exception as e:
@@ -60,14 +64,19 @@ class ImageDescriptionAPI:
                       image_path: str = None,
                       image_url: str = None,
                       prompt: Optional[str] = None,
-                      lang: str = 'en') -> dict:
+                      lang: str = 'en',
+                      image_bytes: Optional[bytes] = None,
+                      content_hash: Optional[str] = None) -> dict:
         """
         Descreve uma imagem usando a API
         
         Args:
             image_path: Caminho para o arquivo de imagem
+            image_url: URL da imagem
             prompt: Prompt personalizado (opcional)
             lang: Idioma da resposta (en, zh, de, es, fr, ja, ko)
+            image_bytes: Conteúdo já baixado da image_url (ex.: pelo processamento em lote). Evita um novo download.
+            content_hash: sha256 de image_bytes, se já calculado. Evita hashear o conteúdo de novo.
         
         Returns:
             Resposta da API em formato dict
@@ -79,36 +88,23 @@ class ImageDescriptionAPI:
         
         elif not image_path and image_url:
             try:
-                image_bytes = requests.get(image_url).content
-                content_hash = hashlib.sha256(image_bytes).hexdigest()
-                cache_key = f"imagedescription:{content_hash}"
-
-                cached_result = redis_conn.get(cache_key)
-                if cached_result:
-                    logger.info(f"Cache hit for key: {cache_key}")
-                    return json.loads(cached_result)
+                if image_bytes is None:
+                    image_bytes = requests.get(image_url).content
             except requests.exceptions.RequestException as e:
-                logger.error(f"Failed to fetch image from URL: {e}")
-                pass
-            except Exception as e:
-                logger.error(f"An unexpected error occurred during cache check: {e}")
-                pass
+                raise Exception(f"Erro ao baixar imagem: {str(e)}")
 
-            extension = image_url.split('?')[0].split('.')[-1]
-            image_path = f'app/services/tmp_files/tmp_image.{extension}'
-            with open(image_path, 'wb') as f:
-                f.write(image_bytes)
+            # A imagem é codificada em memória: um arquivo temporário fixo seria disputado por descrições concorrentes
+            image_base64_data = self.encode_image_bytes(image_bytes, image_url.split('?')[0])
         
         elif not image_url and image_path:
-            pass
+            # 1. Carregar e converter imagem para base64
+            image_base64_data, image_bytes = self.load_image_from_file(image_path)
         
         else:
             raise ValueError('Envie apenas um dos dois parâmetros com dados de imagem.')
         
-        
-        # 1. Carregar e converter imagem para base64
-        image_base64_data, image_bytes = self.load_image_from_file(image_path)
-        content_hash = hashlib.sha256(image_bytes).hexdigest()
+        if content_hash is None:
+            content_hash = hashlib.sha256(image_bytes).hexdigest()
         cache_key = f"imagedescription:{content_hash}"
         
         cached_result = redis_conn.get(cache_key)
@@ -0,0 +1,351 @@
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.core.logger import get_logger
+from app.config.settings import settings
+from app.models.data_models import IncomingMessage
+from app.services.celery_service import celery_app
+from app.services.redis_service import get_redis, get_async_redis
+from app.services.barrier_service import pending_media_barrier
+from app.services.debounce_service import DEBOUNCE_SCHEDULE_KEY, DEBOUNCE_DELAY_SECONDS
+from app.utils.static import AI_TEAM_UUID
+
+logger = get_logger(__name__)
+redis_client = get_redis()
+async_redis_client = get_async_redis()
+
+CONTACT_INFO_TTL = 86400  # Expire after 1 day
+
+AUDIO_EXTENSIONS = ['.mp3']
+IMAGE_EXTENSIONS = ['.png', '.jpg', '.gif', '.webp', '.jpeg']
+
+INGEST_STATS_KEY = "ingest:stats"
+INGEST_THROTTLED_CONTACTS_KEY = "ingest:throttled_contacts"
+INGEST_GLOBAL_BUCKET_KEY = "ingest:bucket:global"
+
+# Ingest outcomes returned by the script
+INGEST_DUPLICATE = "duplicate"
+INGEST_THROTTLED = "throttled"
+INGEST_SCHEDULED = "scheduled"
+INGEST_EXTENDED = "extended"
+
+# Records a whole inbound message in a single round trip and returns the ingest outcome.
+# - Deliveries of an already seen Callbell message uuid are dropped before anything is queued.
+# - Admission control: a token bucket per contact and a global one. A message over either limit is
+#   coalesced: its text is still queued, but it neither extends the debounce window nor starts media work.
+# KEYS[1] = contact_info, KEYS[2] = follow-up timestamp, KEYS[3] = follow-up level,
+# KEYS[4] = waiting messages list, KEYS[5] = pending media counter, KEYS[6] = debounce schedule,
+# KEYS[7] = dedup marker of the message uuid, KEYS[8] = ingest stats hash,
+# KEYS[9] = contact bucket, KEYS[10] = global bucket, KEYS[11] = throttled contacts zset
+# ARGV[1] = contact_info json, ARGV[2] = contact_info ttl, ARGV[3] = now (iso), ARGV[4] = text,
+# ARGV[5] = number of attachments, ARGV[6] = pending media ttl, ARGV[7] = contact uuid, ARGV[8] = fire_at,
+# ARGV[9] = message uuid ('' when missing), ARGV[10] = dedup ttl (also of a bucket that never refills), ARGV[11] = now (epoch seconds),
+# ARGV[12] = contact capacity, ARGV[13] = contact refill/s, ARGV[14] = global capacity, ARGV[15] = global refill/s,
+# ARGV[16] = note queued instead of the attachments of a throttled message, ARGV[17] = throttle metrics window
+_INGEST_LUA = """
+local now = tonumber(ARGV[11])
+
+local function refill(key, capacity, rate)
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    return math.min(capacity, tokens + math.max(0, now - ts) * rate)
+end
+
+local function store(key, tokens, capacity, rate)
+    redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', tostring(now))
+    -- A bucket that never refills (rate 0) would get an infinite TTL; it is kept for the dedup window instead
+    local ttl = tonumber(ARGV[10])
+    if rate > 0 then
+        ttl = math.ceil(capacity / rate) + 1
+    end
+    redis.call('EXPIRE', key, ttl)
+end
+
+redis.call('HINCRBY', KEYS[8], 'received', 1)
+
+if ARGV[9] ~= '' then
+    if not redis.call('SET', KEYS[7], '1', 'NX', 'EX', ARGV[10]) then
+        redis.call('HINCRBY', KEYS[8], 'duplicates', 1)
+        return 'duplicate'
+    end
+end
+
+local contact_capacity, contact_rate = tonumber(ARGV[12]), tonumber(ARGV[13])
+local global_capacity, global_rate = tonumber(ARGV[14]), tonumber(ARGV[15])
+local contact_tokens = refill(KEYS[9], contact_capacity, contact_rate)
+local global_tokens = refill(KEYS[10], global_capacity, global_rate)
+local admitted = contact_tokens >= 1 and global_tokens >= 1
+
+if admitted then
+    contact_tokens = contact_tokens - 1
+    global_tokens = global_tokens - 1
+else
+    redis.call('HINCRBY', KEYS[8], 'throttled', 1)
+    if global_tokens < 1 then
+        redis.call('HINCRBY', KEYS[8], 'throttled_global', 1)
+    end
+    redis.call('ZADD', KEYS[11], now, ARGV[7])
+    redis.call('ZREMRANGEBYSCORE', KEYS[11], '-inf', now - tonumber(ARGV[17]))
+end
+store(KEYS[9], contact_tokens, contact_capacity, contact_rate)
+store(KEYS[10], global_tokens, global_capacity, global_rate)
+
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+redis.call('SET', KEYS[2], ARGV[3])
+redis.call('DEL', KEYS[3])
+
+if ARGV[4] ~= '' then
+    redis.call('RPUSH', KEYS[4], ARGV[4])
+end
+
+if not admitted then
+    if ARGV[16] ~= '' then
+        redis.call('RPUSH', KEYS[4], ARGV[16])
+    end
+    -- Only makes sure the queued text is eventually processed; an existing window is not extended
+    redis.call('ZADD', KEYS[6], 'NX', ARGV[8], ARGV[7])
+    return 'throttled'
+end
+
+local attachments = tonumber(ARGV[5])
+if attachments > 0 then
+    redis.call('INCRBY', KEYS[5], attachments)
+    redis.call('EXPIRE', KEYS[5], ARGV[6])
+end
+
+if redis.call('ZADD', KEYS[6], ARGV[8], ARGV[7]) == 1 then
+    return 'scheduled'
+end
+return 'extended'
+"""
+
+_ingest_script = redis_client.register_script(_INGEST_LUA)
+_async_ingest_script = async_redis_client.register_script(_INGEST_LUA)
+
+
+def get_ingestable_payload(webhook_payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Returns the message payload if the webhook is a message received from a contact of the AI team,
+    or None if it must be ignored.
+    """
+    event = webhook_payload.get("event")
+    payload = webhook_payload.get("payload")
+
+    if not (event == "message_created" and payload and payload.get("status") == "received"):
+        return None
+
+    contact_info = payload.get("contact")
+    if not contact_info or not contact_info.get("uuid"):
+        logger.warning("Webhook: Mensagem recebida sem 'contact.uuid'. Ignorando.")
+        return None
+
+    if contact_info.get("team", {}).get("uuid") != AI_TEAM_UUID:
+        return None
+
+    return payload
+
+
+def parse_incoming_message(payload: Dict[str, Any]) -> IncomingMessage:
+    """
+    Extracts the contact, the message text and the attachments from a Callbell `message_created` payload.
+    """
+    contact_info = payload.get("contact")
+
+    text = ""
+    if 'messageContext' in payload and 'target' in payload['messageContext'] and 'text' in payload['messageContext']['target']:
+        if payload['messageContext']['target']['text'] != "None":
+            text = f"Resposta direta a mensagem `{payload['messageContext']['target']['text']}`:\n"
+
+    text += str(payload.get('text', ''))
+
+    content = payload.get('attachments', [])
+
+    return IncomingMessage(
+        contact_uuid=contact_info.get("uuid"),
+        contact_info=contact_info,
+        message_uuid=payload.get("uuid"),
+        text=text,
+        audio_urls=[attach for attach in content if any(ext in attach for ext in AUDIO_EXTENSIONS)],
+        image_urls=[attach for attach in content if any(ext in attach for ext in IMAGE_EXTENSIONS)],
+    )
+
+
+def _dedup_key(message_uuid: Optional[str]) -> str:
+    return f"webhook:seen:{message_uuid}"
+
+
+def _ingest_keys(message: IncomingMessage) -> List[str]:
+    contact_uuid = message.contact_uuid
+    return [
+        f"contact_info:{contact_uuid}",
+        f"history:last_timestamp:to_follow_up:{contact_uuid}",
+        f"follow_up_level:{contact_uuid}",
+        f"contacts_messages:waiting:{contact_uuid}",
+        pending_media_barrier.flag_key(contact_uuid),
+        DEBOUNCE_SCHEDULE_KEY,
+        _dedup_key(message.message_uuid),
+        INGEST_STATS_KEY,
+        f"ingest:bucket:{contact_uuid}",
+        INGEST_GLOBAL_BUCKET_KEY,
+        INGEST_THROTTLED_CONTACTS_KEY,
+    ]
+
+
+def _ingest_args(message: IncomingMessage) -> List[Any]:
+    attachments = message.audio_urls + message.image_urls
+    throttled_attachments_note = f"(Anexos recebidos e não processados): {', '.join(attachments)}" if attachments else ''
+
+    return [
+        json.dumps(message.contact_info),
+        CONTACT_INFO_TTL,
+        datetime.now().isoformat(),
+        message.text,
+        len(attachments),
+        pending_media_barrier.flag_ttl,
+        message.contact_uuid,
+        time.time() + DEBOUNCE_DELAY_SECONDS,
+        message.message_uuid or '',
+        settings.WEBHOOK_DEDUP_TTL,
+        time.time(),
+        settings.INGEST_CONTACT_BUCKET_CAPACITY,
+        settings.INGEST_CONTACT_REFILL_PER_SECOND,
+        settings.INGEST_GLOBAL_BUCKET_CAPACITY,
+        settings.INGEST_GLOBAL_REFILL_PER_SECOND,
+        throttled_attachments_note,
+        settings.INGEST_THROTTLE_METRICS_WINDOW,
+    ]
+
+
+def ingest_message(message: IncomingMessage) -> str:
+    """
+    Atomically records an inbound message in Redis.
+
+    Drops repeated deliveries of the same Callbell message and applies the per-contact and
+    global admission control. Then stores the contact info, resets the follow-up tracking,
+    queues the text, registers the pending attachments and (re)schedules the debounced
+    processing, all in one script call.
+
+    Args:
+        message (IncomingMessage): The parsed inbound message.
+
+    Returns:
+        str: INGEST_DUPLICATE, INGEST_THROTTLED (text coalesced, no new work), INGEST_SCHEDULED
+            (contact was not scheduled yet) or INGEST_EXTENDED (existing schedule bumped).
+    """
+    return _ingest_script(keys=_ingest_keys(message), args=_ingest_args(message))
+
+
+async def ingest_message_async(message: IncomingMessage) -> str:
+    """Async counterpart of `ingest_message`, for the ASGI front-end."""
+    return await _async_ingest_script(keys=_ingest_keys(message), args=_ingest_args(message))
+
+
+def _format_ingest_stats(stats: Dict[str, str], throttled_contacts: int) -> Dict[str, int]:
+    formatted = {field: int(value) for field, value in stats.items()}
+    formatted["throttled_contacts"] = throttled_contacts
+    return formatted
+
+
+def get_ingest_stats() -> Dict[str, int]:
+    """
+    Returns the webhook ingest counters: received, duplicates, throttled, throttled_global and
+    throttled_contacts (distinct contacts throttled within INGEST_THROTTLE_METRICS_WINDOW).
+    """
+    window_start = time.time() - settings.INGEST_THROTTLE_METRICS_WINDOW
+
+    pipe = redis_client.pipeline()
+    pipe.hgetall(INGEST_STATS_KEY)
+    pipe.zcount(INGEST_THROTTLED_CONTACTS_KEY, window_start, '+inf')
+    stats, throttled_contacts = pipe.execute()
+
+    return _format_ingest_stats(stats, throttled_contacts)
+
+
+async def get_ingest_stats_async() -> Dict[str, int]:
+    """Async counterpart of `get_ingest_stats`."""
+    window_start = time.time() - settings.INGEST_THROTTLE_METRICS_WINDOW
+
+    async with async_redis_client.pipeline() as pipe:
+        pipe.hgetall(INGEST_STATS_KEY)
+        pipe.zcount(INGEST_THROTTLED_CONTACTS_KEY, window_start, '+inf')
+        stats, throttled_contacts = await pipe.execute()
+
+    return _format_ingest_stats(stats, throttled_contacts)
+
+
+def dispatch_attachments(message: IncomingMessage):
+    """
+    Enqueues a single batch task with all the attachments of the message, which are downloaded
+    and transcribed / described concurrently by the worker.
+    Tasks are sent by name so the web front-ends do not need to import the task modules.
+
+    If the task cannot be published, what the ingest script recorded for the attachments is undone
+    (dedup marker and pending media units) before the error is re-raised, so the webhook fails, the
+    redelivery is accepted and the crews do not wait for media that will never be processed.
+    """
+    attachments = len(message.audio_urls) + len(message.image_urls)
+    if not attachments:
+        return
+
+    try:
+        celery_app.send_task('io.process_attachments_batch', args=[message.contact_uuid, message.audio_urls, message.image_urls])
+    except Exception as e:
+        logger.error(f"[{message.contact_uuid}] - Could not dispatch the attachments of message {message.message_uuid}: {e}")
+        if message.message_uuid:
+            redis_client.delete(_dedup_key(message.message_uuid))
+        pending_media_barrier.release(message.contact_uuid, amount=attachments)
+        raise
+
+
+def _log_ingest_outcome(message: IncomingMessage, outcome: str):
+    contact_uuid = message.contact_uuid
+
+    # Each message only pushes the contact's fire time forward; the dispatcher enqueues a single task once it expires.
+    if outcome == INGEST_DUPLICATE:
+        logger.info(f"[{contact_uuid}] - Duplicate delivery of message {message.message_uuid}. Dropped.")
+    elif outcome == INGEST_THROTTLED:
+        logger.warning(f"[{contact_uuid}] - Inbound rate limit exceeded. Message coalesced into the pending turn.")
+    elif outcome == INGEST_SCHEDULED:
+        logger.info(f"[{contact_uuid}] - Contact scheduled for processing in {DEBOUNCE_DELAY_SECONDS} seconds.")
+    else:
+        logger.info(f"[{contact_uuid}] - Contact already scheduled. Debounce window extended by {DEBOUNCE_DELAY_SECONDS} seconds.")
+
+
+def process_incoming_message(payload: Dict[str, Any]):
+    """
+    Handles the initial processing of an incoming message webhook.
+    - Extracts message text and attachments.
+    - Drops duplicate deliveries, applies admission control, saves data to Redis and schedules
+      the debounced processing in a single round trip.
+    - Dispatches the attachment tasks of admitted messages.
+    """
+    message = parse_incoming_message(payload)
+    logger.info(f'[{message.contact_uuid}] - INICIANDO process_incoming_message')
+
+    # Dedup, admission control, contact info, follow-up reset, text, pending media counter and debounce schedule are handled atomically
+    outcome = ingest_message(message)
+
+    if outcome in (INGEST_SCHEDULED, INGEST_EXTENDED):
+        dispatch_attachments(message)
+
+    _log_ingest_outcome(message, outcome)
+
+
+async def process_incoming_message_async(payload: Dict[str, Any]):
+    """
+    Async version of `process_incoming_message`.
+    Redis I/O goes through `redis.asyncio`; the broker publish (kombu is blocking) runs in a worker thread.
+    """
+    message = parse_incoming_message(payload)
+    logger.info(f'[{message.contact_uuid}] - INICIANDO process_incoming_message_async')
+
+    outcome = await ingest_message_async(message)
+
+    if outcome in (INGEST_SCHEDULED, INGEST_EXTENDED) and (message.audio_urls or message.image_urls):
+        await asyncio.to_thread(dispatch_attachments, message)
+
+    _log_ingest_outcome(message, outcome)
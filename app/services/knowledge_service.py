@@ -1,11 +1,64 @@
 import yaml
 import os
-from typing import Dict, Any, List, Optional
-from thefuzz import process
+from typing import Dict, Any, List, Optional, Tuple
+from rapidfuzz import fuzz, process
+from rapidfuzz.utils import default_process
+from unidecode import unidecode
 from app.core.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Limiares de confiança da busca fuzzy (score de 0 a 100)
+TOPIC_MATCH_THRESHOLD = 80
+PLAN_MATCH_THRESHOLD = 85
+FEATURE_MATCH_THRESHOLD = 80
+
+
+def normalize_lookup_key(text: Any) -> str:
+    """Chave de busca: sem acentos, minúscula e só com letras, números e espaços simples."""
+    return " ".join(default_process(unidecode(str(text or ""))).split())
+
+
+class LookupIndex:
+    """
+    Índice de nomes para resolução em O(1): correspondência exata, depois pela chave normalizada
+    (`normalize_lookup_key`) e, só quando as duas falham, fuzzy (rapidfuzz WRatio) sobre a lista de
+    chaves já normalizadas.
+    """
+
+    def __init__(self, entries: List[Tuple[str, Any]]):
+        self._exact: Dict[str, Any] = {}
+        self._normalized: Dict[str, Tuple[str, Any]] = {}
+        # O primeiro nome vence em caso de repetição, como na busca linear anterior
+        for name, value in entries:
+            self._exact.setdefault(name, value)
+            self._normalized.setdefault(normalize_lookup_key(name), (name, value))
+        self._choices = list(self._normalized.keys())
+
+    def lookup(self, query: Any, threshold: int) -> Tuple[Optional[str], Any, int, Optional[str]]:
+        """
+        Returns:
+            Tuple: (nome encontrado, valor, score, melhor tentativa). O nome e o valor são None
+                quando a melhor tentativa não passa do `threshold`.
+        """
+        if query in self._exact:
+            return query, self._exact[query], 100, query
+
+        key = normalize_lookup_key(query)
+        if key in self._normalized:
+            name, value = self._normalized[key]
+            return name, value, 100, name
+
+        match = process.extractOne(key, self._choices, scorer=fuzz.WRatio, processor=None) if key and self._choices else None
+        if match is None:
+            return None, None, 0, None
+
+        name, value = self._normalized[match[0]]
+        score = int(round(match[1]))
+        if score > threshold:
+            return name, value, score, name
+        return None, None, score, name
+
 class KnowledgeService:
     """
     Serviço para carregar e consultar as regras de negócio a partir de um arquivo YAML.
@@ -23,7 +76,6 @@ class KnowledgeService:
     def __init__(self, knowledge_base_path: str = 'app/domain_knowledge'):
         if self._rules is None:
             self.knowledge_base_path = knowledge_base_path
-            self._load_rules()
             self._topic_map = {
                 'application_features': ('application_features',),
                 'get_web_access_features': ('web_access_features',),
@@ -43,6 +95,7 @@ class KnowledgeService:
                 'contract_terms': ('contracts',),
             }
             self._plan_based_topics = {'pricing', 'faq', 'key_selling_points', 'objection_handling'}
+            self._load_rules()
 
     def _deep_merge(self, destination: Dict, source: Dict):
         """
@@ -98,6 +151,18 @@ class KnowledgeService:
             logger.info(f"ERRO CRÍTICO no KnowledgeService ao carregar regras modulares: {e}")
             self._rules = {}
 
+        self._build_index()
+
+    def _build_index(self):
+        """
+        Monta, uma única vez por carga das regras, os índices de tópicos, planos e funcionalidades
+        do aplicativo usados por `find_information`.
+        """
+        self._all_topics = list(self._topic_map.keys()) + list(self._plan_based_topics)
+        self._topic_index = LookupIndex([(topic, topic) for topic in self._all_topics])
+        self._plan_index = LookupIndex([(plan['name'], plan) for plan in self._get_all_plans()])
+        self._feature_index = LookupIndex([(feature, feature) for feature in (self._get_rule_section('application_features') or {})])
+
     def _get_rule_section(self, section_name: str) -> Any:
         """Helper para obter uma seção principal das regras com segurança."""
         if not self._rules:
@@ -107,7 +172,7 @@ class KnowledgeService:
     def _get_all_plans(self) -> List[Dict[str, Any]]:
         """Helper para extrair todos os planos de todas as categorias de produtos."""
         all_plans = []
-        for category in self._get_rule_section('products'):
+        for category in self._get_rule_section('products') or []:
             all_plans.extend(category.get('plans', []))
         return all_plans
 
@@ -119,19 +184,12 @@ class KnowledgeService:
         if not plan_name:
             return None
 
-        all_plans = self._get_all_plans()
-        plan_names = [plan['name'] for plan in all_plans]
-
-        # Usa process.extractOne para encontrar a melhor correspondência
-        best_match, score = process.extractOne(plan_name, plan_names)
+        # Nome exato / normalizado em O(1); fuzzy só se os dois falharem
+        matched_name, plan, score, best_match = self._plan_index.lookup(plan_name, PLAN_MATCH_THRESHOLD)
+        if plan is not None:
+            logger.info(f"Busca por plano: '{plan_name}' correspondeu a '{matched_name}' com score {score}.")
+            return plan
 
-        # Se a pontuação for boa o suficiente, encontre e retorne o objeto completo do plano
-        if score > 85:  # Limiar de confiança ajustável
-            logger.info(f"Busca por plano: '{plan_name}' correspondeu a '{best_match}' com score {score}.")
-            for plan in all_plans:
-                if plan['name'] == best_match:
-                    return plan
-        
         logger.warning(f"Nenhum plano correspondente encontrado para '{plan_name}' (melhor tentativa: '{best_match}', score: {score}).")
         return None
 
@@ -188,14 +246,12 @@ class KnowledgeService:
         params = query.get('params', {})
         
         # Lógica de fallback com Fuzzy Matching
-        all_topics = list(self._topic_map.keys()) + list(self._plan_based_topics)
-        if topic not in all_topics:
-            best_match, score = process.extractOne(topic, all_topics)
-            if score > 80:
-                logger.info(f"Tópico '{topic}' não encontrado. Usando melhor correspondência: '{best_match}' (score: {score}).")
-                topic = best_match
-            else:
-                return f"Erro: Tópico '{topic}' inválido. Tópicos válidos: {all_topics}"
+        matched_topic, _, score, _ = self._topic_index.lookup(topic, TOPIC_MATCH_THRESHOLD)
+        if matched_topic is None:
+            return f"Erro: Tópico '{topic}' inválido. Tópicos válidos: {self._all_topics}"
+        if matched_topic != topic:
+            logger.info(f"Tópico '{topic}' não encontrado. Usando melhor correspondência: '{matched_topic}' (score: {score}).")
+            topic = matched_topic
 
         # --- Lógica de Roteamento ---
 
@@ -231,9 +287,9 @@ class KnowledgeService:
                 if feature_name:
                     app_features = self._get_rule_section('application_features')
                     if app_features:
-                        best_match, score = process.extractOne(feature_name, app_features.keys())
-                        if score > 80:
-                            path.append(best_match)
+                        matched_feature, _, _, _ = self._feature_index.lookup(feature_name, FEATURE_MATCH_THRESHOLD)
+                        if matched_feature is not None:
+                            path.append(matched_feature)
                         else:
                             return {"error": f"Funcionalidade '{feature_name}' não encontrada."}
                     else:
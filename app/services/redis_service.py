@@ -1,41 +1,261 @@
 
+import threading
+import time
 import redis
+import redis.asyncio
+import redis.asyncio.retry
+import redis.client
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+from redis.backoff import ExponentialWithJitterBackoff
+from redis.retry import Retry
 
 from app.core.logger import get_logger
 from app.config.settings import settings
-from functools import lru_cache
 
 logger = get_logger(__name__)
 
-@lru_cache(maxsize=1)
-def get_redis(db: int | None = None, host: str | None = None, port: int | None = None, password: str | None = None):
-    redis_conn = None
 
+@dataclass
+class RedisOpCounter:
+    """Commands sent and round trips made while a count is active (see `start_redis_op_count`)."""
+    commands: int = 0
+    round_trips: int = 0
+
+
+_redis_op_counter: ContextVar[Optional[RedisOpCounter]] = ContextVar("redis_op_counter", default=None)
+
+
+def start_redis_op_count():
+    """Starts counting the Redis operations of the current context (e.g. a Celery task). Returns the token for `stop_redis_op_count`."""
+    return _redis_op_counter.set(RedisOpCounter())
+
+
+def stop_redis_op_count(token) -> RedisOpCounter:
+    """Stops the count started with `token` and returns it."""
+    counter = _redis_op_counter.get()
+    _redis_op_counter.reset(token)
+    return counter or RedisOpCounter()
+
+
+def _count_redis_ops(commands: int):
+    counter = _redis_op_counter.get()
+    if counter is not None:
+        counter.commands += commands
+        counter.round_trips += 1
+
+
+class InstrumentedPipeline(redis.client.Pipeline):
+    """Pipeline that reports each execution (all its queued commands in one round trip) to the active op count."""
+
+    def immediate_execute_command(self, *args, **options):
+        # WATCH and the reads done while watching run right away
+        _count_redis_ops(1)
+        return super().immediate_execute_command(*args, **options)
+
+    def execute(self, raise_on_error: bool = True):
+        if self.command_stack:
+            _count_redis_ops(len(self.command_stack))
+        return super().execute(raise_on_error)
+
+
+class InstrumentedRedis(redis.Redis):
+    """Client that reports its commands to the active op count, if any. Without one, it behaves as `redis.Redis`."""
+
+    def execute_command(self, *args, **options):
+        _count_redis_ops(1)
+        return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None) -> InstrumentedPipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class InstrumentedBlockingConnectionPool(redis.BlockingConnectionPool):
+    """
+    BlockingConnectionPool that counts the checkouts that found every connection in use and had to wait.
+    A checkout waits at most `REDIS_POOL_TIMEOUT` seconds before raising ConnectionError.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.waits = 0
+        self.wait_seconds = 0.0
+        super().__init__(*args, **kwargs)
+
+    def get_connection(self, *args, **kwargs):
+        # The queue holds a placeholder for each connection not created yet, so empty means all are checked out
+        if not self.pool.empty():
+            return super().get_connection(*args, **kwargs)
+
+        started = time.perf_counter()
+        try:
+            return super().get_connection(*args, **kwargs)
+        finally:
+            self.waits += 1
+            self.wait_seconds += time.perf_counter() - started
+
+    def stats(self) -> Dict[str, Any]:
+        idle = sum(1 for connection in list(self.pool.queue) if connection is not None)
+        return {
+            "max_connections": self.max_connections,
+            "created": len(self._connections),
+            "in_use": len(self._connections) - idle,
+            "idle": idle,
+            "waits": self.waits,
+            "wait_seconds": round(self.wait_seconds, 3),
+        }
+
+
+class InstrumentedAsyncBlockingConnectionPool(redis.asyncio.BlockingConnectionPool):
+    """Async counterpart of `InstrumentedBlockingConnectionPool`."""
+
+    def __init__(self, *args, **kwargs):
+        self.waits = 0
+        self.wait_seconds = 0.0
+        super().__init__(*args, **kwargs)
+
+    async def get_connection(self, *args, **kwargs):
+        if self.can_get_connection():
+            return await super().get_connection(*args, **kwargs)
+
+        started = time.perf_counter()
+        try:
+            return await super().get_connection(*args, **kwargs)
+        finally:
+            self.waits += 1
+            self.wait_seconds += time.perf_counter() - started
+
+    def stats(self) -> Dict[str, Any]:
+        in_use, idle = len(self._in_use_connections), len(self._available_connections)
+        return {
+            "max_connections": self.max_connections,
+            "created": in_use + idle,
+            "in_use": in_use,
+            "idle": idle,
+            "waits": self.waits,
+            "wait_seconds": round(self.wait_seconds, 3),
+        }
+
+
+# Pool kinds: responses decoded to str, kept as bytes, or served to asyncio code
+POOL_TEXT = "text"
+POOL_BINARY = "binary"
+POOL_ASYNC = "async"
+
+# (kind, host, port, db, password) -> pool. One pool per destination and kind in each process, shared by
+# every client built for it. Prefork Celery children inherit the registry, and redis-py resets the
+# inherited pools on their first use after the fork.
+_pools: Dict[Tuple[str, str, int, int, Optional[str]], redis.ConnectionPool | redis.asyncio.ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _pool_kwargs(db: int, host: str, port: int, password: str | None) -> Dict[str, Any]:
+    return {
+        "db": db,
+        "host": host,
+        "port": port,
+        "password": password,
+        "max_connections": settings.REDIS_MAX_CONNECTIONS,
+        "timeout": settings.REDIS_POOL_TIMEOUT,
+        "socket_keepalive": True,
+        "socket_timeout": settings.REDIS_SOCKET_TIMEOUT,
+        "socket_connect_timeout": settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        "health_check_interval": settings.REDIS_HEALTH_CHECK_INTERVAL,
+    }
+
+
+def _retry_backoff() -> ExponentialWithJitterBackoff:
+    return ExponentialWithJitterBackoff(cap=settings.REDIS_RETRY_BACKOFF_CAP, base=settings.REDIS_RETRY_BACKOFF_BASE)
+
+
+def get_pool(kind: str = POOL_TEXT, db: int | None = None, host: str | None = None, port: int | None = None, password: str | None = None):
+    """
+    Returns the pool of a Redis destination, creating it on first use. Arguments left as None fall back
+    to the settings (REDIS_HOST, REDIS_PORT, REDIS_PASSWORD, REDIS_DB_MAIN).
+
+    Connections are opened lazily, with keepalive and a PING before reusing one idle for more than
+    REDIS_HEALTH_CHECK_INTERVAL seconds. Commands failing with connection errors or timeouts are retried
+    REDIS_RETRY_ATTEMPTS times with exponential backoff and jitter.
+    """
     db = db if db is not None else settings.REDIS_DB_MAIN
     host = host if host is not None else settings.REDIS_HOST
     port = port if port is not None else settings.REDIS_PORT
     password = password if password is not None else settings.REDIS_PASSWORD
-    logger.info(f"Connecting to Redis DB {db} at {host}:{port} with password {'set' if password else 'not set'}")
-
-    try:
-        redis_conn = redis.Redis(db=db, host=host, port=port, password=password, decode_responses=True)
-        redis_conn.ping()
-        logger.info(f"Successfully connected to Redis DB {db} at {host}:{port}")
-    except redis.ConnectionError as e:
-        import traceback
-        import inspect
-
-        frame = inspect.currentframe()
-        caller_frame = frame.f_back
-        
-        filename = caller_frame.f_code.co_filename
-        line_number = caller_frame.f_lineno
-        function_name = caller_frame.f_code.co_name
-        
-        print(f"Chamada de: {filename}:{line_number} na função '{function_name}'")
-
-        logger.error(f"Failed to connect to Redis DB {db} at {host}:{port}; {e}")
-        print(traceback.format_exc())
-        exit(1)
-
-    return redis_conn
\ No newline at end of file
+
+    key = (kind, host, port, db, password)
+    pool = _pools.get(key)
+    if pool is not None:
+        return pool
+
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is not None:
+            return pool
+
+        kwargs = _pool_kwargs(db, host, port, password)
+        if kind == POOL_ASYNC:
+            pool = InstrumentedAsyncBlockingConnectionPool(
+                decode_responses=True, retry=redis.asyncio.retry.Retry(_retry_backoff(), settings.REDIS_RETRY_ATTEMPTS), **kwargs
+            )
+        elif kind in (POOL_TEXT, POOL_BINARY):
+            pool = InstrumentedBlockingConnectionPool(
+                decode_responses=kind == POOL_TEXT, retry=Retry(_retry_backoff(), settings.REDIS_RETRY_ATTEMPTS), **kwargs
+            )
+        else:
+            raise ValueError(f"Unknown Redis pool kind: {kind}")
+
+        logger.info(
+            f"Creating {kind} Redis pool for DB {db} at {host}:{port} with password {'set' if password else 'not set'} "
+            f"(max_connections={settings.REDIS_MAX_CONNECTIONS})"
+        )
+        _pools[key] = pool
+        return pool
+
+
+def get_pool_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Connections of every pool of this process: created, in use, idle, and the checkouts that had to wait
+    for a free one (with the total time waited). Waits growing with the load mean REDIS_MAX_CONNECTIONS is
+    below the concurrency using the pool.
+    """
+    return {f"{kind}:{host}:{port}/{db}": pool.stats() for (kind, host, port, db, _), pool in list(_pools.items())}
+
+
+def check_redis_health() -> Dict[str, bool]:
+    """PINGs the destination of every synchronous pool. Failures are logged, never raised."""
+    health = {}
+    for (kind, host, port, db, _), pool in list(_pools.items()):
+        if kind == POOL_ASYNC:
+            continue
+
+        name = f"{kind}:{host}:{port}/{db}"
+        try:
+            health[name] = bool(redis.Redis(connection_pool=pool).ping())
+        except redis.RedisError as e:
+            logger.error(f"Redis health check failed for {name}: {e}")
+            health[name] = False
+    return health
+
+
+def get_redis(db: int | None = None, host: str | None = None, port: int | None = None, password: str | None = None) -> InstrumentedRedis:
+    """
+    Returns a client whose responses are decoded to str, over the pool of the given destination
+    (the main DB by default). See `get_pool`.
+    """
+    return InstrumentedRedis(connection_pool=get_pool(POOL_TEXT, db, host, port, password))
+
+
+def get_async_redis(db: int | None = None, host: str | None = None, port: int | None = None, password: str | None = None) -> redis.asyncio.Redis:
+    """
+    Returns a `redis.asyncio` client for the async (ASGI) entry points.
+    The connection is established lazily, on the first command awaited inside the event loop.
+    """
+    return redis.asyncio.Redis(connection_pool=get_pool(POOL_ASYNC, db, host, port, password))
+
+
+def get_binary_redis(db: int | None = None, host: str | None = None, port: int | None = None, password: str | None = None) -> InstrumentedRedis:
+    """
+    Returns a client that keeps responses as bytes, for values stored in binary formats (e.g. the compressed state).
+    The connection is established lazily, on the first command.
+    """
+    return InstrumentedRedis(connection_pool=get_pool(POOL_BINARY, db, host, port, password))
@@ -0,0 +1,153 @@
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Union
+
+import zstandard
+
+from app.core.logger import get_logger
+from app.config.settings import settings
+from app.services.redis_service import get_binary_redis
+
+logger = get_logger(__name__)
+binary_redis_client = get_binary_redis()
+
+# Codecs (settings.STATE_CODEC)
+STATE_CODEC_JSON = "json"            # JSON puro, sem cabeçalho: o formato legado, legível por versões antigas
+STATE_CODEC_ZSTD = "zstd"            # 0x01 + frame zstd do JSON
+STATE_CODEC_ZSTD_DICT = "zstd-dict"  # 0x02 + frame zstd do JSON, comprimido com um dicionário treinado
+
+# Header byte with the format version of an encoded value
+HEADER_ZSTD = 0x01
+HEADER_ZSTD_DICT = 0x02
+# Legacy values are the plain JSON written by model_dump_json, which always starts with '{'
+LEGACY_JSON_FIRST_BYTE = ord("{")
+
+# Trained dictionaries are kept in Redis, so every process can decode values compressed by any of them
+STATE_CODEC_DICT_KEY = "state:codec:dict:{dict_id}"
+STATE_CODEC_CURRENT_DICT_KEY = "state:codec:dict:current"
+STATE_CODEC_DICT_SIZE = 16 * 1024
+
+
+def train_dictionary(samples: List[bytes], dict_size: int = STATE_CODEC_DICT_SIZE) -> zstandard.ZstdCompressionDict:
+    """
+    Trains a zstd dictionary from encoded-state samples (plain JSON).
+    States share most of their keys and many values, so a dictionary lets even small states compress well.
+    """
+    return zstandard.train_dictionary(dict_size, samples)
+
+
+def store_dictionary(dictionary: zstandard.ZstdCompressionDict, make_current: bool = True) -> int:
+    """
+    Stores a trained dictionary in Redis and (optionally) makes it the one used for new writes.
+    Processes pick up a new current dictionary on restart; older ones stay available for decoding.
+
+    Returns:
+        int: The dictionary id, which zstd also records in every frame compressed with it.
+    """
+    dict_id = dictionary.dict_id()
+
+    pipe = binary_redis_client.pipeline()
+    pipe.set(STATE_CODEC_DICT_KEY.format(dict_id=dict_id), dictionary.as_bytes())
+    if make_current:
+        pipe.set(STATE_CODEC_CURRENT_DICT_KEY, dict_id)
+    pipe.execute()
+
+    logger.info(f"State codec dictionary {dict_id} stored ({len(dictionary)} bytes, current={make_current}).")
+    return dict_id
+
+
+class StateCodec:
+    """
+    Encodes the serialized ConversationState for storage and decodes it back to JSON.
+
+    Every encoded value carries a header byte with its format, so values written with any codec
+    (and legacy plain JSON) can always be read, whatever the codec currently configured for writes.
+    """
+
+    def __init__(self, codec: str = STATE_CODEC_JSON, level: int = 3, dictionary: Optional[zstandard.ZstdCompressionDict] = None):
+        if codec not in (STATE_CODEC_JSON, STATE_CODEC_ZSTD, STATE_CODEC_ZSTD_DICT):
+            raise ValueError(f"Unknown state codec: {codec}")
+
+        if codec == STATE_CODEC_ZSTD_DICT and dictionary is None:
+            logger.warning("State codec 'zstd-dict' configured without a trained dictionary. Falling back to 'zstd'.")
+            codec = STATE_CODEC_ZSTD
+
+        self.codec = codec
+        self.level = level
+        self.dictionary = dictionary
+        self._dictionaries: Dict[int, zstandard.ZstdCompressionDict] = {}
+        if dictionary is not None:
+            self._dictionaries[dictionary.dict_id()] = dictionary
+
+        # zstd (de)compressors must not be shared between threads
+        self._local = threading.local()
+
+    def _compressor(self) -> zstandard.ZstdCompressor:
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            dictionary = self.dictionary if self.codec == STATE_CODEC_ZSTD_DICT else None
+            compressor = zstandard.ZstdCompressor(level=self.level, dict_data=dictionary, write_content_size=True)
+            self._local.compressor = compressor
+        return compressor
+
+    def _decompressor(self, dict_id: int) -> zstandard.ZstdDecompressor:
+        decompressors = getattr(self._local, "decompressors", None)
+        if decompressors is None:
+            decompressors = self._local.decompressors = {}
+
+        decompressor = decompressors.get(dict_id)
+        if decompressor is None:
+            dictionary = self._get_dictionary(dict_id) if dict_id else None
+            decompressor = decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=dictionary)
+        return decompressor
+
+    def _get_dictionary(self, dict_id: int) -> zstandard.ZstdCompressionDict:
+        dictionary = self._dictionaries.get(dict_id)
+        if dictionary is None:
+            raw = binary_redis_client.get(STATE_CODEC_DICT_KEY.format(dict_id=dict_id))
+            if raw is None:
+                raise ValueError(f"State codec dictionary {dict_id} not found.")
+            dictionary = zstandard.ZstdCompressionDict(raw)
+            self._dictionaries[dict_id] = dictionary
+        return dictionary
+
+    def encode(self, state_json: Union[str, bytes]) -> bytes:
+        """Encodes the JSON of a state (as produced by model_dump_json) with the configured codec."""
+        payload = state_json.encode() if isinstance(state_json, str) else state_json
+
+        if self.codec == STATE_CODEC_JSON:
+            return payload
+
+        header = HEADER_ZSTD_DICT if self.codec == STATE_CODEC_ZSTD_DICT else HEADER_ZSTD
+        return bytes([header]) + self._compressor().compress(payload)
+
+    def decode(self, data: Optional[bytes]) -> Optional[bytes]:
+        """Decodes a stored value of any known format back to the JSON of the state."""
+        if not data:
+            return data
+
+        header = data[0]
+        if header == LEGACY_JSON_FIRST_BYTE:
+            return data
+
+        if header == HEADER_ZSTD:
+            return self._decompressor(0).decompress(data[1:])
+
+        if header == HEADER_ZSTD_DICT:
+            # The frame records the id of the dictionary it was compressed with
+            dict_id = zstandard.get_frame_parameters(data[1:]).dict_id
+            return self._decompressor(dict_id).decompress(data[1:])
+
+        raise ValueError(f"Unknown state codec header: {header:#04x}")
+
+
+@lru_cache(maxsize=1)
+def get_state_codec() -> StateCodec:
+    """Returns the process-wide codec configured in settings (STATE_CODEC, STATE_CODEC_LEVEL)."""
+    dictionary = None
+    if settings.STATE_CODEC == STATE_CODEC_ZSTD_DICT:
+        dict_id = binary_redis_client.get(STATE_CODEC_CURRENT_DICT_KEY)
+        raw = binary_redis_client.get(STATE_CODEC_DICT_KEY.format(dict_id=int(dict_id))) if dict_id else None
+        dictionary = zstandard.ZstdCompressionDict(raw) if raw else None
+
+    return StateCodec(settings.STATE_CODEC, settings.STATE_CODEC_LEVEL, dictionary)
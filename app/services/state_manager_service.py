@@ -1,31 +1,284 @@
 import redis
 import json
+import copy
+import time
+import random
 import datetime
-from typing import Dict, Any, Optional
-from pydantic import ValidationError
+import threading
+import zstandard
+from collections import OrderedDict
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from pydantic import TypeAdapter, ValidationError
+from pydantic_core import to_json
 
 from app.core.logger import get_logger
 
-from app.services.redis_service import get_redis
-from app.models.data_models import ConversationState, StateMetadata
+from app.config.settings import settings
+from app.services.redis_service import get_redis, get_binary_redis
+from app.services.state_codec import get_state_codec
+from app.models.data_models import ConversationState, StateMetadata, compact_state_list
 
 logger = get_logger(__name__)
 
 redis_client = get_redis()
+# Stored states may be compressed, so they are read without decoding the responses
+binary_redis_client = get_binary_redis()
+
+# Attempts of update_state before giving up on a state that keeps being changed by other writers
+STATE_UPDATE_MAX_RETRIES = 10
+STATE_UPDATE_RETRY_BACKOFF = 0.005  # seconds, scaled by the attempt number
+
+# Storage modes (settings.STATE_STORAGE_MODE)
+STATE_STORAGE_BLOB = "blob"  # state:{id} -> JSON document with the whole state
+STATE_STORAGE_HASH = "hash"  # state:fields:{id} -> one JSON value per top-level field
+
+# One TypeAdapter per top-level field, so each field is (de)serialized on its own in hash mode
+_FIELD_ADAPTERS: Dict[str, TypeAdapter] = {name: TypeAdapter(field.annotation) for name, field in ConversationState.model_fields.items()}
+
+# Patches fields of a state already stored as a hash. Returns the new version, or nil when the hash does not exist yet.
+# KEYS[1] = fields hash, KEYS[2] = version; ARGV = field1, json1, field2, json2...
+_PATCH_FIELDS_LUA = """
+if redis.call('HEXISTS', KEYS[1], 'metadata') == 0 then
+    return false
+end
+redis.call('HSET', KEYS[1], unpack(ARGV))
+return redis.call('INCR', KEYS[2])
+"""
+
+# Full write of a state that only happens if nobody else wrote it since it was read (bulk maintenance).
+# KEYS[1] = blob, KEYS[2] = fields hash, KEYS[3] = version
+# ARGV[1] = expected version, ARGV[2] = storage mode, ARGV[3] = encoded blob | ARGV[3..] = field1, json1, field2, json2...
+_SAVE_IF_UNCHANGED_LUA = """
+if (redis.call('GET', KEYS[3]) or '0') ~= ARGV[1] then
+    return 0
+end
+if ARGV[2] == 'hash' then
+    redis.call('DEL', KEYS[1], KEYS[2])
+    redis.call('HSET', KEYS[2], unpack(ARGV, 3))
+else
+    redis.call('SET', KEYS[1], ARGV[3])
+    redis.call('DEL', KEYS[2])
+end
+redis.call('INCR', KEYS[3])
+return 1
+"""
+
+_patch_fields_script = redis_client.register_script(_PATCH_FIELDS_LUA)
+_save_if_unchanged_script = redis_client.register_script(_SAVE_IF_UNCHANGED_LUA)
 
 class StateManagerService:
     """
     Serviço para gerenciar o estado da conversa com o cliente,
     utilizando o Redis como mecanismo de persistência e cache.
+
+    O estado pode ser armazenado como um único valor (modo "blob", codificado pelo `StateCodec`:
+    JSON legado ou zstd) ou como um hash com um JSON por
+    campo de topo (modo "hash"), que permite ler apenas alguns campos (`get_fields`) e gravar apenas
+    o que mudou (`patch_state`). A leitura aceita os dois formatos, então a troca de modo migra os
+    estados aos poucos, na próxima gravação completa de cada um.
+
+    Opcionalmente mantém um cache local (por processo) dos estados já validados. Cada gravação
+    incrementa a versão do estado no Redis; uma leitura cuja versão não mudou reconstrói o estado
+    a partir do cache, sem baixar nem decodificar o JSON novamente.
+
+    Toda gravação compacta as listas que crescem a cada turno (`list_limits`); os itens
+    excedentes vão para `state:archive:{id}:{campo}` e podem ser lidos com `get_archive`.
     """
 
-    def __init__(self):
+    # Compartilhado entre as instâncias do processo: cada módulo de crew cria a sua própria
+    _local_cache: "OrderedDict[str, Tuple[int, Dict[str, Any]]]" = OrderedDict()
+    _local_cache_lock = threading.Lock()
+
+    def __init__(self, local_cache: Optional[bool] = None, storage_mode: Optional[str] = None):
         self.redis_client = redis_client
+        self.binary_redis_client = binary_redis_client
+        self.codec = get_state_codec()
+        self.local_cache_enabled = settings.STATE_LOCAL_CACHE_ENABLED if local_cache is None else local_cache
+        self.storage_mode = storage_mode or settings.STATE_STORAGE_MODE
+        # Cap of each bounded list field, applied on every write (see ConversationState.compact)
+        self.list_limits = {
+            "entities_extracted": settings.STATE_MAX_ENTITIES,
+            "user_sentiment_history": settings.STATE_SENTIMENT_WINDOW,
+            "unresolved_objections": settings.STATE_MAX_UNRESOLVED_OBJECTIONS,
+            "qualification_tracker": settings.STATE_MAX_QUALIFICATION_ITEMS,
+        }
 
     def _get_state_key(self, contact_id: str) -> str:
         """Gera a chave padronizada para armazenar o estado no Redis."""
         return f"state:{contact_id}"
 
+    def _get_fields_key(self, contact_id: str) -> str:
+        """Chave do hash com os campos do estado (modo hash)."""
+        return f"state:fields:{contact_id}"
+
+    def _get_version_key(self, contact_id: str) -> str:
+        """Chave do contador de versão do estado, incrementado a cada gravação."""
+        return f"state:version:{contact_id}"
+
+    def _get_archive_key(self, contact_id: str, field: str) -> str:
+        """Chave da lista com os itens de um campo do estado que excederam o limite."""
+        return f"state:archive:{contact_id}:{field}"
+
+    def _lookup_local_cache(self, contact_id: str, version: int) -> Optional[ConversationState]:
+        """Returns a new instance of the locally cached state if it was cached at the given version."""
+        with self._local_cache_lock:
+            cached = self._local_cache.get(contact_id)
+            if cached is None or cached[0] != version:
+                return None
+            self._local_cache.move_to_end(contact_id)
+
+        # Callers mutate the state they receive, so every hit builds a new instance. Validating the cached
+        # python data is cheaper than both model_validate_json and model_copy(deep=True) (see benchmarks/state_cache.py).
+        # Note: nested containers inside fields typed as Any are shared with the cache and must be replaced, not mutated.
+        return ConversationState.model_validate(cached[1])
+
+    def _get_cached_state(self, contact_id: str) -> Optional[ConversationState]:
+        """Returns the locally cached state if its version is still the current one in Redis."""
+        with self._local_cache_lock:
+            if contact_id not in self._local_cache:
+                return None
+
+        current_version = int(self.redis_client.get(self._get_version_key(contact_id)) or 0)
+        return self._lookup_local_cache(contact_id, current_version)
+
+    def _cache_state(self, contact_id: str, version: int, state: ConversationState):
+        with self._local_cache_lock:
+            self._local_cache[contact_id] = (version, state.model_dump())
+            self._local_cache.move_to_end(contact_id)
+            while len(self._local_cache) > settings.STATE_LOCAL_CACHE_SIZE:
+                self._local_cache.popitem(last=False)
+
+    def _patch_cached_state(self, contact_id: str, version: int, patch: Dict[str, Any]):
+        """Moves the cached state to `version` when the patch is the only write since it was cached."""
+        with self._local_cache_lock:
+            cached = self._local_cache.get(contact_id)
+            if cached is None or cached[0] != version - 1:
+                return
+
+            state_data = dict(cached[1])
+            for name, value in patch.items():
+                state_data[name] = _FIELD_ADAPTERS[name].dump_python(value)
+            self._local_cache[contact_id] = (version, state_data)
+
+    def _state_to_fields(self, state: ConversationState) -> Dict[str, bytes]:
+        return {name: adapter.dump_json(getattr(state, name)) for name, adapter in _FIELD_ADAPTERS.items()}
+
+    def _fields_to_json(self, fields: Dict[bytes, bytes]) -> bytes:
+        # Cada valor já é JSON: o documento é montado sem decodificar e validado de uma vez por model_validate_json.
+        # Campos que não existem mais no modelo são ignorados.
+        return b"{" + b",".join(b'"%s":%s' % (name, raw) for name, raw in fields.items() if name.decode() in _FIELD_ADAPTERS) + b"}"
+
+    def _parse_field(self, contact_id: str, name: str, raw: Optional[str]) -> Any:
+        """Validates a single stored field, falling back to the field default when it is missing or invalid."""
+        if raw is not None:
+            try:
+                return _FIELD_ADAPTERS[name].validate_json(raw)
+            except ValidationError as e:
+                logger.warning(f"[{contact_id}] - Invalid stored value for state field '{name}': {e}. Using default.")
+
+        return copy.deepcopy(ConversationState.model_fields[name].get_default(call_default_factory=True))
+
+    def _check_fields(self, fields) -> None:
+        unknown = set(fields) - set(_FIELD_ADAPTERS)
+        if unknown:
+            raise ValueError(f"Unknown ConversationState fields: {sorted(unknown)}")
+
+    def _queue_read(self, pipe: redis.client.Pipeline, contact_id: str):
+        """
+        Queues the reads of a stored state, in either storage format, and of its version (see `_unpack_read`).
+        `pipe` must come from the binary client.
+        """
+        pipe.hgetall(self._get_fields_key(contact_id))
+        pipe.get(self._get_state_key(contact_id))
+        pipe.get(self._get_version_key(contact_id))
+
+    def _unpack_read(self, results: list) -> Tuple[Optional[bytes], Optional[bytes]]:
+        """Returns the stored state as a single JSON document, whatever its storage format and codec, and its version."""
+        fields, stored_state, version = results
+
+        # Writes always delete the other format, so at most one of them exists
+        if fields:
+            return self._fields_to_json(fields), version
+        return self.codec.decode(stored_state), version
+
+    def _decode_read(self, contact_id: str, results: list) -> Tuple[Optional[bytes], Optional[bytes]]:
+        """
+        `_unpack_read` for the readers of the state: a value that cannot be decoded (unknown codec header,
+        missing dictionary, corrupt frame) is logged and read as missing, so the initial state is used.
+        """
+        try:
+            return self._unpack_read(results)
+        except (ValueError, zstandard.ZstdError) as e:
+            logger.error(f"[{contact_id}] - Could not decode stored state: {e}. Creating new state.")
+            return None, results[-1]
+
+    def _queue_write(self, pipe: redis.client.Pipeline, contact_id: str, state: ConversationState):
+        """Queues the full write of the state in the configured storage mode. The new version is the last result."""
+        if self.storage_mode == STATE_STORAGE_HASH:
+            pipe.hset(self._get_fields_key(contact_id), mapping=self._state_to_fields(state))
+            pipe.delete(self._get_state_key(contact_id))
+        else:
+            pipe.set(self._get_state_key(contact_id), self.codec.encode(state.model_dump_json()))
+            pipe.delete(self._get_fields_key(contact_id))
+
+        # The version is bumped even with the local cache disabled, so processes using it never serve a stale state
+        pipe.incr(self._get_version_key(contact_id))
+
+    def _queue_fields_write(self, pipe: redis.client.Pipeline, contact_id: str, state: ConversationState, fields: List[str]):
+        """Queues the write of only some fields of a state already stored as a hash. The new version is the last result."""
+        if fields:
+            pipe.hset(self._get_fields_key(contact_id), mapping={name: _FIELD_ADAPTERS[name].dump_json(getattr(state, name)) for name in fields})
+        pipe.incr(self._get_version_key(contact_id))
+
+    def _compact(self, contact_id: str, state: ConversationState, fields: Optional[List[str]] = None) -> Dict[str, list]:
+        """Compacts the bounded lists of the state (only `fields`, when given) and returns the evicted items."""
+        limits = self.list_limits if fields is None else {name: limit for name, limit in self.list_limits.items() if name in fields}
+        evicted = state.compact(limits)
+        if evicted:
+            logger.info(f"[{contact_id}] - State lists over their limit, archiving: { {name: len(items) for name, items in evicted.items()} }")
+        return evicted
+
+    def _queue_archive(self, pipe: redis.client.Pipeline, contact_id: str, evicted: Dict[str, list]):
+        """Queues the append of the evicted items of each field to its archive list."""
+        for name, items in evicted.items():
+            archive_key = self._get_archive_key(contact_id, name)
+            pipe.rpush(archive_key, *[to_json(item) for item in items])
+            pipe.ltrim(archive_key, -settings.STATE_ARCHIVE_MAX_ITEMS, -1)
+
+    def get_archive(self, contact_id: str, field: str) -> list:
+        """
+        Retrieves the items of a bounded list field that were evicted from the state, oldest first.
+
+        Args:
+            contact_id (str): The unique ID of the contact.
+            field (str): A bounded list field, e.g. "entities_extracted".
+
+        Returns:
+            list: The archived items, validated as items of the field.
+        """
+        if field not in self.list_limits:
+            raise ValueError(f"State field '{field}' is not archived.")
+
+        archived = self.binary_redis_client.lrange(self._get_archive_key(contact_id, field), 0, -1)
+        return _FIELD_ADAPTERS[field].validate_json(b"[" + b",".join(archived) + b"]")
+
+    def queue_save_if_unchanged(self, pipe: redis.client.Pipeline, contact_id: str, state: ConversationState, expected_version: int):
+        """
+        Queues a full write of the state, in the configured storage mode and codec, that is skipped
+        when the state version is no longer `expected_version`. The queued command returns 1 if the
+        state was written and 0 if it changed in the meantime.
+        Used by bulk maintenance, which reads and writes many states per round trip without WATCH.
+        """
+        if self.storage_mode == STATE_STORAGE_HASH:
+            args = [expected_version, STATE_STORAGE_HASH]
+            for name, value in self._state_to_fields(state).items():
+                args += [name, value]
+        else:
+            args = [expected_version, STATE_STORAGE_BLOB, self.codec.encode(state.model_dump_json())]
+
+        keys = [self._get_state_key(contact_id), self._get_fields_key(contact_id), self._get_version_key(contact_id)]
+        _save_if_unchanged_script(keys=keys, args=args, client=pipe)
+
     def _get_initial_state(self, contact_id: str) -> ConversationState:
         """
         Creates and returns a new ConversationState object.
@@ -47,47 +300,116 @@ class StateManagerService:
         Returns:
             ConversationState: The Pydantic model of the conversation state.
         """
-        state_key = self._get_state_key(contact_id)
         try:
-            stored_state_json = self.redis_client.get(state_key)
-            
-            if stored_state_json:
-                logger.info(f"[{contact_id}] - Conversation state found, loading from Redis.")
-                return ConversationState.model_validate_json(stored_state_json), False
-            else:
-                logger.info(f"[{contact_id}] - No state found. Creating a new initial state in memory.")
-                return self._get_initial_state(contact_id), True
+            if self.local_cache_enabled:
+                cached_state = self._get_cached_state(contact_id)
+                if cached_state is not None:
+                    logger.info(f"[{contact_id}] - Conversation state unchanged, loading from local cache.")
+                    return cached_state, False
+
+            # MULTI keeps the state and its version consistent with each other
+            pipe = self.binary_redis_client.pipeline()
+            self._queue_read(pipe, contact_id)
+            stored_state_json, version = self._decode_read(contact_id, pipe.execute())
+
+            return self._parse_stored_state(contact_id, stored_state_json, version)
 
         except redis.exceptions.RedisError as e:
             logger.error(f"[{contact_id}] - Redis error when fetching state: {e}")
             return self._get_initial_state(contact_id), True
+
+    def queue_get_state(self, pipe: redis.client.Pipeline, contact_id: str):
+        """
+        Queues the reads of `get_state` in a pipeline of the binary client, so the state can be fetched
+        in the same round trip as other keys. The three queued results go to `state_from_read`.
+        """
+        self._queue_read(pipe, contact_id)
+
+    def state_from_read(self, contact_id: str, results: list) -> tuple[ConversationState, bool]:
+        """Builds the state from the results queued by `queue_get_state`, like `get_state` does."""
+        stored_state_json, version = self._decode_read(contact_id, results)
+
+        cached_state = self._lookup_local_cache(contact_id, int(version or 0)) if self.local_cache_enabled else None
+        if cached_state is not None:
+            logger.info(f"[{contact_id}] - Conversation state unchanged, loading from local cache.")
+            return cached_state, False
+
+        return self._parse_stored_state(contact_id, stored_state_json, version)
+
+    def get_fields(self, contact_id: str, fields: List[str]) -> Dict[str, Any]:
+        """
+        Retrieves only some top-level fields of the conversation state.
+
+        In hash mode only the requested fields are transferred and validated. Otherwise (or while
+        the state has not been migrated to the hash yet) the full state is loaded.
+
+        Args:
+            contact_id (str): The unique ID of the contact.
+            fields (List[str]): Names of ConversationState fields, e.g. an `agent_state_mapping` entry.
+
+        Returns:
+            Dict[str, Any]: The validated value of each requested field (defaults for a new state).
+        """
+        self._check_fields(fields)
+
+        if self.storage_mode == STATE_STORAGE_HASH:
+            # metadata is required, so when it is missing the state is not stored as a hash (yet)
+            requested = list(dict.fromkeys([*fields, "metadata"]))
+            try:
+                raw_fields = dict(zip(requested, self.redis_client.hmget(self._get_fields_key(contact_id), requested)))
+            except redis.exceptions.RedisError as e:
+                logger.error(f"[{contact_id}] - Redis error when fetching state fields: {e}")
+                raw_fields = {}
+
+            if raw_fields.get("metadata") is not None:
+                return {name: self._parse_field(contact_id, name, raw_fields[name]) for name in fields}
+
+        state, _ = self.get_state(contact_id)
+        return {name: getattr(state, name) for name in fields}
+
+    def _parse_stored_state(self, contact_id: str, stored_state_json: Optional[bytes], version: Optional[bytes]) -> tuple[ConversationState, bool]:
+        """
+        Builds the ConversationState from its stored JSON, migrating old formats when needed.
+        Valid states are added to the local cache at the given version.
+        """
+        if not stored_state_json:
+            logger.info(f"[{contact_id}] - No state found. Creating a new initial state in memory.")
+            return self._get_initial_state(contact_id), True
+
+        try:
+            logger.info(f"[{contact_id}] - Conversation state found, loading from Redis.")
+            state = ConversationState.model_validate_json(stored_state_json)
+            if self.local_cache_enabled:
+                self._cache_state(contact_id, int(version or 0), state)
+            return state, False
+
         except ValidationError as e:
             logger.warning(f"[{contact_id}] - Pydantic validation error for stored state: {e}. Attempting to migrate old state format.")
-            if stored_state_json:
-                try:
-                    old_state_dict = json.loads(stored_state_json)
-                    return self._migrate_old_state(old_state_dict), False
-                except (json.JSONDecodeError, TypeError):
-                    logger.error(f"[{contact_id}] - Could not migrate old state as it is not valid JSON. Creating new state.")
-                    return self._get_initial_state(contact_id), True
-            else:
-                # This case should not be hit if ValidationError was raised, but as a safeguard:
+            try:
+                old_state_dict = json.loads(stored_state_json)
+                return self._migrate_old_state(old_state_dict), False
+            except (json.JSONDecodeError, TypeError):
+                logger.error(f"[{contact_id}] - Could not migrate old state as it is not valid JSON. Creating new state.")
                 return self._get_initial_state(contact_id), True
 
     def save_state(self, contact_id: str, state: ConversationState):
         """
-        Saves the complete conversation state to Redis.
+        Saves the complete conversation state to Redis and bumps its version.
 
         Args:
             contact_id (str): The unique ID of the contact.
             state (ConversationState): The Pydantic state object to be saved.
         """
-        state_key = self._get_state_key(contact_id)
-        
         try:
-            # Serialize the Pydantic model to a JSON string
-            state_json = state.model_dump_json()
-            self.redis_client.set(state_key, state_json)
+            evicted = self._compact(contact_id, state)
+
+            pipe = self.redis_client.pipeline()
+            self._queue_archive(pipe, contact_id, evicted)
+            self._queue_write(pipe, contact_id, state)
+            version = pipe.execute()[-1]
+
+            if self.local_cache_enabled:
+                self._cache_state(contact_id, version, state)
             logger.info(f"[{contact_id}] - Conversation state saved successfully to Redis.")
 
         except redis.exceptions.RedisError as e:
@@ -95,6 +417,139 @@ class StateManagerService:
         except Exception as e:
             logger.error(f"[{contact_id}] - An unexpected error occurred during state serialization: {e}")
 
+    def patch_state(self, contact_id: str, patch: Dict[str, Any]):
+        """
+        Writes only the given top-level fields of the conversation state.
+
+        In hash mode the delta is written straight to the stored fields, without reading the state.
+        In blob mode (or while the state has not been migrated to the hash yet) the patch goes
+        through `update_state`.
+
+        Args:
+            contact_id (str): The unique ID of the contact.
+            patch (Dict[str, Any]): New value of each field. Values are validated against the field types.
+        """
+        self._check_fields(patch)
+        validated = {name: _FIELD_ADAPTERS[name].validate_python(value) for name, value in patch.items()}
+
+        if self.storage_mode == STATE_STORAGE_HASH:
+            evicted = {}
+            for name in validated.keys() & self.list_limits.keys():
+                validated[name], evicted_items = compact_state_list(name, validated[name], self.list_limits[name])
+                if evicted_items:
+                    evicted[name] = evicted_items
+
+            args = []
+            for name, value in validated.items():
+                args += [name, _FIELD_ADAPTERS[name].dump_json(value)]
+
+            pipe = self.redis_client.pipeline()
+            self._queue_archive(pipe, contact_id, evicted)
+            _patch_fields_script(keys=[self._get_fields_key(contact_id), self._get_version_key(contact_id)], args=args, client=pipe)
+            version = pipe.execute()[-1]
+            if version is not None:
+                if self.local_cache_enabled:
+                    self._patch_cached_state(contact_id, int(version), validated)
+                logger.info(f"[{contact_id}] - Conversation state fields patched: {list(validated)}.")
+                return
+
+        # Full read-modify-write, which also stores the state in the configured format
+        self.update_state(contact_id, lambda state: state.model_copy(update=validated))
+
+    def merge(self, contact_id: str, partial: Dict[str, Any]) -> tuple[ConversationState, bool]:
+        """
+        Merges a partial state (usually the state update returned by an agent) into the current state.
+
+        Only the top-level fields present in `partial` are validated, each against its own field type,
+        and applied with `model_copy(update=...)`, instead of dumping and re-validating the whole state.
+        In hash mode only those fields are written. Keys that are not ConversationState fields are
+        ignored, as `ConversationState(**{**state.model_dump(), **partial})` did.
+
+        Args:
+            contact_id (str): The unique ID of the contact.
+            partial (Dict[str, Any]): New value of each top-level field to replace.
+
+        Returns:
+            tuple[ConversationState, bool]: The saved state and whether it was created by this merge.
+
+        Raises:
+            pydantic.ValidationError: If a value does not match its field type.
+        """
+        unknown = set(partial) - set(_FIELD_ADAPTERS)
+        if unknown:
+            logger.debug(f"[{contact_id}] - Ignoring unknown state fields in merge: {sorted(unknown)}")
+
+        validated = {name: _FIELD_ADAPTERS[name].validate_python(value) for name, value in partial.items() if name in _FIELD_ADAPTERS}
+
+        return self.update_state(contact_id, lambda state: state.model_copy(update=validated), fields=list(validated))
+
+    def update_state(self, contact_id: str, fn: Callable[[ConversationState], Optional[ConversationState]], max_retries: int = STATE_UPDATE_MAX_RETRIES, fields: Optional[List[str]] = None) -> tuple[ConversationState, bool]:
+        """
+        Applies `fn` to the current state and saves the result, using optimistic concurrency
+        instead of a lock: the state and its version are WATCHed, and if another writer commits
+        in between, the transaction is discarded and `fn` runs again on the fresh state.
+
+        `fn` may run several times, so it must only change the state. Side effects (sending
+        messages, enqueuing tasks) belong after `update_state` returns.
+
+        Args:
+            contact_id (str): The unique ID of the contact.
+            fn (Callable): Receives the current state and either mutates it in place (returning None)
+                or returns the new state.
+            max_retries (int): Attempts before giving up on a contended state.
+            fields (Optional[List[str]]): The only fields `fn` changes. When given, a state already
+                stored as a hash has just these fields written back.
+
+        Returns:
+            tuple[ConversationState, bool]: The saved state and whether it was created by this update.
+
+        Raises:
+            redis.exceptions.WatchError: If every attempt conflicted with another writer.
+        """
+        watched_keys = (self._get_state_key(contact_id), self._get_fields_key(contact_id), self._get_version_key(contact_id))
+
+        with self.redis_client.pipeline() as pipe:
+            for attempt in range(1, max_retries + 1):
+                try:
+                    pipe.watch(*watched_keys)
+
+                    # Reads may use another connection: any write after the WATCH still aborts the EXEC below
+                    read_pipe = self.binary_redis_client.pipeline()
+                    self._queue_read(read_pipe, contact_id)
+                    read_results = read_pipe.execute()
+                    stored_state_json, version = self._decode_read(contact_id, read_results)
+
+                    cached_state = self._lookup_local_cache(contact_id, int(version or 0)) if self.local_cache_enabled else None
+                    if cached_state is not None:
+                        state, is_new = cached_state, False
+                    else:
+                        state, is_new = self._parse_stored_state(contact_id, stored_state_json, version)
+
+                    updated_state = fn(state)
+                    state = updated_state if updated_state is not None else state
+                    evicted = self._compact(contact_id, state, fields)
+
+                    pipe.multi()
+                    self._queue_archive(pipe, contact_id, evicted)
+                    if fields is not None and self.storage_mode == STATE_STORAGE_HASH and read_results[0]:
+                        self._queue_fields_write(pipe, contact_id, state, fields)
+                    else:
+                        self._queue_write(pipe, contact_id, state)
+                    new_version = pipe.execute()[-1]
+
+                    if self.local_cache_enabled:
+                        self._cache_state(contact_id, new_version, state)
+                    logger.info(f"[{contact_id}] - Conversation state updated successfully (attempt {attempt}).")
+                    return state, is_new
+
+                except redis.exceptions.WatchError:
+                    logger.info(f"[{contact_id}] - State changed by another writer during update. Retrying ({attempt}/{max_retries}).")
+                    # Jitter so writers that conflicted once do not collide again on the next attempt
+                    time.sleep(random.uniform(0, STATE_UPDATE_RETRY_BACKOFF * attempt))
+
+        logger.error(f"[{contact_id}] - Could not update state after {max_retries} conflicting attempts.")
+        raise redis.exceptions.WatchError(f"State of {contact_id} kept changing during update_state.")
+
     def _migrate_old_state(self, old_dict: Dict[str, Any]) -> ConversationState:
         """
         Attempts to migrate a state from an old dictionary format to the new
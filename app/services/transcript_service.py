@@ -1,18 +1,30 @@
 import hashlib
 import json
 import requests
+from typing import Optional
 from app.config.settings import settings
 from app.services.redis_service import get_redis
 from app.core.logger import get_logger
 
 logger = get_logger(__name__)
 
-def transcript(attach):
+def transcript(attach, audio_bytes: Optional[bytes] = None, content_hash: Optional[str] = None):
+    """
+    Transcreve o áudio da URL via Gladia, com cache pelo hash do conteúdo.
+
+    Args:
+        attach (str): URL do áudio.
+        audio_bytes (Optional[bytes]): Conteúdo já baixado (ex.: pelo processamento em lote). Evita um novo download.
+        content_hash (Optional[str]): sha256 de `audio_bytes`, se já calculado. Evita hashear o conteúdo de novo.
+    """
     redis_conn = get_redis()
+    cache_key = None
 
     try:
-        audio_bytes = requests.get(attach).content
-        content_hash = hashlib.sha256(audio_bytes).hexdigest()
+        if audio_bytes is None:
+            audio_bytes = requests.get(attach).content
+        if content_hash is None:
+            content_hash = hashlib.sha256(audio_bytes).hexdigest()
         cache_key = f"transcript:{content_hash}"
 
         cached_result = redis_conn.get(cache_key)
@@ -57,9 +69,10 @@ def transcript(attach):
     transcript_text = response_transcript.get('result', {}).get('transcription', {}).get('full_transcript', '')
     text = f'\n{transcript_text}'
             
-    try:
-        redis_conn.setex(cache_key, 86400, json.dumps(text)) # Cache for 24 hours
-    except Exception as e:
-        logger.error(f"Failed to write to cache: {e}")
+    if cache_key:
+        try:
+            redis_conn.setex(cache_key, 86400, json.dumps(text)) # Cache for 24 hours
+        except Exception as e:
+            logger.error(f"Failed to write to cache: {e}")
 
     return text
\ No newline at end of file
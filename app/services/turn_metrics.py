@@ -0,0 +1,95 @@
+"""
+Redis operations per conversation turn.
+
+Every task that receives a `turn_id` has its Redis commands and round trips counted (see
+`InstrumentedRedis`) and added to the turn totals, so turns run with the turn snapshot
+(TURN_SNAPSHOT_ENABLED) can be compared with turns where each task reads its own context.
+"""
+from typing import Dict
+
+from celery.signals import task_prerun, task_postrun
+
+from app.core.logger import get_logger
+from app.services.redis_service import get_redis, start_redis_op_count, stop_redis_op_count, RedisOpCounter
+from app.config.settings import settings
+
+logger = get_logger(__name__)
+redis_client = get_redis()
+
+TURN_METRICS_KEY = "turn:metrics:{turn_id}"
+TURN_METRICS_SUMMARY_KEY = "turn:metrics:summary"
+TURN_METRICS_TTL = 86400
+
+# Celery task id -> (turn id, op count token)
+_active_counts = {}
+
+
+def _turn_mode() -> str:
+    return "snapshot" if settings.TURN_SNAPSHOT_ENABLED else "live"
+
+
+def record_turn_start(turn_id: str):
+    """Counts a new turn in the summary of the current mode."""
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hset(TURN_METRICS_KEY.format(turn_id=turn_id), "mode", _turn_mode())
+    pipe.expire(TURN_METRICS_KEY.format(turn_id=turn_id), TURN_METRICS_TTL)
+    pipe.hincrby(TURN_METRICS_SUMMARY_KEY, f"{_turn_mode()}:turns", 1)
+    pipe.execute()
+
+
+def record_turn_ops(turn_id: str, task_name: str, counter: RedisOpCounter):
+    """Adds the operations of one task to its turn and to the summary of the current mode."""
+    key = TURN_METRICS_KEY.format(turn_id=turn_id)
+    mode = _turn_mode()
+
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hincrby(key, "commands", counter.commands)
+    pipe.hincrby(key, "round_trips", counter.round_trips)
+    pipe.hincrby(key, f"{task_name}:commands", counter.commands)
+    pipe.expire(key, TURN_METRICS_TTL)
+    pipe.hincrby(TURN_METRICS_SUMMARY_KEY, f"{mode}:commands", counter.commands)
+    pipe.hincrby(TURN_METRICS_SUMMARY_KEY, f"{mode}:round_trips", counter.round_trips)
+    pipe.execute()
+
+    logger.info(f"[{turn_id.split(':')[0]}] - Turn {turn_id}: {task_name} made {counter.commands} Redis commands in {counter.round_trips} round trips.")
+
+
+def get_turn_metrics(turn_id: str) -> Dict[str, str]:
+    """Redis commands and round trips of a turn, in total and per task."""
+    return redis_client.hgetall(TURN_METRICS_KEY.format(turn_id=turn_id))
+
+
+def get_turn_ops_summary() -> Dict[str, Dict[str, float]]:
+    """Average Redis commands and round trips per turn, with ("snapshot") and without ("live") the turn snapshot."""
+    totals = {name: int(value) for name, value in redis_client.hgetall(TURN_METRICS_SUMMARY_KEY).items()}
+
+    summary = {}
+    for mode in ("live", "snapshot"):
+        turns = totals.get(f"{mode}:turns", 0)
+        if turns:
+            summary[mode] = {
+                "turns": turns,
+                "commands_per_turn": totals.get(f"{mode}:commands", 0) / turns,
+                "round_trips_per_turn": totals.get(f"{mode}:round_trips", 0) / turns,
+            }
+    return summary
+
+
+@task_prerun.connect
+def _start_turn_task_count(task_id=None, task=None, args=None, kwargs=None, **_):
+    turn_id = (kwargs or {}).get("turn_id")
+    if turn_id:
+        _active_counts[task_id] = (turn_id, start_redis_op_count())
+
+
+@task_postrun.connect
+def _record_turn_task_count(task_id=None, task=None, **_):
+    active = _active_counts.pop(task_id, None)
+    if active is None:
+        return
+
+    turn_id, token = active
+    try:
+        record_turn_ops(turn_id, task.name, stop_redis_op_count(token))
+    except Exception as e:
+        logger.error(f"Could not record the Redis operations of turn {turn_id}: {e}")
@@ -1,6 +1,8 @@
 import json
 import re
 import requests
+from functools import lru_cache
+from typing import Optional
 from unidecode import unidecode
 
 from app.core.logger import get_logger
@@ -113,11 +115,28 @@ def padronizar_telefone(telefone):
     else:
         # Caso não caiba em nenhuma regra
         return None
+
+
+@lru_cache(maxsize=None)
+def _agent_state_projection(agent_name: str) -> Optional[frozenset]:
+    """
+    Pré-calcula, uma vez por agente, o conjunto `include` com as chaves do `agent_state_mapping`
+    que existem no ConversationState. Retorna None para agentes sem mapeamento (estado completo).
+    """
+    required_keys = agent_state_mapping.get(agent_name)
+    if required_keys is None:
+        return None
+
+    return frozenset(key for key in required_keys if key in ConversationState.model_fields)
+
+
 def distill_conversation_state(conversation_state: ConversationState, agent_name: str) -> dict:
     """
     Filtra o ConversationState para fornecer a cada agente apenas os dados
     necessários para sua tarefa, otimizando o contexto e a performance.
 
+    Só os campos do agente são serializados (projeção `include`), em vez do estado inteiro.
+
     Args:
         conversation_state: O objeto de estado completo da conversa.
         agent_name: O nome do agente para o qual o estado será destilado.
@@ -125,18 +144,29 @@ def distill_conversation_state(conversation_state: ConversationState, agent_name
     Returns:
         Um dicionário contendo apenas as chaves do estado relevantes para o agente.
     """
-    required_keys = agent_state_mapping.get(agent_name)
-    conversation_dict = conversation_state.model_dump()
+    projection = _agent_state_projection(agent_name)
 
     # Se o agente não está no mapa ou se o valor é None, retorne o estado completo.
-    if required_keys is None:
+    if projection is None:
         logger.debug(f"Nenhum mapeamento de estado encontrado para o agente '{agent_name}'. Retornando estado completo.")
-        return conversation_dict
+        return conversation_state.model_dump()
 
-    distilled_state = {}
-    for key in required_keys:
-        if key in conversation_dict:
-            distilled_state[key] = conversation_dict[key]
+    distilled_state = conversation_state.model_dump(include=projection)
 
     logger.debug(f"Estado destilado para o agente '{agent_name}': {list(distilled_state.keys())}")
-    return distilled_state
\ No newline at end of file
+    return distilled_state
+
+
+def distill_conversation_state_json(conversation_state: ConversationState, agent_name: str) -> str:
+    """
+    Igual a `distill_conversation_state`, mas retorna direto o JSON que vai para o prompt do agente,
+    serializado pelo pydantic-core sem passar por um dicionário intermediário e `json.dumps`.
+
+    Args:
+        conversation_state: O objeto de estado completo da conversa.
+        agent_name: O nome do agente para o qual o estado será destilado.
+
+    Returns:
+        O JSON contendo apenas as chaves do estado relevantes para o agente.
+    """
+    return conversation_state.model_dump_json(include=_agent_state_projection(agent_name))
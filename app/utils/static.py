@@ -1,3 +1,6 @@
+# UUID do time "IA - Atendimento" (Alessandro) no Callbell
+AI_TEAM_UUID = "d468731afdba45c3a3a65895e4b08a5a"
+
 default_strategic_plan = {
   "system_action_request": None,
   "conversation_blueprint": {
@@ -181,6 +184,68 @@ agent_state_mapping = {
     ],
 }
 
+# Context each agent's task reads from Redis (see ContextLoader). Agents that run before anything in the
+# turn writes the state read it as of the start of the turn ("turn_state"), the others read it live ("state").
+agent_context_mapping = {
+    "StrategicAdvisor": [
+        "turn_state",
+        "customer_profile",
+        "shorterm_history",
+        "longterm_history_digest:10",
+        "waiting_messages"
+    ],
+    "IncrementalStrategicPlannerAgent": [
+        "turn_state",
+        "customer_profile",
+        "shorterm_history",
+        "longterm_history_digest:10",
+        "last_system_operation_output",
+        "waiting_messages"
+    ],
+    "SystemOperationsAgent": [
+        "state",
+        "customer_profile",
+        "shorterm_history",
+        "longterm_history_digest:10",
+        "waiting_messages"
+    ],
+    "CommunicationAgent": [
+        "state",
+        "customer_profile",
+        "shorterm_history",
+        "longterm_history_digest:10",
+        "last_system_operation_output",
+        "waiting_messages",
+        "sended_catalogs"
+    ],
+    "RegistrationDataCollectorAgent": [
+        "state",
+        "shorterm_history",
+        "longterm_history_digest:5",
+        "waiting_messages",
+        "user_data_so_far",
+        "plan_details"
+    ],
+    "RoutingAgent": [
+        "turn_state",
+        "shorterm_history",
+        "longterm_history_digest:10",
+        "waiting_messages"
+    ],
+    "VerifySystemActionAgent": [
+        "turn_state",
+        "shorterm_history",
+        "longterm_history_digest:5",
+        "waiting_messages",
+        "system_actions_history"
+    ],
+    "PurchaseConfirmationAgent": [
+        "shorterm_history",
+        "longterm_history_digest:5",
+        "waiting_messages"
+    ],
+}
+
 dict_text_normalization = {
     "(2G + 3G + 4G)": "dois G, três G e quatro G",
     "(2G+3G+4G)": "dois G, três G e quatro G",
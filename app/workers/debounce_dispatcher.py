@@ -0,0 +1,61 @@
+import time
+
+from app.core.logger import get_logger
+from app.services.celery_service import celery_app
+from app.services.debounce_service import pop_due_contacts, reschedule_contacts, next_fire_at
+
+logger = get_logger(__name__)
+
+# New schedules are always DEBOUNCE_DELAY_SECONDS ahead, so an idle sleep shorter than that never delays a turn.
+DISPATCHER_MAX_SLEEP = 0.5
+
+
+def dispatch_due_contacts() -> int:
+    """
+    Enqueues `process_message_task` once for every contact whose debounce window expired.
+    Contacts whose task could not be published are put back in the schedule and retried.
+
+    Returns:
+        int: Number of contacts dispatched.
+    """
+    due_contacts = pop_due_contacts()
+    failed = []
+
+    for contact_uuid in due_contacts:
+        try:
+            # Dispatching by name keeps the dispatcher free of the heavy imports done by main.py
+            celery_app.send_task('main.process_message_task', args=[contact_uuid])
+            logger.info(f"[{contact_uuid}] - Debounce window expired. process_message_task dispatched.")
+        except Exception as e:
+            logger.error(f"[{contact_uuid}] - Could not dispatch process_message_task, rescheduling: {e}")
+            failed.append(contact_uuid)
+
+    if failed:
+        reschedule_contacts(failed)
+
+    return len(due_contacts) - len(failed)
+
+
+def run_dispatcher():
+    """
+    Main loop of the debounce dispatcher.
+    Sleeps until the next scheduled fire time (bounded by DISPATCHER_MAX_SLEEP) between rounds.
+    """
+    logger.info("Debounce dispatcher started.")
+
+    while True:
+        try:
+            if dispatch_due_contacts():
+                continue
+
+            fire_at = next_fire_at()
+            sleep_for = DISPATCHER_MAX_SLEEP if fire_at is None else fire_at - time.time()
+            time.sleep(min(max(sleep_for, 0), DISPATCHER_MAX_SLEEP))
+
+        except Exception as e:
+            logger.error(f"Debounce dispatcher error: {e}", exc_info=True)
+            time.sleep(1)
+
+
+if __name__ == "__main__":
+    run_dispatcher()
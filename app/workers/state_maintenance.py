@@ -0,0 +1,264 @@
+"""
+Bulk maintenance of the stored conversation states.
+
+Scans every state in batches, validates it and re-saves (through pipelined compare-and-set writes)
+the ones in an old schema, so `_migrate_old_state` no longer runs lazily on every turn. Also reports
+the distribution of storage formats / validation status and the bytes used by each field.
+
+Usage:
+    python -m app.workers.state_maintenance --dry-run            # report only
+    python -m app.workers.state_maintenance                      # migrate old schemas
+    python -m app.workers.state_maintenance --recode             # also move every state to the configured mode / codec
+    python -m app.workers.state_maintenance --train-dictionary   # train the zstd dictionary used by STATE_CODEC=zstd-dict
+"""
+import argparse
+import json
+import time
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import zstandard
+from pydantic import ValidationError
+
+from app.core.logger import get_logger
+from app.config.settings import settings
+from app.models.data_models import ConversationState
+from app.services.redis_service import get_binary_redis
+from app.services.state_codec import (
+    StateCodec, train_dictionary, store_dictionary, STATE_CODEC_ZSTD_DICT,
+    HEADER_ZSTD, HEADER_ZSTD_DICT, LEGACY_JSON_FIRST_BYTE, STATE_CODEC_DICT_KEY,
+)
+from app.services.state_manager_service import StateManagerService, STATE_STORAGE_HASH
+
+logger = get_logger(__name__)
+binary_redis_client = get_binary_redis()
+
+MAINTENANCE_BATCH_SIZE = 500
+DICTIONARY_SAMPLES = 2000
+
+# Validation status of a stored state
+STATUS_VALID = "valid"
+STATUS_MIGRATED = "migrated"            # old schema, converted by _migrate_old_state
+STATUS_UNRECOVERABLE = "unrecoverable"  # neither valid nor migratable; left untouched
+STATUS_UNDECODABLE = "undecodable"      # unknown codec header / missing dictionary; left untouched
+
+_FORMAT_BY_FIRST_BYTE = {LEGACY_JSON_FIRST_BYTE: "json", HEADER_ZSTD: "zstd", HEADER_ZSTD_DICT: "zstd-dict"}
+
+
+def scan_contact_ids(batch_size: int = MAINTENANCE_BATCH_SIZE) -> Iterator[List[str]]:
+    """
+    Yields batches of contact ids with a stored state, in either storage format.
+    Version counters, codec dictionaries and other `state:*` helper keys are skipped.
+    """
+    seen = set()
+    batch = []
+
+    for key in binary_redis_client.scan_iter(match="state:*", count=batch_size):
+        parts = key.decode().split(":")
+        if len(parts) == 2:
+            contact_id = parts[1]
+        elif len(parts) == 3 and parts[1] == "fields":
+            contact_id = parts[2]
+        else:
+            continue
+
+        # SCAN may return a key more than once, and a contact can briefly have both formats
+        if contact_id in seen:
+            continue
+        seen.add(contact_id)
+
+        batch.append(contact_id)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def _stored_format(fields: Dict[bytes, bytes], stored_state: Optional[bytes]) -> str:
+    if fields:
+        return "hash"
+    if not stored_state:
+        return "missing"
+    return _FORMAT_BY_FIRST_BYTE.get(stored_state[0], "unknown")
+
+
+def inspect_state(state_manager: StateManagerService, contact_id: str, results: list) -> Tuple[str, str, Optional[ConversationState]]:
+    """
+    Classifies one stored state from the results of `_queue_read`.
+
+    Returns:
+        Tuple[str, str, Optional[ConversationState]]: Storage format, validation status and the
+            (possibly migrated) state, which is None when it cannot be recovered.
+    """
+    fields, stored_state, _ = results
+    stored_format = _stored_format(fields, stored_state)
+
+    try:
+        state_json, _ = state_manager._unpack_read(results)
+    except (ValueError, zstandard.ZstdError) as e:
+        logger.warning(f"[{contact_id}] - Could not decode stored state ({stored_format}): {e}")
+        return stored_format, STATUS_UNDECODABLE, None
+
+    if not state_json:
+        return stored_format, STATUS_UNRECOVERABLE, None
+
+    try:
+        return stored_format, STATUS_VALID, ConversationState.model_validate_json(state_json)
+    except ValidationError:
+        pass
+
+    try:
+        return stored_format, STATUS_MIGRATED, state_manager._migrate_old_state(json.loads(state_json))
+    except (ValueError, TypeError) as e:
+        logger.warning(f"[{contact_id}] - Stored state is neither valid nor migratable: {e}")
+        return stored_format, STATUS_UNRECOVERABLE, None
+
+
+def field_sizes(state_manager: StateManagerService, state: ConversationState) -> Dict[str, int]:
+    """Bytes of the JSON of each top-level field."""
+    return {name: len(value) for name, value in state_manager._state_to_fields(state).items()}
+
+
+def train_state_dictionary(samples: int = DICTIONARY_SAMPLES) -> int:
+    """Trains a zstd dictionary on up to `samples` valid stored states and makes it the current one."""
+    state_manager = StateManagerService(local_cache=False)
+    payloads = []
+
+    for contact_ids in scan_contact_ids():
+        pipe = binary_redis_client.pipeline()
+        for contact_id in contact_ids:
+            state_manager._queue_read(pipe, contact_id)
+        results = pipe.execute()
+
+        for index, contact_id in enumerate(contact_ids):
+            _, _, state = inspect_state(state_manager, contact_id, results[index * 3:index * 3 + 3])
+            if state is not None:
+                payloads.append(state.model_dump_json().encode())
+
+        if len(payloads) >= samples:
+            break
+
+    if not payloads:
+        raise ValueError("No valid states found to train the dictionary.")
+
+    logger.info(f"Training state codec dictionary on {len(payloads[:samples])} states.")
+    return store_dictionary(train_dictionary(payloads[:samples]))
+
+
+def run_maintenance(batch_size: int = MAINTENANCE_BATCH_SIZE, dry_run: bool = False, recode: bool = False, codec: Optional[StateCodec] = None) -> dict:
+    """
+    Scans, validates and (unless `dry_run`) re-saves the stored states.
+
+    Args:
+        batch_size (int): Contacts read / written per round trip.
+        dry_run (bool): Only report, never write.
+        recode (bool): Also rewrite valid states stored in a format other than the configured
+            storage mode / codec.
+        codec (Optional[StateCodec]): Codec used for the writes, instead of the configured one.
+
+    Returns:
+        dict: The maintenance report.
+    """
+    state_manager = StateManagerService(local_cache=False)
+    if codec is not None:
+        state_manager.codec = codec
+    target_format = "hash" if state_manager.storage_mode == STATE_STORAGE_HASH else state_manager.codec.codec
+
+    formats, statuses, outcomes = Counter(), Counter(), Counter()
+    bytes_per_field, stored_bytes = Counter(), 0
+    started = time.perf_counter()
+
+    for contact_ids in scan_contact_ids(batch_size):
+        # One round trip to read the batch, whatever the storage format of each state. MULTI keeps each
+        # state consistent with the version its compare-and-set write will expect.
+        pipe = binary_redis_client.pipeline()
+        for contact_id in contact_ids:
+            state_manager._queue_read(pipe, contact_id)
+        results = pipe.execute()
+
+        write_pipe = binary_redis_client.pipeline(transaction=False)
+        queued_writes = 0
+
+        for index, contact_id in enumerate(contact_ids):
+            contact_results = results[index * 3:index * 3 + 3]
+            fields, stored_state, version = contact_results
+            stored_format, status, state = inspect_state(state_manager, contact_id, contact_results)
+
+            formats[stored_format] += 1
+            statuses[status] += 1
+            stored_bytes += len(stored_state or b"") + sum(len(name) + len(value) for name, value in (fields or {}).items())
+
+            if state is None:
+                continue
+
+            bytes_per_field.update(field_sizes(state_manager, state))
+
+            needs_write = status == STATUS_MIGRATED or (recode and stored_format != target_format)
+            if needs_write and not dry_run:
+                state_manager.queue_save_if_unchanged(write_pipe, contact_id, state, int(version or 0))
+                queued_writes += 1
+
+        # One round trip to write the batch; a state changed by a live turn since the read is left alone
+        if queued_writes:
+            for written in write_pipe.execute():
+                outcomes["rewritten" if written else "conflicts"] += 1
+
+        scanned = sum(statuses.values())
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"State maintenance: {scanned} scanned, {statuses[STATUS_MIGRATED]} migrated, "
+            f"{outcomes['rewritten']} rewritten, {outcomes['conflicts']} conflicts ({scanned / elapsed:.0f} states/s)."
+        )
+
+    return {
+        "scanned": sum(statuses.values()),
+        "formats": dict(formats),
+        "statuses": dict(statuses),
+        "outcomes": dict(outcomes),
+        "stored_bytes": stored_bytes,
+        "bytes_per_field": dict(bytes_per_field),
+        "target_format": target_format,
+        "dry_run": dry_run,
+        "elapsed": time.perf_counter() - started,
+    }
+
+
+def print_report(report: dict):
+    scanned = report["scanned"] or 1
+    print(f"\nStates scanned: {report['scanned']} in {report['elapsed']:.1f}s (dry_run={report['dry_run']}, target format={report['target_format']})")
+    print(f"Stored bytes: {report['stored_bytes']} ({report['stored_bytes'] / scanned:.0f}/contact)")
+
+    for title, counter in (("Storage format", report["formats"]), ("Validation status", report["statuses"]), ("Writes", report["outcomes"])):
+        print(f"\n{title}:")
+        for name, count in sorted(counter.items(), key=lambda item: -item[1]):
+            print(f"  {name:<24}{count:>10}{count / scanned:>9.1%}")
+
+    total_field_bytes = sum(report["bytes_per_field"].values()) or 1
+    print("\nJSON bytes per field:")
+    print(f"  {'field':<28}{'avg/contact':>12}{'share':>9}")
+    for name, size in sorted(report["bytes_per_field"].items(), key=lambda item: -item[1]):
+        print(f"  {name:<28}{size / scanned:>12.0f}{size / total_field_bytes:>9.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch", type=int, default=MAINTENANCE_BATCH_SIZE, help="Contacts per round trip.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report, never write.")
+    parser.add_argument("--recode", action="store_true", help="Also rewrite valid states stored in another format / codec.")
+    parser.add_argument("--train-dictionary", action="store_true", help="Train and store the zstd dictionary before the pass.")
+    parser.add_argument("--samples", type=int, default=DICTIONARY_SAMPLES, help="States used to train the dictionary.")
+    args = parser.parse_args()
+
+    codec = None
+    if args.train_dictionary:
+        dict_id = train_state_dictionary(args.samples)
+        print(f"Dictionary {dict_id} stored and set as current.")
+
+        # The configured codec was built before the new dictionary existed
+        if settings.STATE_CODEC == STATE_CODEC_ZSTD_DICT:
+            dictionary = zstandard.ZstdCompressionDict(binary_redis_client.get(STATE_CODEC_DICT_KEY.format(dict_id=dict_id)))
+            codec = StateCodec(STATE_CODEC_ZSTD_DICT, settings.STATE_CODEC_LEVEL, dictionary)
+
+    print_report(run_maintenance(args.batch, args.dry_run, args.recode, codec))
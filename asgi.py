@@ -0,0 +1,40 @@
+from fastapi import FastAPI, Request
+from structlog.stdlib import BoundLogger
+
+# Importações locais
+from app.core.logger import get_logger
+from app.services.ingest_service import get_ingestable_payload, process_incoming_message_async, get_ingest_stats_async
+from app.services.redis_service import get_pool_stats
+
+# Front-end assíncrono do webhook. Não importa main.py, então não carrega os modelos de NLP nem as crews.
+app: FastAPI = FastAPI()
+logger: BoundLogger = get_logger(__name__)
+
+
+@app.post('/receive_message')
+async def receive_message(request: Request):
+    webhook_payload = await request.json()
+    if not webhook_payload:
+        logger.info("Webhook: Payload is empty.")
+        return {"status": "ok", "message": "Empty payload"}
+
+    logger.info("Webhook: Received payload", uuid=(webhook_payload.get("payload") or {}).get("uuid", "N/A"))
+
+    payload = get_ingestable_payload(webhook_payload)
+    if payload:
+        logger.info(f"Webhook: Received message from contact {payload['contact']['uuid']}. Processing...")
+
+        # Roteamento
+        await process_incoming_message_async(payload)
+
+    return {'status': 'ok'}
+
+
+@app.get('/ingest_stats')
+async def ingest_stats():
+    return await get_ingest_stats_async()
+
+
+@app.get('/redis_pool_stats')
+async def redis_pool_stats():
+    return get_pool_stats()
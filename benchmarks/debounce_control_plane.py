@@ -0,0 +1,118 @@
+"""
+Control-plane traffic per inbound message: legacy revoke + ETA debounce vs. sorted-set debounce.
+
+Replays a bursty WhatsApp-like trace (several contacts, each sending a burst of messages)
+through both debounce strategies. Celery calls are replaced by counters, so only the Redis
+configured in `settings` is needed; keys are written under the `bench:` prefix.
+
+Usage:
+    python -m benchmarks.debounce_control_plane --contacts 50 --burst 8
+"""
+import argparse
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+
+from app.services import debounce_service
+from app.services.redis_service import get_redis
+
+
+class CountingCelery:
+    """Stands in for Celery and counts what would hit the broker / control channel."""
+
+    def __init__(self):
+        self.counters = Counter()
+        self._lock = threading.Lock()
+
+    def count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def revoke(self, task_id: str, terminate: bool = False):
+        self.count("control_broadcasts")
+
+    def publish(self) -> str:
+        self.count("broker_publishes")
+        return str(uuid.uuid4())
+
+
+def build_trace(contacts: int, burst: int) -> list:
+    trace = [f"bench-{i}" for i in range(contacts) for _ in range(burst)]
+    random.shuffle(trace)
+    return trace
+
+
+def legacy_ingest(redis_client, celery: CountingCelery, contact_uuid: str):
+    """The debounce previously done by process_incoming_message."""
+    pending_task_key = f"bench:pending_task:{contact_uuid}"
+    existing_task_id = redis_client.get(pending_task_key)
+
+    if existing_task_id:
+        celery.revoke(existing_task_id, terminate=True)
+        # The revoked ETA task still sits in a worker's memory until its ETA is reached
+        celery.count("orphaned_eta_tasks")
+
+    task_id = celery.publish()
+    redis_client.set(pending_task_key, task_id, ex=60)
+    celery.count("redis_commands", 2)
+
+
+def zset_ingest(celery: CountingCelery, contact_uuid: str, delay: float):
+    debounce_service.schedule_contact(contact_uuid, delay)
+    celery.count("redis_commands")
+
+
+def dispatcher_loop(celery: CountingCelery, stop: threading.Event):
+    while not stop.is_set():
+        due = debounce_service.pop_due_contacts()
+        celery.count("dispatcher_redis_commands")
+        for _ in due:
+            celery.publish()
+        if not due:
+            time.sleep(0.01)
+
+
+def run(contacts: int, burst: int, gap: float, delay: float):
+    redis_client = get_redis()
+    debounce_service.DEBOUNCE_SCHEDULE_KEY = "bench:debounce:schedule"
+    trace = build_trace(contacts, burst)
+
+    legacy = CountingCelery()
+    for contact_uuid in trace:
+        legacy_ingest(redis_client, legacy, contact_uuid)
+        time.sleep(gap)
+
+    zset = CountingCelery()
+    stop = threading.Event()
+    dispatcher = threading.Thread(target=dispatcher_loop, args=(zset, stop), daemon=True)
+    dispatcher.start()
+
+    for contact_uuid in trace:
+        zset_ingest(zset, contact_uuid, delay)
+        time.sleep(gap)
+
+    time.sleep(delay + 0.2)
+    stop.set()
+    dispatcher.join()
+
+    redis_client.delete(debounce_service.DEBOUNCE_SCHEDULE_KEY, *[f"bench:pending_task:bench-{i}" for i in range(contacts)])
+
+    messages = len(trace)
+    print(f"messages={messages} contacts={contacts} burst={burst}")
+    print(f"{'metric':<28}{'legacy':>12}{'zset':>12}")
+    for metric in ("control_broadcasts", "broker_publishes", "orphaned_eta_tasks", "redis_commands"):
+        print(f"{metric + ' / msg':<28}{legacy.counters[metric] / messages:>12.3f}{zset.counters[metric] / messages:>12.3f}")
+    print(f"{'dispatcher polls (total)':<28}{'-':>12}{zset.counters['dispatcher_redis_commands']:>12}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contacts", type=int, default=50)
+    parser.add_argument("--burst", type=int, default=8, help="Messages per contact.")
+    parser.add_argument("--gap", type=float, default=0.001, help="Seconds between two inbound messages.")
+    parser.add_argument("--delay", type=float, default=0.5, help="Debounce window used by the sorted-set strategy.")
+    args = parser.parse_args()
+
+    run(args.contacts, args.burst, args.gap, args.delay)
@@ -0,0 +1,55 @@
+"""
+Cost of distilling the ConversationState for each agent: the previous full `model_dump()` + key
+picking + `json.dumps` vs. the precomputed `include` projection serialized by `model_dump_json`.
+
+Runs fully in memory (no Redis needed).
+
+Usage:
+    python -m benchmarks.distill_state --size 80 --iterations 2000
+"""
+import argparse
+import json
+import time
+
+from app.models.data_models import ConversationState
+from app.utils.static import agent_state_mapping
+from app.utils.funcs.funcs import distill_conversation_state, distill_conversation_state_json
+from benchmarks.state_cache import build_state
+
+
+def full_dump_distill_json(conversation_state: ConversationState, agent_name: str) -> str:
+    """The previous implementation: dumps the whole state, picks the agent keys, then json.dumps."""
+    required_keys = agent_state_mapping.get(agent_name)
+    conversation_dict = conversation_state.model_dump()
+    if required_keys is None:
+        return json.dumps(conversation_dict)
+    return json.dumps({key: conversation_dict[key] for key in required_keys if key in conversation_dict})
+
+
+def measure(fn, state: ConversationState, agent_name: str, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn(state, agent_name)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def run(size: int, iterations: int):
+    state = build_state("bench-distill", size)
+    print(f"state size={size} ({len(state.model_dump_json())} bytes of JSON), {iterations} iterations per agent")
+    print(f"{'agent':<36}{'fields':>8}{'full dump us':>14}{'include us':>12}{'include json us':>17}{'speedup':>9}")
+
+    for agent_name, required_keys in agent_state_mapping.items():
+        full = measure(full_dump_distill_json, state, agent_name, iterations)
+        projected = measure(distill_conversation_state, state, agent_name, iterations)
+        projected_json = measure(distill_conversation_state_json, state, agent_name, iterations)
+        fields = len(required_keys) if required_keys is not None else len(ConversationState.model_fields)
+        print(f"{agent_name:<36}{fields:>8}{full:>14.1f}{projected:>12.1f}{projected_json:>17.1f}{full / projected_json:>8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=80, help="Turns of the generated state.")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    run(args.size, args.iterations)
@@ -0,0 +1,121 @@
+"""
+Queries/s of the knowledge base lookups: the previous resolution (topic list rebuilt per call, linear
+thefuzz scans over plans and features) vs. the index built by KnowledgeService at load time, plus
+`find_information` itself.
+
+With --tool, also measures `knowledge_service_tool` end to end (Redis result cache included, emptied
+before the run). That part needs the crew dependencies (langchain) and the Redis configured in `settings`.
+
+Usage:
+    python -m benchmarks.knowledge_lookup --iterations 2000
+    python -m benchmarks.knowledge_lookup --iterations 2000 --tool
+"""
+import argparse
+import time
+
+from thefuzz import process
+
+from app.services.knowledge_service import (
+    KnowledgeService, knowledge_service_instance, TOPIC_MATCH_THRESHOLD, PLAN_MATCH_THRESHOLD, FEATURE_MATCH_THRESHOLD,
+)
+
+# Exact, differently written and misspelled topics / plans / features, as the agents send them
+QUERIES = [
+    {"topic": "pricing", "params": {"plan_name": "Rastreador GSM 4G"}},
+    {"topic": "pricing", "params": {"plan_name": "rastreador hibrido satelital"}},
+    {"topic": "pricng", "params": {"plan_name": "Moto Básico"}},
+    {"topic": "faq", "params": {"plan_name": "GSM 4G"}},
+    {"topic": "key_selling_points", "params": {"plan_name": "Plano Rastreamento + Proteção Total PGS"}},
+    {"topic": "objection", "params": {"plan_name": "satelital"}},
+    {"topic": "contract_terms", "params": {"contract_id": "standard_contract"}},
+    {"topic": "instalation_policy", "params": {}},
+    {"topic": "company_info", "params": {}},
+    {"topic": "get_company_info", "params": {}},
+    {"topic": "application_features", "params": {"feature_name": "notifications"}},
+    {"topic": "application_features", "params": {"feature_name": "geofencing"}},
+    {"topic": "list_all_products", "params": {}},
+    {"topic": "precos", "params": {}},
+]
+
+
+def legacy_resolve(service: KnowledgeService, query: dict):
+    """The previous resolution of topic, plan and feature names."""
+    topic = query.get("topic")
+    params = query.get("params", {})
+
+    all_topics = list(service._topic_map.keys()) + list(service._plan_based_topics)
+    if topic not in all_topics:
+        best_match, score = process.extractOne(topic, all_topics)
+        if score <= 80:
+            return None
+        topic = best_match
+
+    if topic in service._plan_based_topics:
+        all_plans = service._get_all_plans()
+        best_match, score = process.extractOne(params.get("plan_name"), [plan["name"] for plan in all_plans])
+        if score > 85:
+            return next(plan for plan in all_plans if plan["name"] == best_match)
+        return None
+
+    if topic == "application_features" and params.get("feature_name"):
+        best_match, score = process.extractOne(params["feature_name"], service._get_rule_section("application_features").keys())
+        return best_match if score > 80 else None
+
+    return topic
+
+
+def indexed_resolve(service: KnowledgeService, query: dict):
+    """The same resolution through the index."""
+    topic = query.get("topic")
+    params = query.get("params", {})
+
+    topic = service._topic_index.lookup(topic, TOPIC_MATCH_THRESHOLD)[0]
+    if topic is None:
+        return None
+
+    if topic in service._plan_based_topics:
+        return service._plan_index.lookup(params.get("plan_name"), PLAN_MATCH_THRESHOLD)[1]
+
+    if topic == "application_features" and params.get("feature_name"):
+        return service._feature_index.lookup(params["feature_name"], FEATURE_MATCH_THRESHOLD)[0]
+
+    return topic
+
+
+def measure(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for query in QUERIES:
+            fn(query)
+    return iterations * len(QUERIES) / (time.perf_counter() - started)
+
+
+def run(iterations: int, tool: bool):
+    service = knowledge_service_instance
+
+    print(f"{len(QUERIES)} queries x {iterations} iterations")
+    print(f"{'lookup':<32}{'queries/s':>12}")
+
+    legacy = measure(lambda query: legacy_resolve(service, query), iterations)
+    indexed = measure(lambda query: indexed_resolve(service, query), iterations)
+    print(f"{'resolution (thefuzz, linear)':<32}{legacy:>12.0f}")
+    print(f"{'resolution (index)':<32}{indexed:>12.0f}{indexed / legacy:>8.1f}x")
+
+    print(f"{'find_information':<32}{measure(service.find_information, iterations):>12.0f}")
+
+    if tool:
+        import json
+
+        from app.tools.knowledge_tools import knowledge_service_tool, redis_client
+
+        redis_client.delete(*[f"knowledge_cache:{json.dumps(query, sort_keys=True)}" for query in QUERIES])
+        print(f"{'knowledge_service_tool':<32}{measure(lambda query: knowledge_service_tool.func([query]), iterations):>12.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--tool", action="store_true", help="Also measure knowledge_service_tool (needs Redis and the crew dependencies).")
+    args = parser.parse_args()
+
+    run(args.iterations, args.tool)
@@ -0,0 +1,77 @@
+"""
+ConversationState read cost per turn: plain `get_state` (GET + model_validate_json) vs. the version-checked local cache.
+
+A turn is simulated as one `save_state` followed by the `get_state` calls done along the pipeline
+(process_message_task, routing, backend routing, communication, send_message, enrichment...).
+Uses the Redis configured in `settings`, under the `bench-state-cache-*` contacts.
+
+Usage:
+    python -m benchmarks.state_cache --turns 200 --reads 12
+"""
+import argparse
+import time
+
+from app.models.data_models import (
+    ConversationState, StateMetadata, EntityItem, ProductItem, ChecklistItem,
+    QualificationItem, TurnRecap, ObjectionItem, ConversationGoal,
+)
+from app.services.state_manager_service import StateManagerService
+
+
+def build_state(contact_id: str, size: int) -> ConversationState:
+    """A state shaped like the ones of long conversations in production."""
+    return ConversationState(
+        metadata=StateMetadata(contact_id=contact_id, current_turn_number=size, phone_number="+5511999999999", contact_name="Bench"),
+        entities_extracted=[EntityItem(entity=f"entity_{i}", value={"raw": f"value {i}", "turn": i}) for i in range(size)],
+        products_discussed=[ProductItem(plan_name=f"Plano {i}", details_provided=["preço", "cobertura", "fidelidade"]) for i in range(size // 4)],
+        disclosure_checklist=[ChecklistItem(topic=f"topic_{i}", content="conteúdo informado ao cliente " * 4, status="done") for i in range(size // 2)],
+        strategic_plan={"goal": "fechar venda", "steps": [{"step": i, "action": "explicar plano"} for i in range(8)]},
+        user_sentiment_history=[{"turn": i, "sentiment": "neutral", "score": 0.5} for i in range(size)],
+        qualification_tracker=[QualificationItem(topic=f"q_{i}", status="collected", value=f"answer {i}", turn_collected=i) for i in range(size // 2)],
+        last_turn_recap=TurnRecap(turn_number=size, user_intent="ask_price", agent_action="send_price", key_info_exchanged=["preço"] * 5),
+        unresolved_objections=[ObjectionItem(objection=f"objeção {i}", status="open", turn_raised=i) for i in range(size // 5)],
+        conversation_goals=[ConversationGoal(goal=f"goal {i}", status="pending") for i in range(5)],
+    )
+
+
+def run_turns(service: StateManagerService, contact_id: str, state: ConversationState, turns: int, reads: int) -> float:
+    started = time.perf_counter()
+    for _ in range(turns):
+        service.save_state(contact_id, state)
+        for _ in range(reads):
+            service.get_state(contact_id)
+    return (time.perf_counter() - started) / turns
+
+
+def run(turns: int, reads: int, size: int):
+    contact_id = f"bench-state-cache-{size}"
+    state = build_state(contact_id, size)
+    state_json = state.model_dump_json()
+
+    started = time.perf_counter()
+    for _ in range(turns * reads):
+        ConversationState.model_validate_json(state_json)
+    validate_ms = (time.perf_counter() - started) / (turns * reads) * 1000
+
+    plain = StateManagerService(local_cache=False)
+    cached = StateManagerService(local_cache=True)
+    plain_ms = run_turns(plain, contact_id, state, turns, reads) * 1000
+    cached_ms = run_turns(cached, contact_id, state, turns, reads) * 1000
+
+    plain.redis_client.delete(plain._get_state_key(contact_id), plain._get_version_key(contact_id))
+
+    print(f"state size={len(state_json)} bytes turns={turns} reads/turn={reads}")
+    print(f"model_validate_json alone: {validate_ms:.3f} ms/read ({validate_ms * reads:.2f} ms/turn)")
+    print(f"{'strategy':<14}{'ms/turn':>10}")
+    print(f"{'plain':<14}{plain_ms:>10.2f}")
+    print(f"{'local cache':<14}{cached_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--reads", type=int, default=12, help="get_state calls per turn.")
+    parser.add_argument("--size", type=int, default=40, help="Rough number of items in the state lists.")
+    args = parser.parse_args()
+
+    run(args.turns, args.reads, args.size)
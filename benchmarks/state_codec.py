@@ -0,0 +1,67 @@
+"""
+Bytes per contact and encode/decode cost of the ConversationState codecs: legacy JSON, zstd and zstd with a trained dictionary.
+
+States of mixed sizes are generated, the dictionary is trained on half of them and every codec is
+measured on the other half. Runs fully in memory (no Redis needed).
+
+Usage:
+    python -m benchmarks.state_codec --contacts 2000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from app.models.data_models import ConversationState
+from app.services.state_codec import StateCodec, train_dictionary, STATE_CODEC_JSON, STATE_CODEC_ZSTD, STATE_CODEC_ZSTD_DICT
+from benchmarks.state_cache import build_state
+
+
+def measure(codec: StateCodec, payloads: list) -> dict:
+    started = time.perf_counter()
+    encoded = [codec.encode(payload) for payload in payloads]
+    encode_us = (time.perf_counter() - started) / len(payloads) * 1e6
+
+    started = time.perf_counter()
+    for value in encoded:
+        codec.decode(value)
+    decode_us = (time.perf_counter() - started) / len(payloads) * 1e6
+
+    sizes = [len(value) for value in encoded]
+    return {"bytes": statistics.mean(sizes), "p99_bytes": sorted(sizes)[int(len(sizes) * 0.99) - 1], "encode_us": encode_us, "decode_us": decode_us}
+
+
+def run(contacts: int, level: int, dict_size: int):
+    random.seed(42)
+    states = [build_state(f"bench-codec-{i}", random.randint(2, 80)) for i in range(contacts)]
+    payloads = [state.model_dump_json().encode() for state in states]
+    training, evaluation = payloads[::2], payloads[1::2]
+
+    started = time.perf_counter()
+    for payload in evaluation:
+        ConversationState.model_validate_json(payload)
+    validate_us = (time.perf_counter() - started) / len(evaluation) * 1e6
+
+    dictionary = train_dictionary(training, dict_size)
+    codecs = {
+        STATE_CODEC_JSON: StateCodec(STATE_CODEC_JSON),
+        STATE_CODEC_ZSTD: StateCodec(STATE_CODEC_ZSTD, level),
+        STATE_CODEC_ZSTD_DICT: StateCodec(STATE_CODEC_ZSTD_DICT, level, dictionary),
+    }
+
+    print(f"contacts={len(evaluation)} (+{len(training)} for training) zstd level={level} dictionary={len(dictionary.as_bytes())} bytes")
+    print(f"model_validate_json (paid by every codec): {validate_us:.1f} us/state")
+    print(f"{'codec':<12}{'bytes/contact':>15}{'p99 bytes':>12}{'encode us':>12}{'decode us':>12}")
+    for name, codec in codecs.items():
+        result = measure(codec, evaluation)
+        print(f"{name:<12}{result['bytes']:>15.0f}{result['p99_bytes']:>12}{result['encode_us']:>12.1f}{result['decode_us']:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contacts", type=int, default=2000)
+    parser.add_argument("--level", type=int, default=3, help="zstd compression level.")
+    parser.add_argument("--dict-size", type=int, default=16 * 1024)
+    args = parser.parse_args()
+
+    run(args.contacts, args.level, args.dict_size)
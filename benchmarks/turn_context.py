@@ -0,0 +1,89 @@
+"""
+Redis operations of the context reads of one turn: every task loading its own context ("live") vs.
+the turn snapshot stored by the orchestrator and shared by the tasks of the turn ("snapshot").
+
+The reads of a turn are replayed in order: orchestrator, routing crew, strategy refinement, verify
+system action, backend routing (two live state reads) and communication. Commands and round trips
+are counted by the instrumented Redis clients. Uses the Redis configured in `settings`, under the
+`bench-turn-*` contacts.
+
+Usage:
+    python -m benchmarks.turn_context --turns 100
+"""
+import argparse
+import json
+import time
+
+from app.config.settings import settings
+from app.services.redis_service import get_redis, start_redis_op_count, stop_redis_op_count
+from app.services.context_loader import ContextLoader, TURN_SNAPSHOT_KEY
+from app.services.state_manager_service import StateManagerService
+from benchmarks.state_cache import build_state
+
+redis_client = get_redis()
+
+
+def seed_contact(state_manager: StateManagerService, contact_id: str, size: int):
+    state_manager.save_state(contact_id, build_state(contact_id, size))
+    pipe = redis_client.pipeline()
+    pipe.set(f"shorterm_history:{contact_id}", "Cliente: quanto custa o plano?\nAgente: depende do veículo. " * 10)
+    pipe.set(f"longterm_history:{contact_id}", json.dumps({"topic_details": [{"title": f"Tópico {i}", "summary": "resumo " * 30} for i in range(15)]}))
+    pipe.set(f"{contact_id}:customer_profile", "perfil do cliente " * 50)
+    pipe.delete(f"contacts_messages:waiting:{contact_id}")
+    pipe.rpush(f"contacts_messages:waiting:{contact_id}", "oi", "quanto custa?")
+    pipe.set(f"{contact_id}:system_actions_history", json.dumps(["consulta | 2025-01-01"]))
+    pipe.execute()
+
+
+def replay_turn(loader: ContextLoader, contact_id: str):
+    """The context reads done by the tasks of one turn, in order."""
+    turn_id, _ = loader.create_turn_snapshot(contact_id, ["getting_data_from_user"])
+
+    loader.load_for_agent(contact_id, "RoutingAgent", turn_id)
+    loader.load_for_agent(contact_id, "IncrementalStrategicPlannerAgent", turn_id)
+    loader.load_for_agent(contact_id, "VerifySystemActionAgent", turn_id)
+    loader.state_manager.get_state(contact_id)
+    loader.state_manager.get_state(contact_id)
+    loader.load_for_agent(contact_id, "CommunicationAgent", turn_id)
+    return turn_id
+
+
+def measure(loader: ContextLoader, contact_id: str, turns: int, snapshot: bool) -> dict:
+    settings.TURN_SNAPSHOT_ENABLED = snapshot
+    turn_ids = []
+    token = start_redis_op_count()
+    started = time.perf_counter()
+    for _ in range(turns):
+        turn_ids.append(replay_turn(loader, contact_id))
+    elapsed = time.perf_counter() - started
+    counter = stop_redis_op_count(token)
+
+    redis_client.delete(*[TURN_SNAPSHOT_KEY.format(turn_id=turn_id) for turn_id in turn_ids])
+
+    return {"commands": counter.commands / turns, "round_trips": counter.round_trips / turns, "ms": elapsed / turns * 1000}
+
+
+def run(turns: int, size: int):
+    contact_id = f"bench-turn-{size}"
+    loader = ContextLoader(StateManagerService(local_cache=False))
+    seed_contact(loader.state_manager, contact_id, size)
+
+    enabled = settings.TURN_SNAPSHOT_ENABLED
+    try:
+        results = {mode: measure(loader, contact_id, turns, mode == "snapshot") for mode in ("live", "snapshot")}
+    finally:
+        settings.TURN_SNAPSHOT_ENABLED = enabled
+
+    print(f"turns={turns} state size={size}")
+    print(f"{'mode':<10}{'commands/turn':>15}{'round trips/turn':>18}{'ms/turn':>10}")
+    for mode, result in results.items():
+        print(f"{mode:<10}{result['commands']:>15.1f}{result['round_trips']:>18.1f}{result['ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--size", type=int, default=40, help="Rough number of items in the state lists.")
+    args = parser.parse_args()
+
+    run(args.turns, args.size)
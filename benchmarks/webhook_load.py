@@ -0,0 +1,97 @@
+"""
+Load test for the `/receive_message` webhook: requests/s of the Flask (gunicorn) and ASGI (uvicorn) front-ends.
+
+Start the servers first, for example:
+    gunicorn -b 0.0.0.0:8080 main:app --workers 4
+    uvicorn asgi:app --host 0.0.0.0 --port 8081 --workers 4
+
+Then:
+    python -m benchmarks.webhook_load --target flask=http://localhost:8080 --target asgi=http://localhost:8081
+
+By default the payloads come from a team outside the AI team, so only parsing and the HTTP stack are
+exercised. With --full-ingest they go through the whole Redis ingest and get scheduled by the debounce;
+only use it against a staging Redis, since the dispatcher will start turns for the synthetic contacts.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+from app.utils.static import AI_TEAM_UUID
+
+
+def build_payload(index: int, contacts: int, full_ingest: bool) -> dict:
+    return {
+        "event": "message_created",
+        "payload": {
+            "uuid": uuid.uuid4().hex,
+            "status": "received",
+            "text": f"load test message {index}",
+            "attachments": [],
+            "contact": {
+                "uuid": f"loadtest{index % contacts:06d}",
+                "name": "Load Test",
+                "phoneNumber": "+550000000000",
+                "team": {"uuid": AI_TEAM_UUID if full_ingest else "loadtest"},
+            },
+        },
+    }
+
+
+async def run_target(url: str, requests: int, concurrency: int, contacts: int, full_ingest: bool) -> dict:
+    latencies = []
+    errors = 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for index in range(requests):
+        queue.put_nowait(index)
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal errors
+        while not queue.empty():
+            index = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                response = await client.post(f"{url}/receive_message", json=build_payload(index, contacts, full_ingest))
+                if response.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "errors": errors,
+    }
+
+
+async def main(targets: list, requests: int, concurrency: int, contacts: int, full_ingest: bool):
+    print(f"requests={requests} concurrency={concurrency} contacts={contacts} full_ingest={full_ingest}")
+    print(f"{'target':<12}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for target in targets:
+        name, url = target.split("=", 1)
+        result = await run_target(url.rstrip("/"), requests, concurrency, contacts, full_ingest)
+        print(f"{name:<12}{result['rps']:>10.1f}{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}{result['errors']:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", action="append", required=True, help="name=url of a running front-end. Repeatable.")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--contacts", type=int, default=1000, help="Distinct synthetic contacts in the payloads.")
+    parser.add_argument("--full-ingest", action="store_true", help="Send AI-team payloads so they go through the Redis ingest.")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.target, args.requests, args.concurrency, args.contacts, args.full_ingest))
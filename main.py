@@ -1,7 +1,6 @@
 from flask import Flask, jsonify, request
 import json
 
-from datetime import datetime, timedelta
 from structlog.stdlib import BoundLogger
 import time
 
@@ -19,9 +18,12 @@ from app.patches.crewai_telemetry_patch import apply_crewai_telemetry_patch
 
 from app.services.celery_service import celery_app
 from app.services.state_manager_service import StateManagerService
-from app.services.redis_service import get_redis
+from app.services.redis_service import get_redis, get_pool_stats, check_redis_health
+from app.services.ingest_service import get_ingestable_payload, process_incoming_message, get_ingest_stats
+from app.services.barrier_service import strategy_barrier, refine_strategy_barrier, pending_media_barrier, wait_for_barriers
 from app.services.transcript_service import transcript
 from app.services.image_describer_service import ImageDescriptionAPI
+from app.services.attachment_service import process_attachments_batch
 from app.services.nlp_service import carregar_modelo_semantico, extrair_nome_contato
 
 from app.crews.src.main_crews.routing_agent import pre_routing_orchestrator
@@ -31,14 +33,12 @@ from app.utils.static import default_strategic_plan
 
 @signals.worker_ready.connect
 def on_worker_ready(sender, **kwargs):
-    get_logger(__name__).info(f"Celery worker ready: {sender.hostname}")
+    get_logger(__name__).info(f"Celery worker ready: {sender.hostname}", redis_health=check_redis_health())
 
 @signals.worker_shutdown.connect
 def on_worker_shutdown(sender, **kwargs):
     get_logger(__name__).warning(f"Celery: Worker {getattr(sender, 'hostname', 'unknown')} is shutting down.")
 
-IMAGE_EXTENSIONS = ['.png', '.jpg', '.gif', '.webp', '.jpeg']
-
 apply_litellm_patch()
 apply_crewai_telemetry_patch()
 
@@ -51,10 +51,10 @@ redis_client: redis.Redis = get_redis()
 client_description: ImageDescriptionAPI = ImageDescriptionAPI(settings.APPID_IMAGE_DESCRIPTION, settings.SECRET_IMAGE_DESCRIPTION)
 logger: BoundLogger = get_logger(__name__)
 
+# Tarefas por anexo mantidas para consumir mensagens já enfileiradas antes do processamento em lote
 @celery_app.task(name='io.process_audio_attachment')
 def process_audio_attachment_task(contact_uuid, url):
     logger.info(f"[{contact_uuid}] - Transcribing audio from URL: {url}")
-    redis_client.set(f"transcribing:audio:{contact_uuid}", "true")
 
     try:
         transcription = transcript(url)
@@ -67,12 +67,11 @@ def process_audio_attachment_task(contact_uuid, url):
     except Exception as e:
         logger.error(f"Error processing audio attachment for contact {contact_uuid}: {e}")
     finally:
-        redis_client.delete(f"transcribing:audio:{contact_uuid}")
+        pending_media_barrier.release(contact_uuid)
 
 @celery_app.task(name='io.process_image_attachment')
 def process_image_attachment_task(contact_uuid, url):
     logger.info(f"[{contact_uuid}] - Describing image from URL: {url}")
-    redis_client.set(f"transcribing:image:{contact_uuid}", "true")
     
     try:
         description_json = client_description.describe_image(image_url=url)
@@ -86,28 +85,26 @@ def process_image_attachment_task(contact_uuid, url):
     except Exception as e:
         logger.error(f"Error processing image attachment for contact {contact_uuid}: {e}")
     finally:
-        redis_client.delete(f"transcribing:image:{contact_uuid}")
+        pending_media_barrier.release(contact_uuid)
+
+@celery_app.task(name='io.process_attachments_batch')
+def process_attachments_batch_task(contact_uuid, audio_urls, image_urls):
+    logger.info(f"[{contact_uuid}] - Processing {len(audio_urls)} audios and {len(image_urls)} images in batch.")
+
+    try:
+        process_attachments_batch(contact_uuid, audio_urls, image_urls, client_description)
+    except Exception as e:
+        logger.error(f"Error processing attachment batch for contact {contact_uuid}: {e}")
+    finally:
+        pending_media_barrier.release(contact_uuid, amount=len(audio_urls) + len(image_urls))
 
 @celery_app.task(name='main.process_message_task', bind=True)
 def process_message_task(self, contact_uuid):
     """
     This task processes the aggregated messages for a contact after a debounce period.
     It now serves as the entrypoint to the Celery State Machine.
+    It is enqueued exactly once per debounce window by the debounce dispatcher.
     """
-    pending_task_key = f'pending_task:{contact_uuid}'
-    latest_task_id = redis_client.get(pending_task_key)
-
-    if not latest_task_id:
-        logger.warning(f"[{contact_uuid}] - No pending task found in Redis for task {self.request.id}. Aborting.")
-        return
-
-    if latest_task_id != self.request.id:
-        logger.warning(f"[{contact_uuid}] - Stale task {self.request.id} found. Latest task is {latest_task_id}. Aborting.")
-        return
-
-    # The valid task consumes its execution token to ensure idempotency.
-    redis_client.delete(pending_task_key)
-
     logger.info(f"[{contact_uuid}] - Debounced task {self.request.id} started. Initializing state machine.")
 
     contact_lock = redis_client.set(f'processing:{contact_uuid}', value='1', nx=True, ex=300)
@@ -138,20 +135,22 @@ def process_message_task(self, contact_uuid):
         phone_number = str(contact_info.get("phoneNumber", "")).replace('+', '')
         contact_name = contact_info.get("name", "")
 
-        with redis_client.lock(f"lock:state:{contact_uuid}", timeout=10):
-            state, is_new = state_manager.get_state(contact_uuid)
+        extracted_name = extrair_nome_contato(str(contact_name))
+
+        def set_contact_metadata(state: ConversationState):
             state.metadata.phone_number = phone_number
             state.metadata.contact_name = contact_name
-            state.metadata.extracted_name = extrair_nome_contato(str(contact_name))
-            state_manager.save_state(contact_uuid, state)
+            state.metadata.extracted_name = extracted_name
+
+        state, is_new = state_manager.update_state(contact_uuid, set_contact_metadata)
 
         # Verify if theres another instance processing the strategy, waiting before routing agent can judge the strategy properly
-        if redis_client.exists(f"doing_strategy:{contact_uuid}") or redis_client.exists(f"refining_strategy:{contact_uuid}"):
+        if strategy_barrier.is_active(contact_uuid) or refine_strategy_barrier.is_active(contact_uuid):
             logger.info(f"[{contact_uuid}] - Strategy is already being refined / created. Waiting...")
-            while redis_client.exists(f"doing_strategy:{contact_uuid}") or redis_client.exists(f"refining_strategy:{contact_uuid}"):
-                time.sleep(1)
-            
-            logger.info(f"[{contact_uuid}] - Strategy is ready. Continuing...")
+            if wait_for_barriers(contact_uuid, [strategy_barrier, refine_strategy_barrier]):
+                logger.info(f"[{contact_uuid}] - Strategy is ready. Continuing...")
+            else:
+                logger.warning(f"[{contact_uuid}] - Timed out waiting for the strategy. Continuing with the current one.")
 
         # Adicionando o contato na lista de contatos se não estiver lá
         if not redis_client.sismember("contacts", contact_uuid):
@@ -164,14 +163,7 @@ def process_message_task(self, contact_uuid):
             pre_routing_orchestrator.apply_async(args=[contact_uuid])
         
         else:
-            with redis_client.lock(f"lock:state:{contact_uuid}", timeout=10):
-                state, _ = state_manager.get_state(contact_uuid)
-                state_dict = state.model_dump()
-                state_dict['strategic_plan'] = default_strategic_plan
-
-                state = ConversationState(**{**state.model_dump(), **state_dict})
-
-                state_manager.save_state(contact_uuid, state)
+            state_manager.patch_state(contact_uuid, {"strategic_plan": default_strategic_plan})
 
             communication_task.apply_async(args=[contact_uuid])
 
@@ -180,92 +172,36 @@ def process_message_task(self, contact_uuid):
 
     except Exception as e:
         logger.error(f"[{contact_uuid}] - CRITICAL ERROR at the start of the state machine: {e}", exc_info=True)
-    
-def process_incoming_message(payload):
-    """
-    Handles the initial processing of an incoming message webhook.
-    - Extracts message text and attachments.
-    - Saves data to Redis.
-    - Schedules the debounced processing task.
-    """
-    contact_info = payload.get("contact")
-    contact_uuid = contact_info.get("uuid")
-    logger.info(f'[{contact_uuid}] - INICIANDO process_incoming_message')
-
-    # Store contact info for the async task
-    redis_client.set(f"contact_info:{contact_uuid}", json.dumps(contact_info), ex=86400) # Expire after 1 day
-
-    text = ""
-    if 'messageContext' in payload and 'target' in payload['messageContext'] and 'text' in payload['messageContext']['target']:
-        if payload['messageContext']['target']['text'] != "None":
-            text = f"Resposta direta a mensagem `{payload['messageContext']['target']['text']}`:\n"
-
-    text += str(payload.get('text', ''))
-    
-    content = payload.get('attachments', [])
-    
-    # --- Attachment Processing ---
-    content_audio = [attach for attach in content if '.mp3' in attach]
-    content_image = [attach for attach in content if any(ext in attach for ext in IMAGE_EXTENSIONS)]
-
-    for audio_url in content_audio:
-        process_audio_attachment_task.apply_async(contact_uuid, audio_url)
-    
-    for image_url in content_image:
-        process_image_attachment_task.apply_async(contact_uuid, image_url)
-
-    if text:
-        redis_client.rpush(f'contacts_messages:waiting:{contact_uuid}', text)
-        logger.info(f'[{contact_uuid}] - Message text added to Redis queue.')
-
-    # --- Debounce Logic ---
-    pending_task_key = f'pending_task:{contact_uuid}'
-    existing_task_id = redis_client.get(pending_task_key)
-    
-    if existing_task_id:
-        logger.info(f"[{contact_uuid}] - A pending task {existing_task_id} already exists. It will be replaced.")
-        # Revoke the old task
-        celery_app.control.revoke(existing_task_id, terminate=True)
-        logger.info(f"[{contact_uuid}] - Revoked previous pending task: {existing_task_id}")
-
-    # Schedule the new task
-    new_task = process_message_task.apply_async(args=[contact_uuid], eta=datetime.now() + timedelta(seconds=4))
-    
-    # Atomically set the new task ID
-    redis_client.set(pending_task_key, new_task.id, ex=60) # Increased expiry for safety
-    
-    logger.info(f"[{contact_uuid}] - Scheduled new processing task {new_task.id} to run in 4 seconds. Pending task key set.")
 
 
 @app.route('/receive_message', methods=['POST'])
 def receive_message():
     webhook_payload = request.get_json()
-    logger.info("Webhook: Received payload", uuid=webhook_payload.get("payload", {}).get("uuid", "N/A"))
     if not webhook_payload:
         logger.info("Webhook: Payload is empty.")
         return jsonify({"status": "ok", "message": "Empty payload"}), 200
 
-    event = webhook_payload.get("event")
-    payload = webhook_payload.get("payload")
+    logger.info("Webhook: Received payload", uuid=(webhook_payload.get("payload") or {}).get("uuid", "N/A"))
 
-    if event == "message_created" and payload and payload.get("status") == "received":
-        contact_info = payload.get("contact")
-        if not contact_info or not contact_info.get("uuid"):
-            logger.warning("Webhook: Mensagem recebida sem 'contact.uuid'. Ignorando.")
-            return jsonify({"status": "ok", "message": "No contact UUID"}), 200
-        
-        # Alessandro's team UUID
-        if contact_info.get("team", {}).get("uuid") == "d468731afdba45c3a3a65895e4b08a5a":
-            # Salvando o timestamp da última mensagem recebida
-            redis_client.set(f"history:last_timestamp:to_follow_up:{contact_info['uuid']}", str(datetime.now().isoformat()))
-            redis_client.delete(f"follow_up_level:{contact_info['uuid']}")  # Reset follow-up level on new message
-            logger.info(f"Webhook: Received message from contact {contact_info['uuid']}. Processing...")
-            
-            # Roteamento
-            process_incoming_message(payload)
+    payload = get_ingestable_payload(webhook_payload)
+    if payload:
+        logger.info(f"Webhook: Received message from contact {payload['contact']['uuid']}. Processing...")
+
+        # Roteamento
+        process_incoming_message(payload)
                 
     return jsonify({'status': 'ok'}), 200
 
 
+@app.route('/ingest_stats', methods=['GET'])
+def ingest_stats():
+    return jsonify(get_ingest_stats()), 200
+
+
+@app.route('/redis_pool_stats', methods=['GET'])
+def redis_pool_stats():
+    return jsonify(get_pool_stats()), 200
+
+
 if __name__ == '__main__':
     app.run('0.0.0.0', port=8080)
\ No newline at end of file
@@ -9,8 +9,8 @@ export OTEL_PYTHON_DISABLED=true
 # Função para cleanup quando o script receber SIGTERM
 cleanup() {
     echo "Recebendo sinal de parada..."
-    kill -TERM "$celery_worker_pid" "$celery_beat_pid" "$gunicorn_pid" 2>/dev/null
-    wait "$celery_worker_pid" "$celery_beat_pid" "$gunicorn_pid"
+    kill -TERM "$celery_worker_pid" "$celery_beat_pid" "$debounce_dispatcher_pid" "$gunicorn_pid" 2>/dev/null
+    wait "$celery_worker_pid" "$celery_beat_pid" "$debounce_dispatcher_pid" "$gunicorn_pid"
     exit 0
 }
 
@@ -43,20 +43,37 @@ celery_beat_pid=$!
 # Aguardar beat iniciar
 sleep 3
 
-# Iniciar Gunicorn em background com WSGI worker (correto para Flask)
-echo "Iniciando Gunicorn..."
-gunicorn -b 0.0.0.0:$PORT main:app \
-    --workers $WORKERS \
-    --timeout 300 \
-    --max-requests 1000 \
-    --max-requests-jitter 50 \
-    &
+# Iniciar o dispatcher de debounce em background
+echo "Iniciando Debounce Dispatcher..."
+python -m app.workers.debounce_dispatcher &
+debounce_dispatcher_pid=$!
+
+# Iniciar o front-end do webhook em background
+# WEBHOOK_SERVER=asgi usa o front-end assíncrono (asgi.py) com Uvicorn; o padrão continua sendo Flask sob Gunicorn
+if [ "$WEBHOOK_SERVER" = "asgi" ]; then
+    echo "Iniciando Uvicorn (ASGI)..."
+    uvicorn asgi:app \
+        --host 0.0.0.0 \
+        --port $PORT \
+        --workers $WORKERS \
+        &
+else
+    # Gunicorn com WSGI worker (correto para Flask)
+    echo "Iniciando Gunicorn..."
+    gunicorn -b 0.0.0.0:$PORT main:app \
+        --workers $WORKERS \
+        --timeout 300 \
+        --max-requests 1000 \
+        --max-requests-jitter 50 \
+        &
+fi
 gunicorn_pid=$!
 
 echo "Todos os processos iniciados:"
 echo "Celery Worker PID: $celery_worker_pid"
 echo "Celery Beat PID: $celery_beat_pid"
+echo "Debounce Dispatcher PID: $debounce_dispatcher_pid"
 echo "Gunicorn PID: $gunicorn_pid"
 
 # Aguardar todos os processos
-wait "$celery_worker_pid" "$celery_beat_pid" "$gunicorn_pid"
\ No newline at end of file
+wait "$celery_worker_pid" "$celery_beat_pid" "$debounce_dispatcher_pid" "$gunicorn_pid"
\ No newline at end of file
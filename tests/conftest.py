@@ -0,0 +1,25 @@
+import celery.app.control
+import fakeredis
+import fakeredis.aioredis
+import pytest
+
+from app.services import redis_service
+
+# The services create their clients at import time, so the Redis getters are pointed at an
+# in-memory server before any test module imports them.
+fake_server = fakeredis.FakeServer()
+
+redis_service.get_redis = lambda *args, **kwargs: fakeredis.FakeRedis(server=fake_server, decode_responses=True)
+redis_service.get_binary_redis = lambda *args, **kwargs: fakeredis.FakeRedis(server=fake_server)
+redis_service.get_async_redis = lambda *args, **kwargs: fakeredis.aioredis.FakeRedis(server=fake_server, decode_responses=True)
+
+# celery_service purges the broker queues on import; there is no broker in the tests
+celery.app.control.Control.purge = lambda self, *args, **kwargs: 0
+
+
+@pytest.fixture
+def binary_redis():
+    client = fakeredis.FakeRedis(server=fake_server)
+    client.flushall()
+    yield client
+    client.flushall()
@@ -0,0 +1,99 @@
+import json
+import os
+
+import pytest
+
+from app.config.settings import settings
+from app.models.data_models import ConversationState, StateMetadata, EntityItem
+from app.services.cache_codec import (
+    CacheCodec, CachedFailure, default_cache_codec, COMPRESSION_NONE, COMPRESSION_ZSTD, TAG_JSON, TAG_BYTES,
+    TAG_PYDANTIC,
+)
+from app.services.cache_service import cache_result, _cache_key
+
+
+@pytest.mark.parametrize("value", [
+    {"distancia": "430 km", "tempo": {"horas": 5, "minutos": 12}},
+    [1, "dois", 3.0, None],
+    "rastreador",
+    3.14,
+    None,
+])
+def test_json_values_round_trip(value):
+    raw = default_cache_codec.encode(value)
+
+    assert raw[:1] == TAG_JSON
+    assert default_cache_codec.decode(raw) == value
+
+
+@pytest.mark.parametrize("value", [b"", os.urandom(256 * 1024)])
+def test_bytes_round_trip(value):
+    raw = default_cache_codec.encode(value)
+
+    assert raw[:1] == TAG_BYTES
+    assert default_cache_codec.decode(raw) == value
+
+
+def test_pydantic_model_round_trip():
+    state = ConversationState(
+        metadata=StateMetadata(contact_id="5511999999999", current_turn_number=3),
+        entities_extracted=[EntityItem(entity="veiculo", value="moto")],
+        prefers_audio=True,
+    )
+    raw = default_cache_codec.encode(state)
+
+    decoded = default_cache_codec.decode(raw)
+    assert raw[:1] == TAG_PYDANTIC
+    assert isinstance(decoded, ConversationState)
+    assert decoded == state
+
+
+def test_large_payload_is_compressed():
+    value = {"history": ["mensagem repetida do cliente"] * 200}
+    raw = default_cache_codec.encode(value)
+
+    assert len(json.dumps(value)) >= settings.CACHE_COMPRESSION_MIN_BYTES
+    assert raw[1:2] == COMPRESSION_ZSTD
+    assert len(raw) < len(json.dumps(value))
+    assert default_cache_codec.decode(raw) == value
+
+
+def test_incompressible_and_small_payloads_are_stored_as_is():
+    noise = os.urandom(settings.CACHE_COMPRESSION_MIN_BYTES * 4)
+
+    assert default_cache_codec.encode(noise)[1:2] == COMPRESSION_NONE
+    assert default_cache_codec.encode({"a": 1})[1:2] == COMPRESSION_NONE
+    assert CacheCodec(compress_min_bytes=0).encode("x" * 10_000)[1:2] == COMPRESSION_NONE
+
+
+@pytest.mark.parametrize("value", [{"distancia": "430 km"}, [1, 2], "texto", 42, None])
+def test_legacy_plain_json_is_decoded(value):
+    assert default_cache_codec.decode(json.dumps(value).encode()) == value
+
+
+def test_markers():
+    negative = default_cache_codec.encode_negative()
+    error = default_cache_codec.encode_error(ValueError("OVER_QUERY_LIMIT"))
+
+    assert default_cache_codec.decode(negative) is None
+    assert default_cache_codec.decode(error) == CachedFailure(error_type="ValueError", message="OVER_QUERY_LIMIT")
+    assert default_cache_codec.is_marker(negative)
+    assert default_cache_codec.is_marker(error)
+    assert not default_cache_codec.is_marker(default_cache_codec.encode(None))
+    assert not default_cache_codec.is_marker(default_cache_codec.encode(b"N-"))
+    assert not default_cache_codec.is_marker(json.dumps({"a": 1}).encode())
+
+
+def test_cache_result_returns_bytes_through_binary_client(binary_redis):
+    audio = bytes(range(256)) * 64
+    calls = []
+
+    @cache_result(ttl=60)
+    def synthesize(text):
+        calls.append(text)
+        return audio
+
+    assert synthesize("olá") == audio
+    assert synthesize("olá") == audio
+    assert calls == ["olá"]
+    assert default_cache_codec.decode(binary_redis.get(_cache_key(synthesize, ("olá",), {}))) == audio
@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+from app.services.cache_codec import default_cache_codec
+from app.services.cache_service import cache_result, _cache_key, CachedCallError
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+def make_stale(binary_redis, func, *args, stale_ttl: int):
+    """Ages the cached value past its soft TTL: the key has less than `stale_ttl` seconds left."""
+    binary_redis.expire(_cache_key(func, args, {}), stale_ttl // 2)
+
+
+def test_failed_refresh_keeps_serving_stale_value(binary_redis):
+    outcomes = [{"distancia": "430 km"}, RuntimeError("OVER_QUERY_LIMIT")]
+
+    @cache_result(ttl=60, stale_ttl=600, negative_ttl=30, cache_errors=True, error_backoff=120)
+    def route(origem, destino):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert route("A", "B") == {"distancia": "430 km"}
+    make_stale(binary_redis, route, "A", "B", stale_ttl=600)
+
+    assert route("A", "B") == {"distancia": "430 km"}
+    wait_for(lambda: route.cache_stats()["refresh_errors"] == 1)
+
+    # The error marker never replaces the stale value: it is still served, and still a result
+    assert route("A", "B") == {"distancia": "430 km"}
+    raw = binary_redis.get(_cache_key(route, ("A", "B"), {}))
+    assert not default_cache_codec.is_marker(raw)
+    assert not binary_redis.exists(f"{_cache_key(route, ('A', 'B'), {})}:lease")
+
+
+def test_refresh_returning_none_keeps_serving_stale_value(binary_redis):
+    outcomes = [{"distancia": "430 km"}, None]
+
+    @cache_result(ttl=60, stale_ttl=600, negative_ttl=30)
+    def route(origem, destino):
+        return outcomes.pop(0)
+
+    route("A", "B")
+    make_stale(binary_redis, route, "A", "B", stale_ttl=600)
+
+    assert route("A", "B") == {"distancia": "430 km"}
+    wait_for(lambda: route.cache_stats()["refreshes"] == 1)
+
+    assert route("A", "B") == {"distancia": "430 km"}
+    assert not default_cache_codec.is_marker(binary_redis.get(_cache_key(route, ("A", "B"), {})))
+
+
+def test_synchronous_miss_caches_failures_and_negatives(binary_redis):
+    calls = []
+
+    @cache_result(ttl=60, negative_ttl=30, cache_errors=True, error_backoff=120)
+    def route(origem):
+        calls.append(origem)
+        if origem == "erro":
+            raise RuntimeError("REQUEST_DENIED")
+        return None
+
+    with pytest.raises(RuntimeError):
+        route("erro")
+    with pytest.raises(CachedCallError):
+        route("erro")
+
+    assert route("inexistente") is None
+    assert route("inexistente") is None
+    assert calls == ["erro", "inexistente"]
+    assert binary_redis.ttl(_cache_key(route, ("inexistente",), {})) <= 30
@@ -0,0 +1,26 @@
+import time
+
+from app.services.debounce_service import DEBOUNCE_SCHEDULE_KEY, schedule_contact
+from app.workers import debounce_dispatcher
+
+
+def test_failed_publish_is_rescheduled(binary_redis, monkeypatch):
+    for contact_uuid in ("a", "b", "c"):
+        schedule_contact(contact_uuid, delay=-1)
+
+    sent = []
+
+    def send_task(name, args):
+        if args[0] == "b":
+            raise ConnectionError("broker unavailable")
+        sent.append(args[0])
+
+    monkeypatch.setattr(debounce_dispatcher.celery_app, "send_task", send_task)
+
+    assert debounce_dispatcher.dispatch_due_contacts() == 2
+    assert sorted(sent) == ["a", "c"]
+
+    # Only the failed contact is back in the schedule, due for a retry shortly
+    scheduled = binary_redis.zrange(DEBOUNCE_SCHEDULE_KEY, 0, -1, withscores=True)
+    assert [member for member, _ in scheduled] == [b"b"]
+    assert scheduled[0][1] <= time.time() + 2
@@ -0,0 +1,48 @@
+import pytest
+
+from app.config.settings import settings
+from app.models.data_models import IncomingMessage
+from app.services import ingest_service
+from app.services.barrier_service import pending_media_barrier
+from app.services.ingest_service import (
+    ingest_message, process_incoming_message, INGEST_SCHEDULED, INGEST_EXTENDED, INGEST_THROTTLED,
+)
+
+
+def test_bucket_without_refill_keeps_admitting_up_to_capacity(binary_redis, monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_CONTACT_BUCKET_CAPACITY", 2)
+    monkeypatch.setattr(settings, "INGEST_CONTACT_REFILL_PER_SECOND", 0)
+
+    outcomes = [
+        ingest_message(IncomingMessage(contact_uuid="c1", contact_info={"uuid": "c1"}, message_uuid=f"m{i}", text="oi"))
+        for i in range(3)
+    ]
+
+    assert outcomes == [INGEST_SCHEDULED, INGEST_EXTENDED, INGEST_THROTTLED]
+    assert 0 < binary_redis.ttl("ingest:bucket:c1") <= settings.WEBHOOK_DEDUP_TTL
+
+
+def test_failed_attachment_dispatch_accepts_the_redelivery(binary_redis, monkeypatch):
+    payload = {
+        "uuid": "m1",
+        "text": "segue o áudio",
+        "contact": {"uuid": "c1"},
+        "attachments": ["https://storage/uploads/a.mp3?sig=1", "https://storage/uploads/b.jpg?sig=1"],
+    }
+    sent = []
+
+    def broker_down(name, args):
+        raise ConnectionError("broker unavailable")
+
+    monkeypatch.setattr(ingest_service.celery_app, "send_task", broker_down)
+    with pytest.raises(ConnectionError):
+        process_incoming_message(payload)
+
+    # Nothing is left waiting for media that was never dispatched
+    assert not pending_media_barrier.is_active("c1")
+
+    monkeypatch.setattr(ingest_service.celery_app, "send_task", lambda name, args: sent.append(args))
+    process_incoming_message(payload)
+
+    assert sent == [["c1", payload["attachments"][:1], payload["attachments"][1:]]]
+    assert int(binary_redis.get(pending_media_barrier.flag_key("c1"))) == 2
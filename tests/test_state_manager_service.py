@@ -0,0 +1,23 @@
+import pytest
+
+from app.services.context_loader import ContextLoader
+from app.services.state_codec import HEADER_ZSTD, HEADER_ZSTD_DICT
+from app.services.state_manager_service import StateManagerService
+
+
+@pytest.mark.parametrize("stored_state", [
+    bytes([HEADER_ZSTD_DICT]) + b"not a zstd frame",   # corrupt frame
+    bytes([HEADER_ZSTD]) + b"\x28\xb5\x2f\xfd\x00",    # truncated frame
+    b"\x07unknown codec",                             # unknown header
+])
+def test_undecodable_state_falls_back_to_initial_state(binary_redis, stored_state):
+    state_manager = StateManagerService()
+    binary_redis.set(state_manager._get_state_key("c1"), stored_state)
+
+    state, is_new = state_manager.get_state("c1")
+    assert is_new
+    assert state.metadata.contact_id == "c1"
+
+    bundle = ContextLoader(state_manager).load_for_agent("c1", "RoutingAgent")
+    assert bundle.is_new_state
+    assert bundle.state.metadata.contact_id == "c1"